@@ -17,7 +17,8 @@ from datetime import datetime, timedelta
 import reportGen
 import asyncio
 import logging
-from licenseManager import LicenseManager
+from licenseContext import get_license_key
+from settingsService import settings_service
 
 def send_daily_report_email(date=None):
     """
@@ -39,8 +40,7 @@ def send_daily_report_email(date=None):
             print("Mail settings not found")
             return False
             
-        with open('appSettings.json', 'r') as file:
-            all_settings = json.load(file)
+        all_settings = settings_service.get()
             
         mail_settings = all_settings.get('MailSettings', {})
         if not mail_settings:
@@ -61,32 +61,10 @@ def send_daily_report_email(date=None):
             print("Incomplete mail settings")
             return False
               
-        # Get license key directly from database
-        license_key = ""
-        try:
-            # Create a license manager instance
-            license_manager = LicenseManager()
-            
-            # We need to run the async method in a synchronous context
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_data = loop.run_until_complete(license_manager.get_license_db())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            # Get license data and extract the key
-            license_data = get_license_data()
-            if license_data and 'LicenseKey' in license_data:
-                license_key = license_data['LicenseKey']
-                # logging.info(f"Retrieved license key for database insertion: {license_key}")
-            else:
-                logging.warning("Could not retrieve license key for database insertion")
-        except Exception as e:
-            logging.error(f"Error getting license key: {e}")
-            return False
+        # Get license key from the shared license cache
+        license_key = get_license_key()
+        if not license_key:
+            logging.warning("Could not retrieve license key for database insertion")
             
         # Generate daily report
         report_path = reportGen.generate_daily_report(date, license_key)
@@ -210,8 +188,7 @@ def send_monthly_report_email(year=None, month=None):
             print("Mail settings not found")
             return False
             
-        with open('appSettings.json', 'r') as file:
-            all_settings = json.load(file)
+        all_settings = settings_service.get()
             
         mail_settings = all_settings.get('MailSettings', {})
         if not mail_settings:
@@ -235,32 +212,10 @@ def send_monthly_report_email(year=None, month=None):
             print("Incomplete mail settings")
             return False
             
-        # Get license key directly from database
-        license_key = ""
-        try:
-            # Create a license manager instance
-            license_manager = LicenseManager()
-            
-            # We need to run the async method in a synchronous context
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_data = loop.run_until_complete(license_manager.get_license_db())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            # Get license data and extract the key
-            license_data = get_license_data()
-            if license_data and 'LicenseKey' in license_data:
-                license_key = license_data['LicenseKey']
-                # logging.info(f"Retrieved license key for database insertion: {license_key}")
-            else:
-                logging.warning("Could not retrieve license key for database insertion")
-        except Exception as e:
-            logging.error(f"Error getting license key: {e}")
-            return False
+        # Get license key from the shared license cache
+        license_key = get_license_key()
+        if not license_key:
+            logging.warning("Could not retrieve license key for database insertion")
             
         # Generate monthly report using timebase format
         report_path = reportGen.generate_timebase_monthly_report(year, month, "deviceoptions", LK=license_key, output_dir="Reports/monthly", prompt_for_location=False)
@@ -375,8 +330,7 @@ def check_and_send_scheduled_email():
             print("Mail settings not found")
             return False
             
-        with open('appSettings.json', 'r') as file:
-            all_settings = json.load(file)
+        all_settings = settings_service.get()
             
         mail_settings = all_settings.get('MailSettings', {})
         if not mail_settings:
@@ -459,8 +413,7 @@ def send_combined_reports_email(date=None):
             print("Mail settings not found")
             return False
             
-        with open('appSettings.json', 'r') as file:
-            all_settings = json.load(file)
+        all_settings = settings_service.get()
             
         mail_settings = all_settings.get('MailSettings', {})
         if not mail_settings:
@@ -481,32 +434,10 @@ def send_combined_reports_email(date=None):
             print("Incomplete mail settings")
             return False
         
-        # Get license key directly from database
-        license_key = ""
-        try:
-            # Create a license manager instance
-            license_manager = LicenseManager()
-            
-            # We need to run the async method in a synchronous context
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_data = loop.run_until_complete(license_manager.get_license_db())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            # Get license data and extract the key
-            license_data = get_license_data()
-            if license_data and 'LicenseKey' in license_data:
-                license_key = license_data['LicenseKey']
-                # logging.info(f"Retrieved license key for database insertion: {license_key}")
-            else:
-                logging.warning("Could not retrieve license key for database insertion")
-        except Exception as e:
-            logging.error(f"Error getting license key: {e}")
-            return False
+        # Get license key from the shared license cache
+        license_key = get_license_key()
+        if not license_key:
+            logging.warning("Could not retrieve license key for database insertion")
         
         # Generate all reports
         report_paths = []
@@ -992,32 +923,31 @@ class MailSettingsWindow(QMainWindow):
         """Load mail settings from appSettings.json"""
         try:
             if os.path.exists('appSettings.json'):
-                with open('appSettings.json', 'r') as file:
-                    all_settings = json.load(file)
+                all_settings = settings_service.get()
                     
-                    mail_settings = all_settings.get('MailSettings', {})
+                mail_settings = all_settings.get('MailSettings', {})
                     
-                    self.to_emails.setText(', '.join(mail_settings.get('ToEmails', [])))
-                    self.smtp_server.setText(mail_settings.get('SMTPServer', ''))
-                    self.smtp_port.setValue(mail_settings.get('SMTPPort', 587))
-                    self.smtp_user.setText(mail_settings.get('SMTPUser', ''))
+                self.to_emails.setText(', '.join(mail_settings.get('ToEmails', [])))
+                self.smtp_server.setText(mail_settings.get('SMTPServer', ''))
+                self.smtp_port.setValue(mail_settings.get('SMTPPort', 587))
+                self.smtp_user.setText(mail_settings.get('SMTPUser', ''))
                     
-                    # Decrypt and show the saved password
-                    encrypted_password = mail_settings.get('SMTPPass', '')
-                    decrypted_password = decrypt_password(encrypted_password)
-                    self.smtp_pass.setText(decrypted_password)
+                # Decrypt and show the saved password
+                encrypted_password = mail_settings.get('SMTPPass', '')
+                decrypted_password = decrypt_password(encrypted_password)
+                self.smtp_pass.setText(decrypted_password)
                     
-                    self.ssl_tls.setChecked(mail_settings.get('SSLTLS', False))
-                    self.auto_mail_toggle.setChecked(mail_settings.get('AutoMail', False))
+                self.ssl_tls.setChecked(mail_settings.get('SSLTLS', False))
+                self.auto_mail_toggle.setChecked(mail_settings.get('AutoMail', False))
                     
-                    time_str = mail_settings.get('AutoMailTime', '09:00')
-                    time_obj = QTime.fromString(time_str, 'HH:mm')
-                    self.auto_mail_time.setTime(time_obj)
+                time_str = mail_settings.get('AutoMailTime', '09:00')
+                time_obj = QTime.fromString(time_str, 'HH:mm')
+                self.auto_mail_time.setTime(time_obj)
                     
-                    self.mail_subject.setText(mail_settings.get('MailSubject', ''))
-                    self.mail_body.setText(mail_settings.get('MailBody', ''))
+                self.mail_subject.setText(mail_settings.get('MailSubject', ''))
+                self.mail_body.setText(mail_settings.get('MailBody', ''))
                     
-                    self.toggle_auto_mail(mail_settings.get('AutoMail', False))
+                self.toggle_auto_mail(mail_settings.get('AutoMail', False))
             else:
                 # Default values if file doesn't exist
                 default_settings = {
@@ -1100,15 +1030,13 @@ class MailSettingsWindow(QMainWindow):
             # Load existing settings if file exists
             all_settings = {}
             if os.path.exists('appSettings.json'):
-                with open('appSettings.json', 'r') as file:
-                    all_settings = json.load(file)
+                all_settings = settings_service.edit()
             
             # Add or update mail settings
             all_settings['MailSettings'] = mail_settings
             
             # Save to file
-            with open('appSettings.json', 'w') as file:
-                json.dump(all_settings, file, indent=4)
+            settings_service.save(all_settings)
             
             QMessageBox.information(self, "Success", "Mail settings saved successfully.")
             self.go_back()
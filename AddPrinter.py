@@ -404,6 +404,7 @@ class PrinterSelectionDialog(QDialog):
 import logging
 import asyncio
 from licenseManager import LicenseManager  
+from settingsService import settings_service
 
 class PrinterSetupWindow(QMainWindow):
     # Signal for when printer is saved
@@ -1152,8 +1153,7 @@ class PrinterSetupWindow(QMainWindow):
         try:
             app_settings = {}
             if os.path.exists('appSettings.json'):
-                with open('appSettings.json', 'r') as f:
-                    app_settings = json.load(f)
+                app_settings = settings_service.edit()
             
             # Add or update PrinterConfig section
             if 'PrinterConfig' not in app_settings:
@@ -1200,8 +1200,7 @@ class PrinterSetupWindow(QMainWindow):
                     app_settings['PrinterConfig']['Footer'] = {"enable": False, "text": ""}
                 
             # Save back to appSettings.json
-            with open('appSettings.json', 'w') as f:
-                json.dump(app_settings, f, indent=4)
+            settings_service.save(app_settings)
                 
             print("Printer settings saved to appSettings.json")
             
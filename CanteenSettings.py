@@ -9,6 +9,7 @@ from PyQt5.QtCore import Qt, QTime
 from PyQt5.QtGui import QFont, QIcon
 from reports import ReportsWidget
 from AddMail import MailSettingsWindow
+from settingsService import settings_service
 
 class EzeeCanteenApp(QMainWindow):
     def __init__(self):
@@ -608,8 +609,7 @@ class EzeeCanteenApp(QMainWindow):
         """Load settings from appSettings.json file"""
         try:
             if os.path.exists('appSettings.json'):
-                with open('appSettings.json', 'r') as f:
-                    settings = json.load(f)
+                settings = settings_service.get()
                 
                 canteen_menu = settings.get('CanteenMenu', {})
                 
@@ -774,8 +774,7 @@ class EzeeCanteenApp(QMainWindow):
             
             # Try to load existing settings first to preserve any settings we're not modifying
             if os.path.exists('appSettings.json'):
-                with open('appSettings.json', 'r') as f:
-                    settings = json.load(f)
+                settings = settings_service.edit()
             
             # Create CanteenMenu if it doesn't exist
             if 'CanteenMenu' not in settings:
@@ -861,9 +860,8 @@ class EzeeCanteenApp(QMainWindow):
                 settings['CanteenMenu']['device']['DisablePunch'] = self.yes_no_btn.isChecked()
                 settings['CanteenMenu']['device']['SpecialMessage'] = self.special_msg_input.text()
             
-            # Save to file
-            with open('appSettings.json', 'w') as f:
-                json.dump(settings, f, indent=4)
+            # Save to file (atomically, so the live display never reads a partial file)
+            settings_service.save(settings)
             
             print(f"Settings saved successfully for {current_mode} mode")
             # print(f"Complete JSON structure:")
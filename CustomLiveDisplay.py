@@ -1,6 +1,4 @@
 import requests
-from requests.auth import HTTPDigestAuth
-import json
 from datetime import datetime, timedelta
 import time
 import sys
@@ -9,7 +7,6 @@ import tempfile
 import shutil
 import uuid
 import mysql.connector
-import socket
 import logging
 import xmltodict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout, 
@@ -22,9 +19,14 @@ import urllib.request
 from io import BytesIO
 # from print import print_slip  # Import print_slip function
 from print import print_custom_slip, print_custom_slip_wide  # Import custom print functions
+from printSpooler import get_print_spooler
 from PyQt5 import sip
-from licenseManager import LicenseManager
-import asyncio
+from licenseContext import license_context, get_license_key
+from alertStream import AlertStreamListener
+from ingestionSettings import get_ingestion_settings
+from eventPoller import AcsEventPoller
+from deviceClient import get_device_client
+from settingsService import settings_service
 
 # Configuration constants (copied from main file to avoid import issues)
 IP = "192.168.0.85"
@@ -64,26 +66,9 @@ def fetch_device_config(force_refresh=False):
     
     try:
         # Get the current license key
-        license_key = ""
-        try:
-            license_manager = LicenseManager()
-            
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_data = loop.run_until_complete(license_manager.get_license_db())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            license_data = get_license_data()
-            if license_data and 'LicenseKey' in license_data:
-                license_key = license_data['LicenseKey']
-            else:
-                logging.warning("Could not retrieve license key for device filtering")
-        except Exception as e:
-            logging.error(f"Error getting license key: {e}")
+        license_key = get_license_key()
+        if not license_key:
+            logging.warning("Could not retrieve license key for device filtering")
         
         # Connect to the database
         conn = mysql.connector.connect(
@@ -240,8 +225,8 @@ def getDeviceDetails(ip, port, user, psw):
     MacAddress = ""
  
     try:
-        response = requests.get(url, auth=HTTPDigestAuth(
-            user, psw), headers=headers, data=payload, timeout=5)
+        response = get_device_client(ip, port, user, psw).get(
+            url, headers=headers, data=payload, timeout=5)
            
         if response.status_code == 401:
             logging.error(f"Authentication failed (401 Unauthorized) for {ip}:{port} with user: {user}")
@@ -315,20 +300,19 @@ class CustomAuthEventMonitor(QThread):
         self.parent_display = parent_display
         self.running = True
         self.communicator.stop_server.connect(self.stop)
-        self.start_time = datetime.now()
-        self.consecutive_errors = 0
-        self.max_consecutive_errors = 5
-        self.last_successful_fetch = datetime.now()
         
         # Device configuration
         self.device_ip = device_ip
         self._setup_device_configuration()
         
-        # URL for access control events
-        self.url = f"http://{self.ip}:{self.port}/ISAPI/AccessControl/AcsEvent?format=json"
+        # Push-based ingestion (alertStream) with polling as the fallback
+        self.ingestion = get_ingestion_settings(getattr(parent_display, 'app_settings', {}))
         
-        # Keep track of processed events
-        self.processed_events = set()
+        # AcsEvent search, paging and de-duplication for this device
+        self.poller = AcsEventPoller(self.ip, self.port, self.username, self.password, self.device_ip,
+                                     settings=self.ingestion)
+        self.alert_listener = None
+        self.stream_retry_at = None
         
         # Watchdog timer
         self.watchdog_timer = QTimer()
@@ -363,143 +347,64 @@ class CustomAuthEventMonitor(QThread):
         if not self.running:
             return
         
-        time_since_last_fetch = (datetime.now() - self.last_successful_fetch).total_seconds()
+        time_since_last_fetch = (datetime.now() - self.poller.last_successful_fetch).total_seconds()
         if time_since_last_fetch > 600:  # 10 minutes
             logging.warning(f"No events received for {time_since_last_fetch} seconds. Resetting connection.")
-            self.start_time = datetime.now()
-            self.consecutive_errors = 0
-            self.last_successful_fetch = datetime.now()
+            self.poller.reset_window()
     
     def run(self):
         """Main monitoring loop for custom mode"""
         logging.info("Custom auth event monitoring started")
         
         while self.running:
-            try:
-                # Set time range (from start time to now)
-                end_time = datetime.now() 
-                end_time_str = end_time.strftime('%Y-%m-%dT%H:%M:%S+05:30')
-                start_time_str = self.start_time.strftime('%Y-%m-%dT%H:%M:%S+05:30')
-                
-                # Initialize pagination variables
-                search_position = 0
-                total_matches = None
-                num_matches = 0
-                has_more_pages = True
-                processed_ids = set()
-                
-                # Fetch all pages of results
-                while has_more_pages and self.running:
-                    payload = {
-                        "AcsEventCond": {
-                            "searchID": "1",
-                            "searchResultPosition": search_position,
-                            "maxResults": 5,
-                            "major": 5,  # Access Control
-                            "minor": 0,  # Authentication passed
-                            "startTime": start_time_str,
-                            "endTime": end_time_str
-                        }
-                    }
-                    
-                    # Make the request
-                    response = requests.post(
-                        self.url,
-                        json=payload,
-                        auth=HTTPDigestAuth(self.username, self.password),
-                        timeout=30,
-                        headers={'Content-Type': 'application/json'}
-                    )
-                    
-                    # Process successful responses
-                    if response.status_code == 200:
-                        self.consecutive_errors = 0
-                        self.last_successful_fetch = datetime.now()
-                        
-                        try:
-                            data = response.json()
-                            
-                            if total_matches is None and "AcsEvent" in data and "totalMatches" in data["AcsEvent"]:
-                                total_matches = int(data["AcsEvent"]["totalMatches"])
-                            
-                            if "AcsEvent" in data:
-                                info_list = data["AcsEvent"].get("InfoList", [])
-                                page_events = len(info_list)
-                                
-                                if page_events == 0:
-                                    has_more_pages = False
-                                    break
-                                
-                                for event in info_list:
-                                    event_time = event.get('time')
-                                    event_id = f"{event.get('employeeNoString', event.get('employeeNo', 'N/A'))}-{event_time}"
-                                    
-                                    if event_id in processed_ids:
-                                        continue
-                                        
-                                    processed_ids.add(event_id)
-                                    
-                                    if event_id not in self.processed_events:
-                                        self.processed_events.add(event_id)
-                                        
-                                        emp_id = event.get('employeeNoString', event.get('employeeNo', 'N/A'))
-                                        name = event.get('name', 'N/A')
-                                        logging.info(f"New authentication event: Employee ID={emp_id}, Name={name}, Time={event_time}")
-                                        
-                                        event['source_device_ip'] = self.device_ip
-                                        event['deviceIP'] = self.ip
-                                        
-                                        self.communicator.new_auth_event.emit(event)
-                                
-                                num_matches += page_events
-                                search_position += page_events
-                                
-                                if (total_matches is not None and num_matches >= total_matches) or num_matches >= 300:
-                                    has_more_pages = False
-                                    break
-                            else:
-                                has_more_pages = False
-                        
-                        except json.JSONDecodeError as json_err:
-                            logging.error(f"Response is not valid JSON: {json_err}")
-                            self.consecutive_errors += 1
-                            has_more_pages = False
-                    else:
-                        logging.error(f"API request failed with status code: {response.status_code}")
-                        self.consecutive_errors += 1
-                        has_more_pages = False
-                
-                # Limit the size of processed_events to avoid memory issues
-                if len(self.processed_events) > 1000:
-                    self.processed_events = set(list(self.processed_events)[-500:])
-                
-            except requests.exceptions.Timeout:
-                logging.error(f"Timeout connecting to {self.ip}:{self.port}")
-                self.consecutive_errors += 1
-                time.sleep(2)
-            except requests.exceptions.ConnectionError:
-                logging.error(f"Connection error for {self.ip}:{self.port}. Device may be offline.")
-                self.consecutive_errors += 1
-                time.sleep(5)
-            except Exception as e:
-                logging.error(f"Error in monitoring loop: {e}")
-                self.consecutive_errors += 1
+            # Hold the alertStream while it is healthy, then poll once to cover the gap
+            if self.ingestion['mode'] == 'alertStream' and (
+                    self.stream_retry_at is None or datetime.now() >= self.stream_retry_at):
+                self._consume_alert_stream()
+                if not self.running:
+                    return
+                self.stream_retry_at = datetime.now() + timedelta(seconds=self.ingestion['streamRetrySeconds'])
             
-            # Check if we've had too many consecutive errors
-            if self.consecutive_errors >= self.max_consecutive_errors:
-                logging.warning(f"Reached {self.consecutive_errors} consecutive errors. Resetting connection...")
-                self.consecutive_errors = 0
-                self.start_time = datetime.now()
-                time.sleep(10)
+            # Search the AcsEvent log and emit anything new
+            delay = self.poller.poll(self.communicator.new_auth_event.emit, lambda: self.running)
+            if delay:
+                time.sleep(delay)
             
-            # Sleep for a short period before the next check
-            time.sleep(1)
+            # Adaptive wait: short while punches are arriving, longer when the counter is quiet
+            time.sleep(self.poller.interval)
+    
+    def _consume_alert_stream(self):
+        """Receive events from the device's alertStream until it drops"""
+        self.alert_listener = AlertStreamListener(
+            self.ip, self.port, self.username, self.password,
+            read_timeout=self.ingestion['streamReadTimeout'],
+            session=self.poller.client.session
+        )
+        self.poller.last_successful_fetch = datetime.now()
+        
+        def on_event(event):
+            self.poller.consecutive_errors = 0
+            self.poller.last_successful_fetch = datetime.now()
+            if self.poller.mark_processed(event):
+                self.communicator.new_auth_event.emit(self.poller.tag_event(event))
+                self.poller.save_cursor()
+        
+        delivered = self.alert_listener.listen(on_event, lambda: self.running)
+        self.alert_listener = None
+        
+        if self.running:
+            logging.warning(f"alertStream for {self.ip}:{self.port} ended after {delivered} events, falling back to polling")
     
     def stop(self):
         """Stop the monitoring thread"""
         logging.info("Custom auth event monitoring stopping...")
         self.running = False
         
+        # Unblock a thread waiting on the alertStream
+        listener = self.alert_listener
+        if listener:
+            listener.close()
+        
         if self.watchdog_timer.isActive():
             self.watchdog_timer.stop()
         
@@ -880,6 +785,8 @@ class CustomLiveDisplay(QMainWindow):
         
         # Load application settings
         self.load_app_settings()
+        # Load the license once, in the background, instead of per order
+        license_context.prime()
         
         # Initialize UI
         self.init_ui()
@@ -890,8 +797,7 @@ class CustomLiveDisplay(QMainWindow):
     def load_app_settings(self):
         """Load application settings from appSettings.json"""
         try:
-            with open('appSettings.json', 'r', encoding='utf-8') as f:
-                self.app_settings = json.load(f)
+            self.app_settings = settings_service.get()
             
             # Get food items from custom mode
             custom_config = self.app_settings.get('CanteenMenu', {}).get('custom', {})
@@ -904,6 +810,7 @@ class CustomLiveDisplay(QMainWindow):
             self.printer_port = printer_config.get('Port', 9100)
             self.header = printer_config.get('Header', {'enable': True, 'text': "EzeeCanteen"})
             self.footer = printer_config.get('Footer', {'enable': True, 'text': "Thank you!"})
+            self.logo = printer_config.get('Logo', {'enable': False, 'path': ''})
             
             logging.info(f"Loaded {len(self.food_items)} food items for custom mode")
             
@@ -915,6 +822,7 @@ class CustomLiveDisplay(QMainWindow):
             self.printer_port = 9100
             self.header = {'enable': True, 'text': "EzeeCanteen"}
             self.footer = {'enable': True, 'text': "Thank you!"}
+            self.logo = None
     
     def delayed_initialization(self):
         """Initialize devices and start monitoring after UI is ready"""
@@ -944,20 +852,14 @@ class CustomLiveDisplay(QMainWindow):
             self.db_available = False
             logging.error(f"Database connection error: {e}")
         
-        # Test printer connection
+        # Printer status is cached by the spooler's background health checks
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(1)
-            result = s.connect_ex((self.printer_ip, self.printer_port))
-            s.close()
-            self.printer_available = (result == 0)
-            if self.printer_available:
-                logging.info(f"Printer connection successful ({self.printer_ip}:{self.printer_port})")
-            else:
-                logging.warning(f"Printer connection failed ({self.printer_ip}:{self.printer_port})")
+            spooler = get_print_spooler()
+            spooler.watch(self.printer_ip, self.printer_port)
+            self.printer_available = spooler.available(self.printer_ip, self.printer_port)
         except Exception as e:
             self.printer_available = False
-            logging.error(f"Error testing printer connection: {e}")
+            logging.error(f"Error reading printer status: {e}")
     
     def initialize_devices(self):
         """Initialize authentication devices for custom mode"""
@@ -982,6 +884,9 @@ class CustomLiveDisplay(QMainWindow):
                 'available': False
             }
             
+            # Status of the printer and its group, for routing receipts
+            get_print_spooler().watch(printer_config['ip'], printer_config.get('port', 9100))
+            
             # Start authentication monitor for this device
             auth_monitor = CustomAuthEventMonitor(self.communicator, device_ip, self)
             auth_monitor.start()
@@ -998,18 +903,14 @@ class CustomLiveDisplay(QMainWindow):
         QTimer.singleShot(2000, self.test_printer_connections)
     
     def test_printer_connections(self):
-        """Test all configured printer connections"""
+        """Refresh each device printer's status from the spooler's cache (no network I/O)"""
         if not self.device_printers:
             return
         
+        spooler = get_print_spooler()
         for device_ip, printer in self.device_printers.items():
             try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(1)
-                result = s.connect_ex((printer['ip'], printer['port']))
-                s.close()
-                
-                printer['available'] = (result == 0)
+                printer['available'] = spooler.available(printer['ip'], printer['port'])
                 if printer['available']:
                     logging.info(f"Printer {printer['ip']}:{printer['port']} for device {device_ip} is available")
                 else:
@@ -1321,37 +1222,42 @@ class CustomLiveDisplay(QMainWindow):
             if 'T' in punch_time:
                 punch_time = punch_time.replace('T', ' ').split('+')[0]
             
-            # Determine which printer to use
+            # Determine which printer to use. The print spooler sends the
+            # receipt to the best printer of the device printer's group
+            # (PrinterGroups) and journals it if none of them can print now
             source_device_ip = event_data.get('source_device_ip')
             printer_used = False
+            print_note = ""
             
-            # Try device-specific printer first
             if source_device_ip and source_device_ip in self.device_printers:
                 printer = self.device_printers[source_device_ip]
-                if printer['available']:
-                    try:
-                        # Use custom print function for better formatting
-                        print_custom_slip(
-                            printer['ip'],
-                            printer['port'],
-                            self.header,
-                            self.cart_items,  # Pass cart items instead of order text
-                            emp_id,
-                            emp_name,
-                            punch_time,
-                            self.special_message,
-                            self.footer
-                        )
-                        printer_used = True
-                        logging.info(f"Custom receipt printed for {emp_name} on printer {printer['ip']}:{printer['port']} - Total: ₹{self.cart_total}")
-                    except Exception as e:
-                        logging.error(f"Error printing custom receipt on device printer: {e}")
+                try:
+                    # Use custom print function for better formatting
+                    printer_used = print_custom_slip(
+                        printer['ip'],
+                        printer['port'],
+                        self.header,
+                        self.cart_items,  # Pass cart items instead of order text
+                        emp_id,
+                        emp_name,
+                        punch_time,
+                        self.special_message,
+                        self.footer,
+                        logo=self.logo
+                    )
+                    if printer_used:
+                        logging.info(f"Custom receipt queued for {emp_name} on printer {printer['ip']}:{printer['port']} - Total: ₹{self.cart_total}")
+                        if not (printer['available'] or get_print_spooler().available(printer['ip'], printer['port'])):
+                            print_note = "\nReceipt will print when the printer is back."
+                except Exception as e:
+                    logging.error(f"Error printing custom receipt on device printer: {e}")
             
-            # Fallback to default printer if device printer failed or not available
-            if not printer_used and self.printer_available:
+            # Devices without a printer of their own use the default printer,
+            # even while it is down: the spooler and journal hold the receipt
+            elif self.printer_ip:
                 try:
                     # Use custom print function for better formatting
-                    print_custom_slip_wide(
+                    printer_used = print_custom_slip_wide(
                         self.printer_ip,
                         self.printer_port,
                         self.header,
@@ -1360,21 +1266,24 @@ class CustomLiveDisplay(QMainWindow):
                         emp_name,
                         punch_time,
                         self.special_message,
-                        self.footer
+                        self.footer,
+                        logo=self.logo
                     )
-                    printer_used = True
-                    logging.info(f"Custom receipt printed for {emp_name} on default printer {self.printer_ip}:{self.printer_port} - Total: ₹{self.cart_total}")
+                    if printer_used:
+                        logging.info(f"Custom receipt queued for {emp_name} on default printer {self.printer_ip}:{self.printer_port} - Total: ₹{self.cart_total}")
+                        if not get_print_spooler().available(self.printer_ip, self.printer_port):
+                            print_note = "\nReceipt will print when the printer is back."
                 except Exception as e:
                     logging.error(f"Error printing custom receipt on default printer: {e}")
             
             if not printer_used:
-                QMessageBox.warning(self, "Print Error", "Could not print receipt - no printer available")
+                print_note = "\nCould not print receipt - no printer available."
             
             # Show success message
             QMessageBox.information(self, "Order Processed", 
                                    f"Order processed for {emp_name}!\n"
                                    f"Total: ₹{self.cart_total}\n"
-                                   f"Items: {len(self.cart_items)}")
+                                   f"Items: {len(self.cart_items)}{print_note}")
             
             # Clear cart after successful order
             self.cart_items.clear()
@@ -1438,24 +1347,7 @@ class CustomLiveDisplay(QMainWindow):
             device_ip = event_data.get('deviceIP', IP)
             
             # Get license key
-            license_key = ""
-            try:
-                license_manager = LicenseManager()
-                
-                def get_license_data():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        license_data = loop.run_until_complete(license_manager.get_license_db())
-                        return license_data
-                    finally:
-                        loop.close()
-                
-                license_data = get_license_data()
-                if license_data and 'LicenseKey' in license_data:
-                    license_key = license_data['LicenseKey']
-            except Exception as e:
-                logging.error(f"Error getting license key: {e}")
+            license_key = get_license_key()
             
             # Get device serial
             serial_no = ""
@@ -1594,31 +1486,9 @@ class CustomLiveDisplay(QMainWindow):
         try:
             # Import the settings module and get settings window with license key
             from settings import main as settings_main
-            from licenseManager import LicenseManager
-            import asyncio
             
             # Get license key
-            license_manager = LicenseManager()
-            
-            async def get_license_data_async():
-                try:
-                    return await license_manager.get_license_db()
-                except Exception as e:
-                    logging.error(f"Error getting license data: {e}")
-                    return None
-                    
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_data = loop.run_until_complete(get_license_data_async())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            # Get license data
-            license_data = get_license_data()
-            license_key = license_data.get('LicenseKey') if license_data else None
+            license_key = get_license_key() or None
             
             # Save current window geometry
             geometry = self.geometry()
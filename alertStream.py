@@ -0,0 +1,464 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+
+import requests
+from requests.auth import HTTPDigestAuth
+
+from deviceClient import SharedDigestAuth
+
+# Path of the long-lived ISAPI event stream
+ALERT_STREAM_PATH = "/ISAPI/Event/notification/alertStream"
+
+# Boundary used when the device does not announce one in Content-Type
+DEFAULT_BOUNDARY = "MIME_boundary"
+
+# Access control events only (same filter as the AcsEvent search)
+ACCESS_CONTROL_MAJOR = 5
+
+# How long an event that announces a picture waits for it before it is
+# delivered without one
+PICTURE_WAIT_SECONDS = 0.5
+
+
+def get_boundary(content_type):
+    """Extract the multipart boundary from a Content-Type header"""
+    match = re.search(r'boundary="?([^";]+)"?', content_type or '')
+    if match:
+        return match.group(1)
+    return DEFAULT_BOUNDARY
+
+
+class MultipartStreamParser:
+    """Incremental parser for an endless multipart/mixed body.
+
+    Feed raw chunks as they arrive; complete parts are returned as
+    (headers, body) tuples. Parts with a Content-Length are sliced directly,
+    parts without one are terminated by the next boundary.
+    """
+
+    def __init__(self, boundary):
+        self.delimiter = b"--" + boundary.encode()
+        self.buffer = b""
+
+    def feed(self, chunk):
+        """Add a chunk of the stream and return any completed parts"""
+        self.buffer += chunk
+        parts = []
+        while True:
+            part = self._next_part()
+            if part is None:
+                break
+            parts.append(part)
+        return parts
+
+    def _next_part(self):
+        start = self.buffer.find(self.delimiter)
+        if start < 0:
+            # Keep only a tail that may hold a partial delimiter
+            keep = len(self.delimiter) + 2
+            if len(self.buffer) > keep:
+                self.buffer = self.buffer[-keep:]
+            return None
+
+        header_start = start + len(self.delimiter)
+        header_end = self.buffer.find(b"\r\n\r\n", header_start)
+        if header_end < 0:
+            return None
+
+        headers = {}
+        for line in self.buffer[header_start:header_end].split(b"\r\n"):
+            if b":" in line:
+                key, value = line.split(b":", 1)
+                headers[key.strip().lower().decode('latin-1')] = value.strip().decode('latin-1')
+
+        body_start = header_end + 4
+        length = headers.get('content-length')
+        if length and length.isdigit():
+            body_end = body_start + int(length)
+            if len(self.buffer) < body_end:
+                return None
+            body = self.buffer[body_start:body_end]
+            self.buffer = self.buffer[body_end:]
+        else:
+            next_start = self.buffer.find(self.delimiter, body_start)
+            if next_start < 0:
+                return None
+            body = self.buffer[body_start:next_start].rstrip(b"\r\n")
+            self.buffer = self.buffer[next_start:]
+
+        return headers, body
+
+
+def alert_to_acs_event(alert):
+    """Convert an alertStream AccessControllerEvent into an AcsEvent InfoList entry.
+
+    Returns None for heartbeats and anything that is not an access control event.
+    """
+    if alert.get('eventType') != 'AccessControllerEvent':
+        return None
+
+    info = alert.get('AccessControllerEvent', {}) or {}
+    if int(info.get('majorEventType', 0) or 0) != ACCESS_CONTROL_MAJOR:
+        return None
+
+    event = {
+        'major': ACCESS_CONTROL_MAJOR,
+        'minor': int(info.get('subEventType', 0) or 0),
+        'time': alert.get('dateTime', datetime.now().strftime('%Y-%m-%dT%H:%M:%S+05:30')),
+        'name': info.get('name', ''),
+        'serialNo': info.get('serialNo'),
+        'cardReaderNo': info.get('cardReaderNo'),
+        'currentVerifyMode': info.get('currentVerifyMode'),
+        'label': info.get('label', ''),
+        'pictureURL': info.get('pictureURL', ''),
+        'picturesNumber': int(info.get('picturesNumber', 0) or 0),
+    }
+
+    # Keep the same employee fields as the AcsEvent search response
+    if info.get('employeeNoString'):
+        event['employeeNoString'] = info['employeeNoString']
+    if info.get('employeeNo') is not None:
+        event['employeeNo'] = info['employeeNo']
+
+    if info.get('attendanceStatus'):
+        event['AttendanceInfo'] = {
+            'attendanceStatus': info.get('attendanceStatus'),
+            'labelName': info.get('label', ''),
+        }
+
+    return event
+
+
+class AlertEventAssembler:
+    """Turns multipart parts into events, attaching an inline picture to the
+    event announced just before it.
+
+    An event that announces a picture is held for at most picture_wait
+    seconds; the listener calls expire() when no part has arrived by then.
+    """
+
+    def __init__(self, on_event, source="", picture_wait=PICTURE_WAIT_SECONDS):
+        self.on_event = on_event
+        self.source = source
+        self.picture_wait = picture_wait
+        self.pending = None
+        self.pending_deadline = None
+        self.delivered = 0
+
+    def _deliver(self, event):
+        self.on_event(event)
+        self.delivered += 1
+
+    def add_part(self, headers, body):
+        content_type = headers.get('content-type', '')
+
+        if content_type.startswith('image/'):
+            # Picture that belongs to the event announced just before it
+            if self.pending is not None:
+                self.pending['pictureData'] = body
+                self.flush()
+            return
+
+        self.flush()
+
+        if 'json' not in content_type:
+            return
+
+        try:
+            event = alert_to_acs_event(json.loads(body.decode('utf-8')))
+        except ValueError as parse_err:
+            logging.error(f"Invalid alertStream part from {self.source}: {parse_err}")
+            return
+
+        if event is None:
+            return
+
+        if event['picturesNumber'] > 0:
+            self.pending = event
+            self.pending_deadline = time.monotonic() + self.picture_wait
+        else:
+            self._deliver(event)
+
+    def time_left(self):
+        """Seconds until the held event is due, or None if nothing is held"""
+        if self.pending is None:
+            return None
+        return max(0, self.pending_deadline - time.monotonic())
+
+    def expire(self):
+        """Deliver the held event without its picture once its deadline has passed"""
+        if self.pending is not None and time.monotonic() >= self.pending_deadline:
+            logging.warning(f"alertStream picture for serial {self.pending.get('serialNo')} from "
+                            f"{self.source} did not follow; delivering the event without it")
+            self.flush()
+
+    def flush(self):
+        """Deliver an event that is still waiting for its picture"""
+        if self.pending is not None:
+            event, self.pending = self.pending, None
+            self._deliver(event)
+
+
+class AlertStreamListener:
+    """Holds one /ISAPI/Event/notification/alertStream connection to a device.
+
+    listen() blocks while the stream is healthy and hands every access
+    control event to on_event. It returns when the stream drops, the read
+    timeout expires (devices send heartbeats, so silence means a dead link)
+    or should_continue() turns False. Callers decide how to fall back.
+    listen_async() does the same on an asyncio event loop without a thread.
+    """
+
+    def __init__(self, ip, port, username, password, read_timeout=40, session=None):
+        self.ip = ip
+        self.port = port
+        self.url = f"http://{ip}:{port}{ALERT_STREAM_PATH}"
+        self.username = username
+        self.password = password
+        self.read_timeout = read_timeout
+        self.session = session
+        self.response = None
+        self.writer = None
+
+    def listen(self, on_event, should_continue=lambda: True):
+        """Consume the stream until it drops. Returns the number of events delivered."""
+        assembler = AlertEventAssembler(on_event, f"{self.ip}:{self.port}")
+        lock = threading.Lock()
+        timer = None
+        http = self.session or requests
+        # A device session carries its own shared digest auth
+        auth = getattr(self.session, 'auth', None) or HTTPDigestAuth(self.username, self.password)
+        try:
+            self.response = http.get(
+                self.url,
+                auth=auth,
+                stream=True,
+                timeout=(5, self.read_timeout)
+            )
+
+            if self.response.status_code != 200:
+                logging.error(f"alertStream request to {self.ip}:{self.port} failed with status code: {self.response.status_code}")
+                return assembler.delivered
+
+            logging.info(f"alertStream connected to {self.ip}:{self.port}")
+            parser = MultipartStreamParser(get_boundary(self.response.headers.get('Content-Type')))
+
+            # The read below blocks, so a timer delivers an event whose picture
+            # is late; the lock keeps on_event calls one at a time
+            def expire():
+                with lock:
+                    assembler.expire()
+
+            for chunk in self._iter_chunks():
+                if not should_continue():
+                    break
+                with lock:
+                    for headers, body in parser.feed(chunk):
+                        assembler.add_part(headers, body)
+                    if timer is not None:
+                        timer.cancel()
+                        timer = None
+                    if assembler.pending is not None:
+                        timer = threading.Timer(assembler.time_left(), expire)
+                        timer.daemon = True
+                        timer.start()
+
+            with lock:
+                assembler.flush()
+
+        except requests.exceptions.ConnectionError as e:
+            # requests wraps read timeouts on a streamed body as ConnectionError
+            logging.warning(f"alertStream to {self.ip}:{self.port} dropped: {e}")
+        except requests.exceptions.Timeout:
+            logging.warning(f"alertStream to {self.ip}:{self.port} timed out")
+        except Exception as e:
+            logging.error(f"alertStream error for {self.ip}:{self.port}: {e}")
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self.close()
+
+        return assembler.delivered
+
+    def _iter_chunks(self):
+        """Yield stream data as soon as it arrives instead of waiting for full chunks"""
+        raw = self.response.raw
+        if hasattr(raw, 'read1'):
+            while True:
+                chunk = raw.read1(4096)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            yield from self.response.iter_content(chunk_size=1)
+
+    async def listen_async(self, on_event, should_continue=lambda: True):
+        """Coroutine version of listen() built on asyncio streams"""
+        assembler = AlertEventAssembler(on_event, f"{self.ip}:{self.port}")
+        read = None
+        try:
+            reader, status, headers = await self._open_stream_async()
+
+            if status != 200:
+                logging.error(f"alertStream request to {self.ip}:{self.port} failed with status code: {status}")
+                return assembler.delivered
+
+            logging.info(f"alertStream connected to {self.ip}:{self.port}")
+            parser = MultipartStreamParser(get_boundary(headers.get('content-type')))
+            chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+
+            read = None
+            while should_continue():
+                # One read stays in flight while a held event's deadline passes
+                if read is None:
+                    read = asyncio.ensure_future(self._read_chunk_async(reader, chunked))
+                done, _ = await asyncio.wait({read}, timeout=assembler.time_left())
+                if not done:
+                    assembler.expire()
+                    continue
+                chunk, read = read.result(), None
+                if not chunk:
+                    break
+                for part_headers, body in parser.feed(chunk):
+                    assembler.add_part(part_headers, body)
+
+            assembler.flush()
+
+        except asyncio.TimeoutError:
+            logging.warning(f"alertStream to {self.ip}:{self.port} timed out")
+        except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+            logging.warning(f"alertStream to {self.ip}:{self.port} dropped: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"alertStream error for {self.ip}:{self.port}: {e}")
+        finally:
+            if read is not None:
+                read.cancel()
+            self.close()
+
+        return assembler.delivered
+
+    async def _open_stream_async(self):
+        """Send the stream request, answering one digest challenge if asked"""
+        authorization = None
+        while True:
+            reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ip, int(self.port)), timeout=5)
+
+            request = (
+                f"GET {ALERT_STREAM_PATH} HTTP/1.1\r\n"
+                f"Host: {self.ip}:{self.port}\r\n"
+                f"Connection: keep-alive\r\n"
+            )
+            if authorization:
+                request += f"Authorization: {authorization}\r\n"
+            self.writer.write((request + "\r\n").encode())
+            await self.writer.drain()
+
+            status_line = await asyncio.wait_for(reader.readline(), timeout=self.read_timeout)
+            parts = status_line.decode('latin-1').split()
+            status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=self.read_timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                if b":" in line:
+                    key, value = line.decode('latin-1').split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+
+            challenge = headers.get('www-authenticate', '')
+            if status == 401 and authorization is None and challenge.lower().startswith('digest'):
+                authorization = self._digest_authorization(challenge)
+                self.close()
+                continue
+
+            return reader, status, headers
+
+    def _digest_authorization(self, challenge):
+        """Build a digest Authorization header for the stream request"""
+        # A device session's auth keeps the reader's nonce for its other requests
+        auth = getattr(self.session, 'auth', None)
+        if not isinstance(auth, SharedDigestAuth):
+            auth = SharedDigestAuth(self.username, self.password)
+        auth.chal = requests.utils.parse_dict_header(challenge.split(' ', 1)[1])
+        return auth.authorization('GET', self.url)
+
+    async def _read_chunk_async(self, reader, chunked):
+        if not chunked:
+            return await asyncio.wait_for(reader.read(4096), timeout=self.read_timeout)
+
+        size_line = await asyncio.wait_for(reader.readline(), timeout=self.read_timeout)
+        size = int(size_line.split(b";")[0].strip() or b"0", 16)
+        if size == 0:
+            return b""
+        data = await asyncio.wait_for(reader.readexactly(size + 2), timeout=self.read_timeout)
+        return data[:-2]
+
+    def close(self):
+        """Close the underlying connection so a blocked read returns"""
+        response = self.response
+        self.response = None
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+        writer = self.writer
+        self.writer = None
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+
+# Benchmark: punch-to-delivery latency through the stand-in stream
+if __name__ == "__main__":
+    from mockIsapiServer import MockAlertStreamServer
+
+    logging.basicConfig(level=logging.INFO)
+
+    event_count = 200
+    server = MockAlertStreamServer(heartbeat_interval=1).start()
+    listener = AlertStreamListener(server.host, server.port, "admin", "admin", read_timeout=5)
+
+    sent_at = {}
+    latencies = []
+    done = threading.Event()
+
+    def on_event(event):
+        latencies.append(time.perf_counter() - sent_at[event['serialNo']])
+        if len(latencies) >= event_count:
+            done.set()
+
+    listen_thread = threading.Thread(target=listener.listen, args=(on_event, lambda: not done.is_set()), daemon=True)
+    listen_thread.start()
+
+    while server.client_count() == 0:
+        time.sleep(0.01)
+
+    for i in range(event_count):
+        serial_no = server.serial_no + 1
+        sent_at[serial_no] = time.perf_counter()
+        server.push_event(1000 + i, f"Employee {i}", picture=b"\xff\xd8fake-jpeg\xff\xd9" if i % 2 else None)
+        time.sleep(0.002)
+
+    done.wait(10)
+    listener.close()
+    server.stop()
+
+    latencies.sort()
+    if latencies:
+        print(f"Delivered {len(latencies)}/{event_count} events")
+        print(f"Median latency: {latencies[len(latencies) // 2] * 1000:.2f} ms")
+        print(f"p95 latency:    {latencies[int(len(latencies) * 0.95) - 1] * 1000:.2f} ms")
+        print("Polling baseline adds up to 1000 ms per event (1 s AcsEvent loop)")
@@ -0,0 +1,20 @@
+import os
+import platform
+
+
+def get_user_data_path():
+    """Get the user data directory path based on the operating system"""
+    system = platform.system()
+    if system == "Windows":
+        return os.path.join(os.environ.get('APPDATA', ''), 'EzeeCanteen')
+    elif system == "Darwin":  # macOS
+        return os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'EzeeCanteen')
+    else:  # Linux
+        return os.path.join(os.path.expanduser('~'), '.config', 'EzeeCanteen')
+
+
+def get_data_file(name):
+    """Path of a state file kept in the user data directory (created if missing)"""
+    path = get_user_data_path()
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, name)
@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+
+def get_backfill_settings(app_settings):
+    """Return the outage backfill settings with defaults filled in"""
+    ingestion = (app_settings or {}).get('EventIngestion', {}) or {}
+    return {
+        'enabled': bool(ingestion.get('backfillEnabled', True)),
+        'workers': int(ingestion.get('backfillWorkers', 2)),
+        'requestsPerSecond': float(ingestion.get('backfillRequestsPerSecond', 2)),
+    }
+
+
+class BackfillManager:
+    """Recovers punches made while a reader was unreachable.
+
+    AcsEventPoller records an outage window when it gives up on a device and
+    hands it here once the device answers again. The missed interval is
+    paged through on a small background pool, at most requestsPerSecond
+    searches per device, so live polling and the alertStream keep running
+    alongside. Recovered events are tagged backfilled=True: the display
+    stores them in the database but never prints a token for them.
+    """
+
+    def __init__(self, on_event, app_settings=None):
+        self.on_event = on_event
+        self.settings = get_backfill_settings(app_settings)
+        self.executor = ThreadPoolExecutor(max_workers=self.settings['workers'], thread_name_prefix='backfill')
+        self.jobs = {}  # device key -> Future
+        self.lock = threading.Lock()
+        self.running = True
+
+    def attach(self, poller):
+        """Let a poller hand outages to this manager; resumes a window left from a previous run"""
+        if not self.settings['enabled']:
+            return
+        poller.backfill = self
+        outage = poller.get_outage()
+        if outage and outage.get('end'):
+            self.schedule(poller)
+
+    def schedule(self, poller):
+        """Queue the poller's recorded outage window for recovery"""
+        if not self.running:
+            return
+        with self.lock:
+            job = self.jobs.get(poller.cursor_key)
+            if job and not job.done():
+                return  # The running job re-reads the window before it finishes
+            self.jobs[poller.cursor_key] = self.executor.submit(self._run, poller)
+
+    def stop(self):
+        self.running = False
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, poller):
+        # Loops while a newer outage extended the window during the previous pass
+        while self.running:
+            outage = poller.get_outage()
+            if not outage or not outage.get('end'):
+                return
+            if not self._recover(poller, outage['start'], outage['end']):
+                return
+            if poller.clear_outage(outage['end']):
+                return
+
+    def _recover(self, poller, start, end):
+        """Page through one window; False if the device failed and it must wait for the next reconnect"""
+        logging.info(f"Backfilling {poller.ip}:{poller.port} from {start} to {end}")
+        interval = 1.0 / self.settings['requestsPerSecond'] if self.settings['requestsPerSecond'] > 0 else 0
+        started = time.monotonic()
+        recovered = 0
+        try:
+            for page in poller.iter_range(start, end, lambda: self.running):
+                for event in page:
+                    if poller.mark_backfilled(event):
+                        event['backfilled'] = True
+                        self.on_event(poller.tag_event(event))
+                        recovered += 1
+                # Bounded rate so the device keeps serving live searches
+                time.sleep(interval)
+        except Exception as e:
+            logging.error(f"Backfill for {poller.ip}:{poller.port} failed: {e}")
+            return False
+
+        elapsed = time.monotonic() - started
+        metrics.observe('backfill_seconds', elapsed, poller.cursor_key)
+        metrics.set_gauge('backfill_recovered_events', recovered, poller.cursor_key)
+        logging.info(f"Backfill for {poller.ip}:{poller.port} recovered {recovered} events in {elapsed:.1f}s")
+        return self.running
@@ -0,0 +1,62 @@
+import heapq
+from datetime import datetime, timedelta
+
+
+def parse_event_time(value):
+    """Event time ('2025-01-31T12:30:05+05:30') as a naive datetime, None if unparseable"""
+    try:
+        return datetime.strptime(str(value)[:19], '%Y-%m-%dT%H:%M:%S')
+    except (TypeError, ValueError):
+        return None
+
+
+class EventDedupIndex:
+    """Bounded record of delivered event ids, ordered by event time.
+
+    Lookups go through a dict; a heap keyed by event time tracks which entry
+    is oldest. Entries are evicted oldest first, either when they fall more
+    than max_age behind the newest event seen (the cursor) or when the index
+    would exceed max_entries. Anything at or before the newest evicted time
+    is reported as already seen, so evicting an entry can never let its
+    event through a second time.
+    """
+
+    def __init__(self, max_entries=5000, max_age=timedelta(hours=3)):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = {}  # event id -> event time
+        self.heap = []  # (event time, event id)
+        self.newest = None  # Latest event time seen
+        self.horizon = None  # Latest event time evicted
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, event_id):
+        return event_id in self.entries
+
+    def add(self, event_id, event_time):
+        """Record an event; return False if it was already seen or is older than the horizon"""
+        if event_id in self.entries:
+            return False
+        event_time = event_time if isinstance(event_time, datetime) else parse_event_time(event_time)
+        if event_time is None:
+            event_time = self.newest or datetime.now()
+        if self.horizon is not None and event_time <= self.horizon:
+            return False
+
+        self.entries[event_id] = event_time
+        heapq.heappush(self.heap, (event_time, event_id))
+        if self.newest is None or event_time > self.newest:
+            self.newest = event_time
+        self._evict()
+        return True
+
+    def _evict(self):
+        cutoff = self.newest - self.max_age
+        while self.heap and (self.heap[0][0] < cutoff or len(self.entries) > self.max_entries):
+            event_time, event_id = heapq.heappop(self.heap)
+            del self.entries[event_id]
+            if self.horizon is None or event_time > self.horizon:
+                self.horizon = event_time
+
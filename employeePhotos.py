@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from appPaths import get_data_file
+from metrics import metrics
+
+# Defaults for the "EmployeePhotos" block of appSettings.json
+DEFAULT_EMPLOYEE_PHOTOS = {
+    'enabled': True,
+    'syncMinutes': 360,
+    'pageSize': 30,
+    'faceLibType': 'blackFD',
+    'FDID': '1',
+    'thumbnailHeight': 100,
+}
+
+
+def get_employee_photo_settings(app_settings):
+    """Return the employee photo sync settings with defaults filled in"""
+    settings = dict(DEFAULT_EMPLOYEE_PHOTOS)
+    settings.update((app_settings or {}).get('EmployeePhotos', {}) or {})
+    return settings
+
+
+def make_thumbnail(content, height=100):
+    """JPEG bytes of the image scaled to height, or None if it cannot be decoded"""
+    from PyQt5.QtCore import Qt, QBuffer, QByteArray, QIODevice
+    from PyQt5.QtGui import QImage
+
+    image = QImage.fromData(content)
+    if image.isNull():
+        return None
+    if image.height() > height:
+        image = image.scaledToHeight(height, Qt.SmoothTransformation)
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, 'JPG', 85)
+    buffer.close()
+    return bytes(data)
+
+
+class EmployeePhotoStore:
+    """Enrolled face of each employee, as a small JPEG named after the employeeNo.
+
+    index.json records the reader and faceURL each photo came from, so a
+    sync only downloads faces that are new or were re-enrolled. Kept in
+    the user data directory; it survives restarts and TEMP_DIR clean-up.
+    """
+
+    def __init__(self, directory, thumbnailer=make_thumbnail, thumbnail_height=100):
+        self.directory = directory
+        self.thumbnailer = thumbnailer
+        self.thumbnail_height = thumbnail_height
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, 'index.json')
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"Could not read {self.index_path}: {e}")
+            return {}
+
+    def save_index(self):
+        with self.lock:
+            index = dict(self.index)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+
+    def _file_for(self, employee_no):
+        # employeeNo comes from the reader; keep it to a safe file name
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_-]', '_', str(employee_no)) + '.jpg')
+
+    def path_for(self, employee_no):
+        """Path of the employee's photo, or None"""
+        if not employee_no or str(employee_no) not in self.index:
+            return None
+        path = self._file_for(employee_no)
+        return path if os.path.exists(path) else None
+
+    def has(self, employee_no):
+        return bool(employee_no) and str(employee_no) in self.index
+
+    def face_url(self, employee_no):
+        entry = self.index.get(str(employee_no))
+        return entry.get('faceURL') if entry else None
+
+    def put(self, employee_no, content, face_url, device_ip):
+        """Store the photo from face_url; returns False if it could not be decoded"""
+        thumbnail = self.thumbnailer(content, self.thumbnail_height)
+        if not thumbnail:
+            return False
+        path = self._file_for(employee_no)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(thumbnail)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.index[str(employee_no)] = {'faceURL': face_url, 'device': device_ip, 'syncedAt': time.time()}
+        return True
+
+    def remove(self, employee_no):
+        with self.lock:
+            self.index.pop(str(employee_no), None)
+        try:
+            os.remove(self._file_for(employee_no))
+        except OSError:
+            pass
+
+    def employees_from(self, device_ip):
+        with self.lock:
+            return [no for no, entry in self.index.items() if entry.get('device') == device_ip]
+
+
+class EmployeePhotoSync:
+    """Background job that copies enrolled faces from every reader into the store.
+
+    Each pass pages through UserInfo/Search (who is enrolled, and with a
+    face) and FDLib/FDSearch (the face URLs), downloads only faces whose
+    URL changed since the last pass and drops photos of users deleted from
+    the reader. Passes run every syncMinutes, skipped while a meal is open
+    so they never compete with punches for the readers.
+    """
+
+    def __init__(self, store, get_devices, app_settings=None, scheduler=None):
+        self.store = store
+        self.get_devices = get_devices  # -> {device_ip: device config}
+        self.settings = get_employee_photo_settings(app_settings)
+        self.scheduler = scheduler
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread or not self.settings['enabled']:
+            return
+        self.thread = threading.Thread(target=self._run, name='EmployeePhotoSync', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        interval = float(self.settings['syncMinutes']) * 60
+        while not self.stop_event.is_set():
+            if self.scheduler and self.scheduler.is_open():
+                # Try again shortly after the meal
+                self.stop_event.wait(300)
+                continue
+            self.sync_all()
+            self.stop_event.wait(interval)
+
+    def sync_all(self):
+        for device_ip, device_config in list(self.get_devices().items()):
+            if self.stop_event.is_set():
+                return
+            try:
+                self.sync_device(device_ip, device_config)
+            except Exception as e:
+                logging.error(f"Employee photo sync failed for {device_ip}: {e}")
+
+    def sync_device(self, device_ip, device_config):
+        """One incremental pass over a reader; returns the number of photos downloaded"""
+        from deviceClient import get_device_client
+
+        started = time.monotonic()
+        client = get_device_client(device_config['ip'], device_config['port'],
+                                   device_config['user'], device_config['password'])
+        enrolled = set(user.get('employeeNo') for user in self._users(client) if user.get('numOfFace', 0))
+        downloaded = 0
+        for face in self._faces(client):
+            employee_no = face.get('FPID')
+            face_url = face.get('faceURL')
+            if not employee_no or not face_url or employee_no not in enrolled:
+                continue
+            if self.store.face_url(employee_no) == face_url and self.store.path_for(employee_no):
+                continue  # Unchanged since the last pass
+            try:
+                response = client.get(face_url, timeout=10)
+                if response.status_code == 200 and self.store.put(employee_no, response.content, face_url, device_ip):
+                    downloaded += 1
+            except Exception as e:
+                logging.warning(f"Could not fetch the face of {employee_no} from {device_ip}: {e}")
+            if self.stop_event.is_set():
+                break
+
+        removed = [no for no in self.store.employees_from(device_ip) if no not in enrolled]
+        for employee_no in removed:
+            self.store.remove(employee_no)
+        self.store.save_index()
+        metrics.observe('employee_photo_sync_seconds', time.monotonic() - started, device_ip)
+        logging.info(f"Employee photos from {device_ip}: {len(enrolled)} enrolled, "
+                     f"{downloaded} downloaded, {len(removed)} removed")
+        return downloaded
+
+    def _pages(self, client, path, make_payload, items_of):
+        position = 0
+        page_size = int(self.settings['pageSize'])
+        while not self.stop_event.is_set():
+            response = client.post(path, json=make_payload(position, page_size), timeout=10)
+            if response.status_code != 200:
+                logging.warning(f"{path} returned HTTP {response.status_code}")
+                return
+            data = response.json()
+            items, status = items_of(data)
+            for item in items:
+                yield item
+            if not items or status != 'MORE':
+                return
+            position += len(items)
+
+    def _users(self, client):
+        def payload(position, page_size):
+            return {"UserInfoSearchCond": {"searchID": "1", "searchResultPosition": position,
+                                           "maxResults": page_size}}
+
+        def items_of(data):
+            search = data.get("UserInfoSearch", {})
+            return search.get("UserInfo", []), search.get("responseStatusStrg")
+
+        return self._pages(client, '/ISAPI/AccessControl/UserInfo/Search?format=json', payload, items_of)
+
+    def _faces(self, client):
+        def payload(position, page_size):
+            return {"searchResultPosition": position, "maxResults": page_size,
+                    "faceLibType": self.settings['faceLibType'], "FDID": str(self.settings['FDID'])}
+
+        def items_of(data):
+            return data.get("MatchList", []), data.get("responseStatusStrg")
+
+        return self._pages(client, '/ISAPI/Intelligent/FDLib/FDSearch?format=json', payload, items_of)
+
+
+_employee_photos = None
+_employee_photos_lock = threading.Lock()
+
+
+def get_employee_photos():
+    """Process-wide employee photo store"""
+    global _employee_photos
+    with _employee_photos_lock:
+        if _employee_photos is None:
+            from settingsService import settings_service
+            settings = get_employee_photo_settings(settings_service.get_or_default())
+            _employee_photos = EmployeePhotoStore(get_data_file('employee_photos'),
+                                                  thumbnail_height=int(settings['thumbnailHeight']))
+        return _employee_photos
+
@@ -0,0 +1,174 @@
+import logging
+import time
+
+from PyQt5 import sip
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+
+from eventHistory import EventHistory, event_sort_key
+from metrics import metrics
+
+
+def grid_columns(window_width):
+    """Number of card columns for the window width"""
+    if window_width >= 1600:
+        return 7  # More columns for very wide windows
+    elif window_width >= 1280:
+        return 5  # 5 columns in wide window
+    elif window_width >= 900:
+        return 4  # 4 columns in medium window
+    elif window_width >= 768:
+        return 3  # 3 columns in smaller medium window
+    return 2  # 2 columns in small window
+
+
+class EventListModel(QAbstractListModel):
+    """Events on the live display, newest first, at most max_events.
+
+    Backed by an EventHistory: add_event() inserts exactly one row at its
+    sorted position (and drops the oldest row once full) instead of
+    re-sorting and rebuilding.
+    """
+
+    EventRole = Qt.UserRole + 1
+
+    def __init__(self, max_events=21, key=event_sort_key, parent=None):
+        super().__init__(parent)
+        self.max_events = max_events
+        self.history = EventHistory(max_events, key)
+
+    @property
+    def events(self):
+        return self.history.records
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.events)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.events):
+            return None
+        event = self.events[index.row()]
+        if role == Qt.DisplayRole:
+            return event.employee_no
+        if role == self.EventRole:
+            return event
+        return None
+
+    def event_at(self, row):
+        return self.events[row] if 0 <= row < len(self.events) else None
+
+    def add_event(self, event):
+        """Insert one event in time order; returns its row, or -1 if it is too old to show"""
+        row = self.history.find_row(event)
+        if row < 0:
+            return -1
+
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.history.insert_row(row, event)
+        self.endInsertRows()
+
+        if len(self.history) > self.max_events:
+            self.beginRemoveRows(QModelIndex(), self.max_events, len(self.history) - 1)
+            self.history.trim()
+            self.endRemoveRows()
+        return row
+
+    def set_events(self, events):
+        self.beginResetModel()
+        self.history.replace(events)
+        self.endResetModel()
+
+    def clear(self):
+        self.set_events([])
+
+
+class EventCardGrid:
+    """Shows an EventListModel as cards in a QGridLayout, reusing the card widgets.
+
+    One card per slot (up to max_events) is created the first time it is
+    needed and then kept. When rows change, only the cards whose event
+    changed are re-bound via card.set_event(); a resize moves and resizes
+    the existing cards without rebuilding them. card_factory() must return
+    a widget with set_event(event) and clear_event().
+    """
+
+    def __init__(self, model, grid_layout, card_factory):
+        self.model = model
+        self.grid_layout = grid_layout
+        self.card_factory = card_factory
+        self.cards = []
+        self.bound = []  # Event shown by each card
+        self.cols = None
+        self.card_width = None
+
+        model.rowsInserted.connect(self._on_rows_changed)
+        model.rowsRemoved.connect(self._on_rows_changed)
+        model.modelReset.connect(self.refresh)
+
+    def _ensure_cards(self, count):
+        # rowsInserted fires while the model briefly holds max_events + 1
+        count = min(count, self.model.max_events)
+        while len(self.cards) < count:
+            card = self.card_factory()
+            if self.card_width:
+                card.setFixedWidth(self.card_width)
+            index = len(self.cards)
+            self.cards.append(card)
+            self.bound.append(None)
+            self._place(card, index)
+
+    def _place(self, card, index):
+        self.grid_layout.addWidget(card, index // self.cols, index % self.cols)
+        self.grid_layout.setAlignment(card, Qt.AlignTop | Qt.AlignLeft)
+
+    def _on_rows_changed(self, parent, first, last):
+        self.refresh(first)
+
+    def is_laid_out(self):
+        return self.cols is not None and not sip.isdeleted(self.grid_layout)
+
+    def refresh(self, first=0):
+        """Re-bind cards from row first onward to the model's events"""
+        if not self.is_laid_out():
+            return  # Bound on the first relayout()
+        started = time.perf_counter()
+        count = self.model.rowCount()
+        self._ensure_cards(count)
+        for row in range(first, len(self.cards)):
+            card = self.cards[row]
+            event = self.model.event_at(row)
+            if event is None:
+                if self.bound[row] is not None:
+                    card.clear_event()
+                    card.hide()
+                    self.bound[row] = None
+                continue
+            if self.bound[row] is not event:
+                card.set_event(event)
+                self.bound[row] = event
+            if card.isHidden():
+                card.show()
+        metrics.observe('grid_update_seconds', time.perf_counter() - started)
+
+    def relayout(self, cols, card_width):
+        """Move and resize the existing cards for a new column count or width"""
+        if sip.isdeleted(self.grid_layout):
+            return
+        started = time.perf_counter()
+        if card_width != self.card_width:
+            self.card_width = card_width
+            for card in self.cards:
+                card.setFixedWidth(card_width)
+        if cols != self.cols:
+            self.cols = cols
+            for card in self.cards:
+                self.grid_layout.removeWidget(card)
+            for index, card in enumerate(self.cards):
+                self._place(card, index)
+        metrics.observe('grid_relayout_seconds', time.perf_counter() - started)
+
+    def log_frame_times(self):
+        for name in ('grid_update_seconds', 'grid_relayout_seconds'):
+            summary = metrics.summary(name)
+            if summary:
+                logging.info(f"{name}: n={summary['count']} p50={summary['p50'] * 1000:.1f}ms "
+                             f"p95={summary['p95'] * 1000:.1f}ms max={summary['max'] * 1000:.1f}ms")
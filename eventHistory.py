@@ -0,0 +1,107 @@
+def event_sort_key(event):
+    return event.get('time', '')
+
+
+class EventHistory:
+    """The most recent events, newest first, holding at most capacity.
+
+    A new event's row is found by binary search over the stored sort keys,
+    so late or out-of-order events land in place without re-sorting, and
+    it goes after events with the same time, as a stable sort would put
+    it. The oldest event is always last, so dropping it is a pop() from
+    the end. Iterating yields events newest first.
+    """
+
+    def __init__(self, capacity, key=event_sort_key):
+        self.capacity = capacity
+        self.key = key
+        self.records = []  # newest first
+        self.keys = []  # self.key(record) for each record, same order
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, row):
+        return self.records[row]
+
+    def find_row(self, event):
+        """Row event would take, or -1 if it is older than everything kept"""
+        key = self.key(event)
+        low, high = 0, len(self.keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self.keys[middle] >= key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self.capacity else -1
+
+    def insert_row(self, row, event):
+        """Put event at row (from find_row); may leave one event over capacity until trim()"""
+        self.records.insert(row, event)
+        self.keys.insert(row, self.key(event))
+
+    def trim(self):
+        """Drop the events beyond capacity (the oldest) and return them"""
+        evicted = []
+        while len(self.records) > self.capacity:
+            self.keys.pop()
+            evicted.append(self.records.pop())
+        return evicted
+
+    def add(self, event):
+        """Insert event in time order; returns its row, or -1 if it is too old to keep"""
+        row = self.find_row(event)
+        if row >= 0:
+            self.insert_row(row, event)
+            self.trim()
+        return row
+
+    def replace(self, events):
+        """Keep the newest capacity events from events"""
+        ordered = sorted(events, key=self.key, reverse=True)[:self.capacity]
+        self.records = ordered
+        self.keys = [self.key(event) for event in ordered]
+
+    def clear(self):
+        self.records = []
+        self.keys = []
+
+
+if __name__ == "__main__":
+    # Microbenchmark: the old per-punch append + sort + truncate against add()
+    import random
+    import time
+    from datetime import datetime, timedelta
+
+    random.seed(11)
+    start = datetime(2025, 1, 31, 12, 0)
+
+    def make_event(seconds, serial):
+        when = start + timedelta(seconds=seconds)
+        return {'time': when.strftime('%Y-%m-%dT%H:%M:%S+05:30'), 'serialNo': serial,
+                'employeeNoString': str(serial % 50), 'name': f"Employee {serial % 50}",
+                'minor': 75, 'major': 5, 'cardReaderNo': 1, 'doorNo': 1, 'verifyNo': 0,
+                'currentVerifyMode': 'cardOrFace', 'mask': 'no', 'userType': 'normal'}
+
+    rounds = 20000
+    events = [make_event(i + random.randint(-10, 0), i) for i in range(rounds)]
+
+    started = time.perf_counter()
+    listed = []
+    for event in events:
+        listed.append(event)
+        listed.sort(key=lambda e: e.get('time', ''), reverse=True)
+        if len(listed) > 21:
+            listed = listed[:21]
+    sort_time = (time.perf_counter() - started) / rounds
+
+    started = time.perf_counter()
+    history = EventHistory(21)
+    for event in events:
+        history.add(event)
+    history_time = (time.perf_counter() - started) / rounds
+    print(f"append + sort: {sort_time * 1e6:.2f}us per punch, EventHistory.add: {history_time * 1e6:.2f}us per punch")
@@ -0,0 +1,638 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import requests
+import xmltodict
+
+from appPaths import get_data_file
+from dedupIndex import EventDedupIndex
+from deviceClient import AsyncDeviceClient, get_device_client
+from mealWindows import get_compiled_schedule
+from metrics import metrics
+
+CURSOR_FILE = "eventCursors.json"
+OUTAGE_FILE = "eventOutages.json"
+CAPABILITIES_FILE = "deviceCapabilities.json"
+CAPABILITIES_PATH = "/ISAPI/AccessControl/AcsEvent/capabilities?format=json"
+DEFAULT_PAGE_SIZE = 5  # Page size every firmware accepts
+
+
+def get_event_id(event):
+    """Key used to recognise an event that was already delivered"""
+    return f"{event.get('employeeNoString', event.get('employeeNo', 'N/A'))}-{event.get('time')}"
+
+
+def get_meal_window_start(meal_schedule, now=None):
+    """Start of the meal window containing now, or None when outside every window"""
+    return get_compiled_schedule({'CanteenMenu': {'MealSchedule': meal_schedule}}).window_start(now)
+
+
+def _cursor_key(event):
+    """(time to the second, serialNo) used to order events from one device"""
+    serial_no = event.get('serialNo')
+    try:
+        serial_no = int(serial_no) if serial_no is not None else None
+    except (TypeError, ValueError):
+        serial_no = None
+    return str(event.get('time', ''))[:19], serial_no
+
+
+def parse_max_results(capabilities):
+    """Largest maxResults an AcsEvent/capabilities response allows, or None"""
+    cond = (capabilities or {}).get('AcsEvent', {}).get('AcsEventCond', {})
+    max_results = cond.get('maxResults')
+    if isinstance(max_results, dict):
+        max_results = max_results.get('@max', max_results.get('max'))
+    try:
+        return int(max_results) if max_results else None
+    except (TypeError, ValueError):
+        return None
+
+
+class JsonStateStore:
+    """Small keyed state saved as one JSON file in the user data directory.
+
+    Shared by every poller (event cursors and outage windows keyed by
+    "ip:port", capabilities keyed by device serial). Writes go through a temporary file so a crash
+    never leaves a half-written file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.values = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.values = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Could not read state from {self.path}: {e}")
+
+    def get(self, device_key):
+        with self.lock:
+            value = self.values.get(device_key)
+            return dict(value) if value else None
+
+    def save(self, device_key, value):
+        with self.lock:
+            self.values[device_key] = value
+            self._write()
+
+    def remove(self, device_key):
+        with self.lock:
+            if self.values.pop(device_key, None) is not None:
+                self._write()
+
+    def _write(self):
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self.values, f, indent=4)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logging.error(f"Could not write {self.path}: {e}")
+
+
+_state_stores = {}
+_state_stores_lock = threading.Lock()
+
+
+def get_state_store(name):
+    """Return the process-wide store for one state file"""
+    with _state_stores_lock:
+        if name not in _state_stores:
+            _state_stores[name] = JsonStateStore(get_data_file(name))
+        return _state_stores[name]
+
+
+class AcsEventPoller:
+    """Searches /ISAPI/AccessControl/AcsEvent on one device and reports new events.
+
+    Shared by the QThread monitors and the asyncio ingestion engine so both
+    ingestion paths page, de-duplicate and recover from errors the same way.
+    The search is written once as request steps (a generator yielding each
+    request and receiving its response): poll() sends them with the
+    blocking device session, poll_async() with non-blocking HTTP on the
+    caller's event loop.
+
+    Each poll searches from the device's cursor (time and serialNo of the
+    newest delivered event) rather than from the start of the meal, so the
+    cost of a poll does not grow as the meal goes on. The cursor is saved
+    and, after a restart, honoured as long as it lies inside the window
+    passed to open_window().
+    """
+
+    def __init__(self, ip, port, username, password, device_ip=None, timeout=30, cursor_store=None,
+                 settings=None):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.device_ip = device_ip
+        self.timeout = timeout
+
+        # URL for access control events
+        self.url = f"http://{self.ip}:{self.port}/ISAPI/AccessControl/AcsEvent?format=json"
+
+        # Keep-alive session shared with every other caller talking to this device
+        self.client = get_device_client(self.ip, self.port, self.username, self.password)
+        self.async_client = None  # Created on the event loop by poll_async()
+
+        self.start_time = datetime.now()  # Start of the search window
+        self.consecutive_errors = 0  # Counter for consecutive errors
+        self.max_consecutive_errors = 5  # Maximum allowed consecutive errors
+        self.last_successful_fetch = datetime.now()  # Track when we last successfully fetched events
+
+        # Keep track of processed events (bounded, evicted oldest first by event time)
+        settings = settings or {}
+        self.processed_events = EventDedupIndex(
+            max_entries=settings.get('dedupMaxEntries', 5000),
+            max_age=timedelta(minutes=settings.get('dedupWindowMinutes', 180))
+        )
+
+        # High-water mark of delivered events, persisted across restarts
+        self.cursor_store = cursor_store or get_state_store(CURSOR_FILE)
+        self.cursor_key = f"{self.ip}:{self.port}"
+        self.cursor = self.cursor_store.get(self.cursor_key)
+        self.cursor_dirty = False
+
+        # Outage window waiting to be backfilled (see backfill.BackfillManager)
+        self.backfill = None
+        self.outage_store = get_state_store(OUTAGE_FILE)
+        outage = self.outage_store.get(self.cursor_key)
+        self.in_outage = bool(outage and not outage.get('end'))
+
+        # The backfill thread shares the dedup index with live ingestion
+        self.lock = threading.Lock()
+
+        # Page size: the device maximum from its capabilities, shrunk while responses are slow
+        self.slow_response_seconds = settings.get('slowResponseSeconds', 2)
+        self.min_page_size = settings.get('minPageSize', DEFAULT_PAGE_SIZE)
+        self.max_page_size = None  # Negotiated on the first poll
+        self.page_size = DEFAULT_PAGE_SIZE
+
+        # Adaptive poll interval: drops to the minimum when a poll finds events,
+        # grows by pollBackoff after each empty poll up to the maximum
+        self.min_interval = settings.get('minPollInterval', 0.25)
+        self.max_interval = settings.get('maxPollInterval', 5)
+        self.backoff = settings.get('pollBackoff', 1.5)
+        self.interval = min(max(settings.get('pollInterval', 1), self.min_interval), self.max_interval)
+
+        # Requests in flight to this reader from poll_async()
+        self.max_connections = max(1, int(settings.get('perDeviceConcurrency', 1)))
+
+    def _run(self, steps):
+        """Send request steps with the blocking session; returns the steps' result"""
+        result = error = None
+        while True:
+            try:
+                request = steps.throw(error) if error else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            method, path, payload, timeout = request
+            result = error = None
+            try:
+                result = self.client.request(method, path, json=payload, timeout=timeout)
+            except Exception as e:
+                error = e
+
+    async def _run_async(self, steps):
+        """Send request steps over non-blocking HTTP on the running loop"""
+        if self.async_client is None:
+            self.async_client = AsyncDeviceClient(self.ip, self.port, self.client.session.auth,
+                                                  self.max_connections)
+        result = error = None
+        while True:
+            try:
+                request = steps.throw(error) if error else steps.send(result)
+            except StopIteration as stop:
+                return stop.value
+            method, path, payload, timeout = request
+            result = error = None
+            try:
+                result = await self.async_client.request(method, path, json=payload, timeout=timeout)
+            except Exception as e:
+                error = e
+
+    def close_async(self):
+        """Drop the connections poll_async() kept open"""
+        if self.async_client:
+            self.async_client.close()
+
+    def _device_serial(self):
+        """Model + serial number from /ISAPI/System/deviceinfo (same format as getDeviceDetails)"""
+        response = yield ('GET', "/ISAPI/System/deviceinfo", None, 5)
+        if response.status_code != 200:
+            return None
+        data = xmltodict.parse(response.text)['DeviceInfo']
+        model = data['model'].replace(" ", "")
+        serial_no = data['serialNumber'].replace(" ", "")
+        return serial_no if model.upper() in serial_no.upper() else model + serial_no
+
+    def _negotiate_page_size(self):
+        """Read the device's maxResults, cached per model/serial so it is asked once"""
+        capabilities_store = get_state_store(CAPABILITIES_FILE)
+        try:
+            device_serial = yield from self._device_serial()
+            cached = capabilities_store.get(device_serial) if device_serial else None
+            if cached:
+                max_results = cached.get('maxResults')
+            else:
+                response = yield ('GET', CAPABILITIES_PATH, None, 10)
+                max_results = parse_max_results(response.json()) if response.status_code == 200 else None
+                max_results = max_results or DEFAULT_PAGE_SIZE
+                if device_serial:
+                    capabilities_store.save(device_serial, {'maxResults': max_results})
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            # Device unreachable; use the safe page size and ask again next poll
+            return
+        except Exception as e:
+            logging.error(f"Could not read AcsEvent capabilities from {self.ip}:{self.port}: {e}")
+            max_results = DEFAULT_PAGE_SIZE
+
+        self.max_page_size = max(1, int(max_results))
+        self.min_page_size = min(self.min_page_size, self.max_page_size)
+        self.page_size = self.max_page_size
+        metrics.set_gauge('acs_page_size', self.page_size, self.cursor_key)
+        logging.info(f"AcsEvent page size for {self.ip}:{self.port} set to {self.page_size}")
+
+    def update_interval(self, delivered):
+        """Pick the wait before the next poll from what this poll found"""
+        if delivered:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        metrics.set_gauge('poll_interval_seconds', round(self.interval, 3), self.cursor_key)
+        metrics.set_gauge('poll_rate_per_minute', round(60 / self.interval, 1), self.cursor_key)
+        if delivered:
+            metrics.observe('punches_per_poll', delivered, self.cursor_key)
+
+    def adjust_page_size(self, elapsed):
+        """Halve the page while the device answers slowly, grow back once it is fast again"""
+        if self.max_page_size is None:
+            return
+        if elapsed > self.slow_response_seconds:
+            page_size = max(self.min_page_size, self.page_size // 2)
+        elif elapsed < self.slow_response_seconds / 2:
+            page_size = min(self.max_page_size, self.page_size * 2)
+        else:
+            return
+        if page_size != self.page_size:
+            logging.info(f"AcsEvent page size for {self.ip}:{self.port}: {self.page_size} -> {page_size} "
+                         f"(last page took {elapsed:.2f}s)")
+            self.page_size = page_size
+            metrics.set_gauge('acs_page_size', page_size, self.cursor_key)
+
+    def open_window(self, window_start=None):
+        """Start searching from window_start (default now), resuming from a saved cursor inside it"""
+        self.start_time = window_start or datetime.now()
+        if self.cursor:
+            logging.info(f"Event cursor for {self.cursor_key} at {self.cursor.get('time')} "
+                         f"serialNo {self.cursor.get('serialNo')}")
+
+    def search_start(self):
+        """Time the next search starts from: the cursor if it is inside the window"""
+        start_str = self.start_time.strftime('%Y-%m-%dT%H:%M:%S+05:30')
+        if self.cursor and self.cursor.get('time', '')[:19] > start_str[:19]:
+            return self.cursor['time']
+        return start_str
+
+    def is_after_cursor(self, event):
+        """True if the event is newer than the last delivered one"""
+        if not self.cursor:
+            return True
+        event_time, serial_no = _cursor_key(event)
+        cursor_time, cursor_serial = _cursor_key(self.cursor)
+        if event_time != cursor_time:
+            return event_time > cursor_time
+        if serial_no is None or cursor_serial is None:
+            return True  # Same second without serial numbers; processed_events decides
+        return serial_no > cursor_serial
+
+    def advance_cursor(self, event):
+        """Move the high-water mark forward to this event"""
+        if self.is_after_cursor(event):
+            event_time, serial_no = _cursor_key(event)
+            self.cursor = {'time': str(event.get('time')), 'serialNo': serial_no}
+            self.cursor_dirty = True
+
+    def save_cursor(self):
+        if self.cursor_dirty and self.cursor:
+            self.cursor_dirty = False
+            self.cursor_store.save(self.cursor_key, self.cursor)
+
+    def mark_processed(self, event):
+        """Record an event and return True if it has not been seen before"""
+        with self.lock:
+            if not self.is_after_cursor(event):
+                return False
+            if not self.processed_events.add(get_event_id(event), event.get('time')):
+                return False
+            self.advance_cursor(event)
+            return True
+
+    def mark_backfilled(self, event):
+        """Record a recovered event without moving the cursor; True if it is new"""
+        with self.lock:
+            return self.processed_events.add(get_event_id(event), event.get('time'))
+
+    def get_outage(self):
+        return self.outage_store.get(self.cursor_key)
+
+    def record_outage(self):
+        """Remember when the device was last reachable so the gap can be backfilled"""
+        if self.in_outage:
+            return
+        outage = self.get_outage() or {}
+        # Keep the earliest start if an earlier window has not been recovered yet
+        start = outage.get('start') or self.last_successful_fetch.strftime('%Y-%m-%dT%H:%M:%S+05:30')
+        self.outage_store.save(self.cursor_key, {'start': start, 'end': None})
+        self.in_outage = True
+        logging.warning(f"Recorded outage for {self.ip}:{self.port} starting {start}")
+
+    def end_outage(self):
+        """The device answered again: the outage runs up to where live searching resumed"""
+        self.in_outage = False
+        outage = self.get_outage()
+        if not outage:
+            return
+        outage['end'] = self.start_time.strftime('%Y-%m-%dT%H:%M:%S+05:30')
+        self.outage_store.save(self.cursor_key, outage)
+        if self.backfill:
+            self.backfill.schedule(self)
+        else:
+            logging.warning(f"No backfill for {self.ip}:{self.port}; events from {outage['start']} "
+                            f"to {outage['end']} were not recovered")
+            self.outage_store.remove(self.cursor_key)
+
+    def clear_outage(self, end):
+        """Forget a recovered window unless a newer outage extended it meanwhile"""
+        outage = self.get_outage()
+        if outage and outage.get('end') == end and not self.in_outage:
+            self.outage_store.remove(self.cursor_key)
+            return True
+        return False
+
+    def iter_range(self, start_time_str, end_time_str, should_continue=lambda: True):
+        """Yield pages of events between two device time strings (used by backfill)"""
+        # Its own search, so the reader never mixes its pages with live polling's
+        search_id = str(uuid.uuid4())
+        search_position = 0
+        while should_continue():
+            payload = {
+                "AcsEventCond": {
+                    "searchID": search_id,
+                    "searchResultPosition": search_position,
+                    "maxResults": self.page_size,
+                    "major": 5,  # Access Control
+                    "minor": 0,  # Authentication passed
+                    "startTime": start_time_str,
+                    "endTime": end_time_str
+                }
+            }
+            response = self.client.post(self.url, json=payload, timeout=self.timeout,
+                                        headers={'Content-Type': 'application/json'})
+            response.raise_for_status()
+            data = response.json().get("AcsEvent", {})
+            info_list = data.get("InfoList", [])
+            if not info_list:
+                return
+            yield info_list
+            search_position += len(info_list)
+            if data.get("responseStatusStrg") != "MORE":
+                return
+
+    def tag_event(self, event):
+        """Add source device information to the event"""
+        event['source_device_ip'] = self.device_ip
+        event['deviceIP'] = self.ip
+        return event
+
+    def reset_window(self):
+        """Start searching from now (used by the watchdog); the skipped gap is backfilled"""
+        self.record_outage()
+        self.open_window()
+        self.consecutive_errors = 0
+        self.last_successful_fetch = datetime.now()
+
+    def poll(self, on_event, should_continue=lambda: True):
+        """Fetch every page after the cursor and hand new events to on_event.
+
+        Returns the number of extra seconds the caller should wait before the
+        next poll (non-zero after timeouts, connection errors or a reset).
+        """
+        return self._run(self._poll(on_event, should_continue))
+
+    async def poll_async(self, on_event, should_continue=lambda: True):
+        """poll() over non-blocking HTTP; on_event is called on the event loop"""
+        return await self._run_async(self._poll(on_event, should_continue))
+
+    def _poll(self, on_event, should_continue):
+        delay = 0
+        if self.max_page_size is None:
+            yield from self._negotiate_page_size()
+        poll_started = time.monotonic()
+        pages = 0
+        delivered = 0
+        try:
+            # Set time range (from start time to now)
+            end_time = datetime.now()
+
+            # Format times with timezone
+            end_time_str = end_time.strftime('%Y-%m-%dT%H:%M:%S+05:30')
+            start_time_str = self.search_start()
+
+            # Initialize pagination variables
+            search_position = 0
+            total_matches = None
+            num_matches = 0
+            has_more_pages = True
+            processed_ids = set()  # Track processed event IDs to avoid duplicates
+
+            # Fetch all pages of results
+            while has_more_pages and should_continue():
+                # Create payload for authentication events with current search position
+                payload = {
+                    "AcsEventCond": {
+                        "searchID": "1",
+                        "searchResultPosition": search_position,
+                        "maxResults": self.page_size,  # Device maximum, reduced while slow
+                        "major": 5,  # Access Control
+                        "minor": 0,  # Authentication passed
+                        "startTime": start_time_str,
+                        "endTime": end_time_str
+                    }
+                }
+
+                request_started = time.monotonic()
+                response = yield ('POST', self.url, payload, self.timeout)
+                self.adjust_page_size(time.monotonic() - request_started)
+                pages += 1
+
+                # Process successful responses
+                if response.status_code != 200:
+                    logging.error(f"API request failed with status code: {response.status_code}")
+                    self.consecutive_errors += 1
+                    if response.status_code == 401:
+                        logging.warning(f"Authentication failed for {self.ip}:{self.port}. Check device credentials.")
+                    break
+
+                # Reset consecutive errors on success
+                self.consecutive_errors = 0
+                self.last_successful_fetch = datetime.now()
+                if self.in_outage:
+                    self.end_outage()
+
+                try:
+                    data = response.json()
+                except json.JSONDecodeError as json_err:
+                    logging.error(f"Response is not valid JSON: {json_err}")
+                    self.consecutive_errors += 1
+                    break
+
+                if "AcsEvent" not in data:
+                    # No events found in response, exit pagination loop
+                    break
+
+                # Get pagination information if this is the first page
+                if total_matches is None and "totalMatches" in data["AcsEvent"]:
+                    total_matches = int(data["AcsEvent"]["totalMatches"])
+
+                info_list = data["AcsEvent"].get("InfoList", [])
+                page_events = len(info_list)
+
+                # If no events were returned, we've reached the end
+                if page_events == 0:
+                    break
+
+                # Deliver oldest first so the cursor only ever moves forward
+                info_list = sorted(info_list, key=lambda e: (_cursor_key(e)[0], _cursor_key(e)[1] or 0))
+
+                for event in info_list:
+                    event_id = get_event_id(event)
+
+                    # Check for duplicates within this batch
+                    if event_id in processed_ids:
+                        continue
+                    processed_ids.add(event_id)
+
+                    # Check if this is a new event we haven't processed yet
+                    if self.mark_processed(event):
+                        on_event(self.tag_event(event))
+                        delivered += 1
+
+                num_matches += page_events
+                search_position += page_events
+
+                # Check if we've processed all events or reached a limit
+                if (total_matches is not None and num_matches >= total_matches) or num_matches >= 300:
+                    break
+
+        except requests.exceptions.Timeout:
+            logging.error(f"Timeout connecting to {self.ip}:{self.port}")
+            self.consecutive_errors += 1
+            delay = 2  # Short wait after timeout before retrying
+        except requests.exceptions.ConnectionError:
+            logging.error(f"Connection error for {self.ip}:{self.port}. Device may be offline or unreachable.")
+            self.consecutive_errors += 1
+            delay = 5  # Longer wait after connection error
+        except Exception as e:
+            logging.error(f"Error in monitoring loop: {e}")
+            self.consecutive_errors += 1
+
+        self.save_cursor()
+        if not delay:
+            self.update_interval(delivered)
+
+        # More than one page means a backlog was drained; report how long it took
+        if pages > 1:
+            drain_seconds = time.monotonic() - poll_started
+            metrics.observe('acs_backlog_drain_seconds', drain_seconds, self.cursor_key)
+            logging.info(f"Drained backlog from {self.ip}:{self.port}: {pages} pages in {drain_seconds:.2f}s")
+
+        # Check if we've had too many consecutive errors
+        if self.consecutive_errors >= self.max_consecutive_errors:
+            logging.warning(f"Reached {self.consecutive_errors} consecutive errors. Resetting connection...")
+            self.consecutive_errors = 0  # Reset the counter
+            self.record_outage()  # The skipped interval is backfilled once the device is back
+            self.start_time = datetime.now()  # Reset start time to avoid fetching old events
+            delay += 10  # Wait a bit before retrying
+
+        return delay
+
+
+if __name__ == "__main__":
+    # Drain a 100 punch backlog from the mock reader with the old fixed page of 5
+    # and with the page size negotiated from the device capabilities.
+    import tempfile
+
+    from mockIsapiServer import MockIsapiServer
+
+    server = MockIsapiServer(max_results=30).start()
+    backlog_start = datetime.now() - timedelta(minutes=10)
+    for i in range(100):
+        server.add_event(str(1000 + i), f"Employee {i}",
+                         event_time=(backlog_start + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%S+05:30'))
+
+    state_dir = tempfile.mkdtemp()
+    for label, negotiate in (("fixed page of 5", False), ("negotiated page", True)):
+        poller = AcsEventPoller(server.host, server.port, server.username, server.password,
+                                cursor_store=JsonStateStore(os.path.join(state_dir, f"{label}.json")))
+        if not negotiate:
+            poller.max_page_size = poller.page_size = DEFAULT_PAGE_SIZE
+        poller.open_window(backlog_start - timedelta(minutes=1))
+        delivered = []
+        server.reset_stats()
+        poller.poll(delivered.append)
+        drain = metrics.summary('acs_backlog_drain_seconds', poller.cursor_key)
+        print(f"{label:16s} page={poller.page_size:3d} events={len(delivered)} "
+              f"requests={server.stats['requests']} drain={drain['last'] * 1000:.1f} ms")
+        metrics.summaries.clear()
+
+    server.stop()
+
+    # Simulated hour at one counter: a 10 minute lunch rush (a punch every ~2s)
+    # followed by a quiet 50 minutes. Compares the old fixed 1 second sleep
+    # with the adaptive interval (poll time itself is ignored).
+    import random
+    import statistics
+
+    random.seed(7)
+    punches, t = [], 0.0
+    while t < 600:
+        t += random.expovariate(1 / 2.0)
+        punches.append(t)
+    while t < 3600:
+        t += random.expovariate(1 / 300.0)
+        punches.append(t)
+
+    def simulate(next_wait):
+        clock, requests_made, latencies, pending = 0.0, 0, [], 0
+        while clock < 3600:
+            requests_made += 1
+            found = 0
+            while pending < len(punches) and punches[pending] <= clock:
+                latencies.append(clock - punches[pending])
+                pending += 1
+                found += 1
+            clock += next_wait(found)
+        peak = [lat for lat, at in zip(latencies, punches) if at < 600]
+        return requests_made, statistics.median(peak), statistics.mean(latencies)
+
+    poller = AcsEventPoller("127.0.0.1", 80, "admin", "admin",
+                            cursor_store=JsonStateStore(os.path.join(state_dir, "simulation.json")))
+
+    def adaptive_wait(found):
+        poller.update_interval(found)
+        return poller.interval
+
+    for label, next_wait in (("fixed 1s", lambda found: 1.0), ("adaptive", adaptive_wait)):
+        requests_made, peak_median, overall_mean = simulate(next_wait)
+        print(f"{label:9s} requests/hour={requests_made:5d}  median peak latency={peak_median * 1000:4.0f} ms  "
+              f"mean latency={overall_mean * 1000:4.0f} ms")
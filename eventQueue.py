@@ -0,0 +1,297 @@
+import json
+import logging
+import os
+import threading
+import heapq
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+from appPaths import get_data_file
+from mealWindows import get_compiled_schedule
+from metrics import metrics
+
+SPILL_FILE = "eventSpill.jsonl"
+
+
+def get_queue_settings(app_settings):
+    """Return the UI event queue settings with defaults filled in"""
+    queue = (app_settings or {}).get('EventQueue', {}) or {}
+    return {
+        'maxDepth': int(queue.get('maxDepth', 200)),
+        'policy': queue.get('policy', 'spill'),  # 'spill' to disk or 'dropOldest'
+        'drainIntervalMs': int(queue.get('drainIntervalMs', 50)),
+        'drainBatchSize': int(queue.get('drainBatchSize', 5)),
+        'warnWaitSeconds': float(queue.get('warnWaitSeconds', 5)),
+        'replayMaxAgeMinutes': float(queue.get('replayMaxAgeMinutes', 30)),
+    }
+
+
+def replay_cutoff(app_settings, now=None):
+    """Punches read back from the spill file from before this time are
+    recorded but not printed: those older than replayMaxAgeMinutes or from
+    before the meal window now open (all of them between meals)"""
+    now = now or datetime.now()
+    cutoff = now - timedelta(minutes=get_queue_settings(app_settings)['replayMaxAgeMinutes'])
+    schedule = get_compiled_schedule(app_settings)
+    if schedule:
+        window_start = schedule.window_start(now)
+        cutoff = max(cutoff, window_start) if window_start else now
+    return cutoff
+
+
+def _device_key(event):
+    if isinstance(event, dict):
+        return event.get('source_device_ip') or event.get('deviceIP') or ''
+    return event.source_device_ip or event.device_ip or ''
+
+
+def _employee_no(event):
+    if isinstance(event, dict):
+        return event.get('employeeNoString', 'N/A')
+    return event.employee_no or 'N/A'
+
+
+def _to_json(event):
+    # PunchEvent records are written as device-style JSON and parsed again on load
+    return event.to_dict() if hasattr(event, 'to_dict') else event
+
+
+class EventQueue:
+    """Bounded hand-off between ingestion threads and the UI thread.
+
+    put() is called from any thread (monitors, the ingestion engine, the
+    backfill pool) and never blocks. The UI drains it with get_batch() on a
+    timer, taking devices in turn so one busy reader cannot starve the rest.
+    Past maxDepth, the busiest device gives up its newest queued event to a
+    JSON-lines spill file so a quieter device still gets a slot; spilled
+    events are read back in order once the UI catches up. The file is only
+    appended to while running: a heap of (enqueue time, byte offset) says
+    which lines to read back next, and the file is removed once all of them
+    have been. With the 'dropOldest' policy the busiest device's oldest
+    event is dropped instead. Spilled and still-queued events survive a
+    restart (see spill_all()); events read back from the file are device
+    JSON rather than PunchEvent records, so the UI can tell them apart (see
+    replay_cutoff()). Depth and wait time are published to metrics.
+    """
+
+    def __init__(self, app_settings=None, spill_path=None):
+        self.settings = get_queue_settings(app_settings)
+        self.max_depth = self.settings['maxDepth']
+        self.spill_path = spill_path or get_data_file(SPILL_FILE)
+        self.lock = threading.Lock()
+        self.queues = {}  # device key -> deque of (enqueued_at, event)
+        self.rotation = deque()  # Device keys with queued events, in serving order
+        self.depth = 0
+        self.spilled_by_device = Counter()  # A device with events on disk queues behind them
+        self.spill_index = []  # Heap of (enqueued_at, byte offset) of events on disk
+        self.spilled = self._count_spilled()
+        if self.spilled:
+            logging.info(f"{self.spilled} events waiting in {self.spill_path} from a previous run")
+        self.dropped = 0
+        self.last_warning = 0
+        self._publish()
+
+    def __len__(self):
+        with self.lock:
+            return self.depth + self.spilled
+
+    def put(self, event):
+        """Queue an event for the UI; spills or drops when the queue is full"""
+        item = (time.time(), event)
+        key = _device_key(event)
+        with self.lock:
+            if self.settings['policy'] != 'spill':
+                if self.depth >= self.max_depth:
+                    self._drop_oldest()
+                self._enqueue(item)
+            elif self.spilled_by_device[key]:
+                # This device already has events on disk; queue behind them to keep order
+                self._spill([item])
+            elif self.depth < self.max_depth:
+                self._enqueue(item)
+            else:
+                # Full: make room by spilling the busiest device's newest event
+                busiest = self._busiest_device(exclude=key)
+                if busiest is not None and len(self.queues[busiest]) > len(self.queues.get(key, ())) + 1:
+                    self._spill([self._pop_newest(busiest)])
+                    self._enqueue(item)
+                else:
+                    self._spill([item])
+            self._publish()
+
+    def get_batch(self, max_items=None):
+        """Take up to max_items events, one device at a time"""
+        max_items = max_items or self.settings['drainBatchSize']
+        batch = []
+        now = time.time()
+        with self.lock:
+            if self.spilled and self.depth < self.max_depth // 2:
+                self._load_spilled(self.max_depth - self.depth)
+
+            while self.rotation and len(batch) < max_items:
+                key = self.rotation.popleft()
+                queue = self.queues[key]
+                enqueued_at, event = queue.popleft()
+                self.depth -= 1
+                if queue:
+                    self.rotation.append(key)
+                else:
+                    del self.queues[key]
+                batch.append(event)
+                metrics.observe('event_queue_wait_seconds', now - enqueued_at)
+                self._check_wait(now - enqueued_at)
+            self._publish()
+        return batch
+
+    def spill_all(self):
+        """Write everything still in memory to disk (shutdown), so nothing is lost"""
+        with self.lock:
+            items = []
+            while self.rotation:
+                key = self.rotation.popleft()
+                items.extend(self.queues.pop(key))
+            self.depth = 0
+            if items or self.spilled:
+                # Also drops the lines already read back from the file
+                items = sorted(items + self._read_spilled(), key=lambda item: item[0])
+                self._write_spilled(items)
+                self.spilled = self._count_spilled()
+                logging.info(f"Saved {len(items)} pending events to {self.spill_path}")
+            self._publish()
+
+    def _enqueue(self, item):
+        key = _device_key(item[1])
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            self.rotation.append(key)
+        queue.append(item)
+        self.depth += 1
+
+    def _busiest_device(self, exclude=None):
+        """Device with the most events in memory"""
+        candidates = [k for k in self.queues if k != exclude]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda k: len(self.queues[k]))
+
+    def _pop_newest(self, key):
+        queue = self.queues[key]
+        item = queue.pop()
+        self.depth -= 1
+        if not queue:
+            del self.queues[key]
+            self.rotation.remove(key)
+        return item
+
+    def _drop_oldest(self):
+        # Drop from the device with the most waiting events
+        key = max(self.queues, key=lambda k: len(self.queues[k]))
+        queue = self.queues[key]
+        enqueued_at, event = queue.popleft()
+        self.depth -= 1
+        if not queue:
+            del self.queues[key]
+            self.rotation.remove(key)
+        self.dropped += 1
+        metrics.set_gauge('event_queue_dropped', self.dropped)
+        logging.warning(f"Event queue full; dropped event for {_employee_no(event)} "
+                        f"from {key or 'unknown device'}")
+
+    def _check_wait(self, wait):
+        if wait > self.settings['warnWaitSeconds'] and time.time() - self.last_warning > 60:
+            self.last_warning = time.time()
+            logging.warning(f"UI is falling behind: event waited {wait:.1f}s, "
+                            f"{self.depth} queued, {self.spilled} on disk")
+
+    def _publish(self):
+        metrics.set_gauge('event_queue_depth', self.depth + self.spilled)
+        metrics.set_gauge('event_queue_spilled', self.spilled)
+
+    # Spill file: one JSON object per line, {"enqueuedAt": ..., "event": {...}}
+
+    def _spill(self, items):
+        try:
+            offsets = []
+            with open(self.spill_path, 'ab') as f:
+                for enqueued_at, event in items:
+                    offsets.append(f.tell())
+                    f.write((json.dumps({'enqueuedAt': enqueued_at, 'event': _to_json(event)}) + "\n").encode())
+            for (enqueued_at, event), offset in zip(items, offsets):
+                heapq.heappush(self.spill_index, (enqueued_at, offset))
+                self.spilled_by_device[_device_key(event)] += 1
+            self.spilled += len(items)
+        except Exception as e:
+            logging.error(f"Could not spill events to {self.spill_path}: {e}")
+            for item in items:
+                self._enqueue(item)
+
+    def _read_spilled(self):
+        """Every event on disk not yet read back"""
+        items = []
+        try:
+            with open(self.spill_path, 'rb') as f:
+                for enqueued_at, offset in sorted(self.spill_index):
+                    f.seek(offset)
+                    items.append((enqueued_at, json.loads(f.readline())['event']))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Could not read spilled events from {self.spill_path}: {e}")
+        return items
+
+    def _write_spilled(self, items):
+        temp_path = f"{self.spill_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for enqueued_at, event in items:
+                f.write(json.dumps({'enqueuedAt': enqueued_at, 'event': _to_json(event)}) + "\n")
+        os.replace(temp_path, self.spill_path)
+
+    def _load_spilled(self, count):
+        # Lines are appended out of order when a busy device gives up its newest
+        # event; the heap hands them back by enqueue time, reading only those lines
+        try:
+            with open(self.spill_path, 'rb') as f:
+                while self.spill_index and count > 0:
+                    enqueued_at, offset = self.spill_index[0]
+                    f.seek(offset)
+                    event = json.loads(f.readline())['event']
+                    heapq.heappop(self.spill_index)
+                    self._enqueue((enqueued_at, event))
+                    self.spilled_by_device[_device_key(event)] -= 1
+                    count -= 1
+        except Exception as e:
+            logging.error(f"Could not read spilled events from {self.spill_path}: {e}")
+            return
+        self.spilled = len(self.spill_index)
+        if not self.spill_index:
+            # Everything is back in memory; the next spill starts a new file
+            self.spilled_by_device.clear()
+            try:
+                os.remove(self.spill_path)
+            except OSError as e:
+                logging.error(f"Could not remove spill file {self.spill_path}: {e}")
+
+    def _count_spilled(self):
+        """Index the spill file (at startup, or after spill_all() rewrote it)"""
+        self.spill_index = []
+        self.spilled_by_device = Counter()
+        try:
+            with open(self.spill_path, 'rb') as f:
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line:
+                        break
+                    if line.strip():
+                        record = json.loads(line)
+                        self.spill_index.append((record['enqueuedAt'], offset))
+                        self.spilled_by_device[_device_key(record['event'])] += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.error(f"Could not read spilled events from {self.spill_path}: {e}")
+        heapq.heapify(self.spill_index)
+        return len(self.spill_index)
+
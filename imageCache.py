@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from appPaths import get_data_file
+from metrics import metrics
+
+# Defaults for the "ImageCache" block of appSettings.json
+DEFAULT_IMAGE_CACHE = {
+    'maxMegabytes': 200,
+    'workers': 4,
+    'timeout': 10,
+    'retrySeconds': 30,
+    'prefetchWaitMs': 300,  # Longest a new card waits for its prefetched photo
+}
+
+
+def get_image_cache_settings(app_settings):
+    """Return the image cache settings with defaults filled in"""
+    settings = dict(DEFAULT_IMAGE_CACHE)
+    settings.update((app_settings or {}).get('ImageCache', {}) or {})
+    return settings
+
+
+class LruCache:
+    """Small in-memory LRU: get() refreshes an entry, put() evicts the oldest"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class ImageCache:
+    """Face images downloaded once and kept on disk, keyed by a hash of the URL.
+
+    fetch() never blocks: a cached image is handed back at once, anything
+    else is downloaded on a worker thread through the device's shared
+    session (deviceClient) and the callback runs on that worker with the
+    file path, or None if the download failed. Several requests for the
+    same URL share one download, and a failed URL is not retried for
+    retrySeconds. The directory is kept under maxMegabytes by deleting the
+    least recently used files; the LRU order survives restarts through the
+    files' modification times.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, workers=4, timeout=10, retry_seconds=30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-fetch')
+        self.lock = threading.Lock()
+        self.files = OrderedDict()  # file name -> size, least recently used first
+        self.total_bytes = 0
+        self.in_flight = {}  # url -> callbacks waiting for it
+        self.failed = {}  # url -> monotonic time of the last failure
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                # Left behind by an interrupted download
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self.files[name] = size
+            self.total_bytes += size
+        self._evict()
+        metrics.set_gauge('image_cache_bytes', self.total_bytes)
+
+    @staticmethod
+    def key_for(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest() + '.jpg'
+
+    def path_for(self, url):
+        return os.path.join(self.directory, self.key_for(url))
+
+    def lookup(self, url):
+        """Path of the cached image for url, or None; counts as a use"""
+        name = self.key_for(url)
+        with self.lock:
+            if name not in self.files:
+                metrics.observe('image_cache_hit', 0)
+                return None
+            self.files.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except OSError:
+            # Deleted behind our back
+            self._forget(name)
+            return None
+        metrics.observe('image_cache_hit', 1)
+        return path
+
+    def fetch(self, url, callback, username=None, password=None):
+        """Get url's image; returns the path if cached, otherwise None and
+        callback(path or None) is called from a worker thread later"""
+        path = self.lookup(url)
+        if path:
+            return path
+        with self.lock:
+            failed_at = self.failed.get(url)
+            if failed_at is not None and time.monotonic() - failed_at < self.retry_seconds:
+                retry = False
+            else:
+                retry = True
+                waiting = self.in_flight.get(url)
+                if waiting is not None:
+                    waiting.append(callback)
+                    return None
+                self.in_flight[url] = [callback]
+        if not retry:
+            callback(None)
+            return None
+        self.executor.submit(self._download, url, username, password)
+        return None
+
+    def store(self, url, content):
+        """Add an image that arrived some other way (e.g. inline in an alertStream event)"""
+        return self._write(url, content)
+
+    def _download(self, url, username, password):
+        # Imported here so this module can be used without a device session
+        from deviceClient import get_client_for_url
+
+        started = time.monotonic()
+        path = None
+        try:
+            client = get_client_for_url(url, username, password)
+            if client is None:
+                raise RuntimeError("no device session for this URL")
+            response = client.get(url, timeout=self.timeout)
+            if response.status_code == 200 and response.content:
+                path = self._write(url, response.content)
+            else:
+                logging.warning(f"Image fetch failed for {url}: HTTP {response.status_code}")
+        except Exception as e:
+            logging.warning(f"Image fetch failed for {url}: {e}")
+        metrics.observe('image_fetch_seconds', time.monotonic() - started)
+
+        with self.lock:
+            callbacks = self.in_flight.pop(url, [])
+            if path:
+                self.failed.pop(url, None)
+            else:
+                self.failed[url] = time.monotonic()
+        for callback in callbacks:
+            try:
+                callback(path)
+            except Exception as e:
+                logging.error(f"Image callback failed for {url}: {e}")
+
+    def _write(self, url, content):
+        name = self.key_for(url)
+        path = os.path.join(self.directory, name)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.total_bytes -= self.files.pop(name, 0)
+            self.files[name] = len(content)
+            self.total_bytes += len(content)
+            self._evict()
+            metrics.set_gauge('image_cache_bytes', self.total_bytes)
+        return path
+
+    def _evict(self):
+        # Caller holds the lock (or is the constructor)
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            name, size = self.files.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _forget(self, name):
+        with self.lock:
+            self.total_bytes -= self.files.pop(name, 0)
+            metrics.set_gauge('image_cache_bytes', self.total_bytes)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Process-wide image cache, configured from appSettings.json on first use"""
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            from settingsService import settings_service
+            settings = get_image_cache_settings(settings_service.get_or_default())
+            _image_cache = ImageCache(
+                get_data_file('image_cache'),
+                max_bytes=int(float(settings['maxMegabytes']) * 1024 * 1024),
+                workers=int(settings['workers']),
+                timeout=settings['timeout'],
+                retry_seconds=settings['retrySeconds'],
+            )
+        return _image_cache
+
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+from eventRecord import Recognition
+from imageCache import LruCache, get_image_cache
+from metrics import metrics
+
+THUMBNAIL_HEIGHT = 100  # Height of the AuthEventItem image label
+
+# PunchEvent.image_key -> QImage already decoded and scaled for the card
+thumbnail_cache = LruCache(64)
+
+
+class ImagePrefetcher:
+    """Fetches and scales an event's face image as soon as the event is ingested.
+
+    prefetch() is handed each PunchEvent on the monitor thread as it is
+    ingested (EzeeCanteen.ingest_event), so it must not block: the download goes through the
+    shared ImageCache and decoding happens on this class's own workers.
+    The scaled QImage lands in thumbnail_cache (QImage, unlike QPixmap, may
+    be built off the GUI thread) and on_ready(key) is called, so the UI can
+    show the card with its photo in one paint. Token printing never waits
+    for any of this.
+    """
+
+    def __init__(self, credentials, on_ready=None, max_wait_ms=300, workers=2):
+        self.credentials = credentials
+        self.on_ready = on_ready
+        self.max_wait_ms = max_wait_ms
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-decode')
+        self.lock = threading.Lock()
+        self.pending = {}  # key -> monotonic time prefetch started
+
+    def prefetch(self, event):
+        """Start on a PunchEvent's photo"""
+        # Card and fingerprint punches show a fixed icon; backfilled punches are not shown
+        if event.recognition in (Recognition.CARD, Recognition.FINGERPRINT) or event.backfilled or not event.employee_no:
+            return
+        key = event.image_key
+        if not key or key in thumbnail_cache:
+            return
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending[key] = time.monotonic()
+
+        try:
+            if event.picture_data:
+                self.executor.submit(self._decode, key, None, event.picture_data)
+                return
+            username, password = self.credentials(key)
+            path = get_image_cache().fetch(key, lambda path: self._fetched(key, path), username, password)
+            if path:
+                self._fetched(key, path)
+        except Exception as e:
+            logging.error(f"Could not prefetch image for {key}: {e}")
+            self._finish(key, None)
+
+    def is_pending(self, key):
+        with self.lock:
+            return key in self.pending
+
+    def _fetched(self, key, path):
+        if path:
+            self.executor.submit(self._decode, key, path, None)
+        else:
+            self._finish(key, None)
+
+    def _decode(self, key, path, data):
+        thumbnail = None
+        try:
+            image = QImage(path) if path else QImage.fromData(data)
+            if not image.isNull():
+                if image.height() > THUMBNAIL_HEIGHT:
+                    image = image.scaledToHeight(THUMBNAIL_HEIGHT, Qt.SmoothTransformation)
+                thumbnail = image
+        except Exception as e:
+            logging.error(f"Could not decode image for {key}: {e}")
+        self._finish(key, thumbnail)
+
+    def _finish(self, key, thumbnail):
+        if thumbnail is not None:
+            thumbnail_cache.put(key, thumbnail)
+        with self.lock:
+            started = self.pending.pop(key, None)
+        if started is not None:
+            metrics.observe('image_prefetch_seconds', time.monotonic() - started)
+        if self.on_ready:
+            try:
+                self.on_ready(key)
+            except Exception as e:
+                logging.error(f"Error handing prefetched image to UI: {e}")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from alertStream import AlertStreamListener
+from eventPoller import AcsEventPoller
+from ingestionSettings import get_engine_settings
+
+
+class DeviceChannel:
+    """Per-device state driven by the engine: config, poller and retry state"""
+
+    def __init__(self, device_ip, device_config, settings):
+        self.device_ip = device_ip
+        self.ip = device_config['ip']
+        self.port = device_config['port']
+        self.username = device_config['user']
+        self.password = device_config['password']
+        self.settings = settings
+        self.poller = AcsEventPoller(self.ip, self.port, self.username, self.password, device_ip,
+                                     timeout=settings['pollTimeout'], settings=settings)
+        self.task = None
+        self.stream_retry_at = None
+        self.in_meal_time = False
+
+
+class IngestionEngine:
+    """One asyncio event loop that ingests events from every configured reader.
+
+    Each device is a coroutine, not a thread. Between meals every coroutine
+    waits on one asyncio event that the MealScheduler sets when a meal opens.
+    AcsEvent searches (AcsEventPoller.poll_async) and alertStream connections
+    both use asyncio streams, so adding a reader adds no thread; requests in
+    flight to one reader are capped by an asyncio.Semaphore
+    (perDeviceConcurrency), and a failing reader is searched with the shorter
+    outageTimeout. A device coroutine that fails is restarted after a backoff
+    (doubling up to maxRestartSeconds). Events are handed to on_event on the
+    engine thread, so pass a Qt signal's emit (queued across threads) or
+    another thread-safe callable.
+    """
+
+    def __init__(self, on_event, app_settings=None, scheduler=None):
+        self.on_event = on_event
+        self.settings = get_engine_settings(app_settings)
+        self.scheduler = scheduler
+        self.meal_open = None  # asyncio.Event, created on the engine loop
+        self.channels = {}
+        self.loop = None
+        self.thread = None
+        self.running = False
+        self.started = threading.Event()
+
+    def add_device(self, device_ip, device_config):
+        """Register a reader; starts ingesting immediately if the engine is running"""
+        channel = DeviceChannel(device_ip, device_config, self.settings)
+        self.channels[device_ip] = channel
+        if self.running and self.loop:
+            self.loop.call_soon_threadsafe(self._start_channel, channel)
+        return channel
+
+    def remove_device(self, device_ip):
+        """Stop ingesting from a reader"""
+        channel = self.channels.pop(device_ip, None)
+        if channel and channel.task and self.loop:
+            self.loop.call_soon_threadsafe(channel.task.cancel)
+
+    def get_device(self, device_ip):
+        return self.channels.get(device_ip)
+
+    def start(self):
+        """Start the event loop thread and one coroutine per registered device"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run_loop, name='IngestionEngine', daemon=True)
+        self.thread.start()
+        self.started.wait(5)
+        logging.info(f"Ingestion engine started for {len(self.channels)} devices")
+
+    def stop(self, timeout=2):
+        """Cancel every device coroutine and stop the loop without waiting on HTTP calls"""
+        if not self.running:
+            return
+        self.running = False
+        if self.scheduler:
+            self.scheduler.remove_listener(self._on_meal_change)
+        loop = self.loop
+        if loop and loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+        if self.thread:
+            self.thread.join(timeout)
+        logging.info("Ingestion engine stopped")
+
+    def is_running(self):
+        return self.running
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.meal_open = asyncio.Event()
+        if self.in_meal_time():
+            self.meal_open.set()
+        if self.scheduler:
+            self.scheduler.add_listener(self._on_meal_change)
+        for channel in list(self.channels.values()):
+            self._start_channel(channel)
+        self.loop.call_soon(self.started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def _start_channel(self, channel):
+        channel.task = self.loop.create_task(self._run_device(channel))
+
+    async def _shutdown(self):
+        tasks = [channel.task for channel in self.channels.values() if channel.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    def in_meal_time(self):
+        return self.scheduler.is_open() if self.scheduler else True
+
+    def _on_meal_change(self, is_open):
+        """Scheduler thread -> engine loop: wake or park every device coroutine"""
+        loop = self.loop
+        if loop and self.running:
+            loop.call_soon_threadsafe(self.meal_open.set if is_open else self.meal_open.clear)
+
+    def _deliver(self, event):
+        try:
+            self.on_event(event)
+        except Exception as e:
+            logging.error(f"Error handing event to UI: {e}")
+
+    async def _run_device(self, channel):
+        """Ingestion loop for one reader, restarted after a backoff if it fails"""
+        try:
+            await self._supervise_device(channel)
+        finally:
+            channel.poller.close_async()
+
+    async def _supervise_device(self, channel):
+        loop = asyncio.get_running_loop()
+        backoff = 1
+        while self.running:
+            started = loop.time()
+            try:
+                await self._ingest_device(channel)
+                return
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                if loop.time() - started > self.settings['maxRestartSeconds']:
+                    backoff = 1  # It had been running fine; this is a new failure
+                logging.error(f"Ingestion loop for {channel.ip}:{channel.port} failed: {e}; "
+                              f"restarting in {backoff:g}s")
+                try:
+                    await asyncio.sleep(backoff)
+                except asyncio.CancelledError:
+                    return
+                backoff = min(backoff * 2, self.settings['maxRestartSeconds'])
+
+    async def _ingest_device(self, channel):
+        poller = channel.poller
+        while self.running:
+            current_in_meal_time = self.in_meal_time()
+
+            # If we just entered a meal time period, search from its start
+            # (or from the saved cursor when restarting mid-meal)
+            if current_in_meal_time and not channel.in_meal_time:
+                poller.open_window(self.scheduler.current_window_start() if self.scheduler else None)
+            channel.in_meal_time = current_in_meal_time
+
+            if not current_in_meal_time:
+                # Parked until the scheduler opens the next meal
+                await self.meal_open.wait()
+                continue
+
+            if self.settings['mode'] == 'alertStream' and (
+                    channel.stream_retry_at is None or datetime.now() >= channel.stream_retry_at):
+                await self._consume_stream(channel)
+                channel.stream_retry_at = datetime.now() + timedelta(seconds=self.settings['streamRetrySeconds'])
+
+            # A failing reader gets the short timeout so it is retried (and
+            # stopped) quickly; the search itself never blocks the loop
+            failing = poller.in_outage or poller.consecutive_errors > 0
+            poller.timeout = self.settings['outageTimeout'] if failing else self.settings['pollTimeout']
+            delay = await poller.poll_async(self._deliver, lambda: self.running)
+
+            # Adaptive: short while punches are arriving, backing off when quiet
+            await asyncio.sleep(poller.interval + delay)
+
+    async def _consume_stream(self, channel):
+        """Hold the device's alertStream until it drops"""
+        poller = channel.poller
+        listener = AlertStreamListener(
+            channel.ip, channel.port, channel.username, channel.password,
+            read_timeout=self.settings['streamReadTimeout']
+        )
+        poller.last_successful_fetch = datetime.now()
+
+        def on_event(event):
+            poller.consecutive_errors = 0
+            poller.last_successful_fetch = datetime.now()
+            if poller.mark_processed(event):
+                self._deliver(poller.tag_event(event))
+                poller.save_cursor()
+
+        delivered = await listener.listen_async(on_event, lambda: self.running and self.in_meal_time())
+        if self.running:
+            logging.warning(f"alertStream for {channel.ip}:{channel.port} ended after {delivered} events, "
+                            f"polling for {self.settings['streamRetrySeconds']} seconds before reconnecting")
@@ -0,0 +1,30 @@
+def get_ingestion_settings(app_settings):
+    """Return the event ingestion settings with defaults filled in"""
+    ingestion = (app_settings or {}).get('EventIngestion', {}) or {}
+    return {
+        'mode': ingestion.get('mode', 'polling'),
+        'streamRetrySeconds': int(ingestion.get('streamRetrySeconds', 30)),
+        'streamReadTimeout': int(ingestion.get('streamReadTimeout', 40)),
+        'slowResponseSeconds': float(ingestion.get('slowResponseSeconds', 2)),
+        'minPageSize': int(ingestion.get('minPageSize', 5)),
+        'dedupMaxEntries': int(ingestion.get('dedupMaxEntries', 5000)),
+        'dedupWindowMinutes': int(ingestion.get('dedupWindowMinutes', 180)),
+        'pollInterval': float(ingestion.get('pollInterval', 1)),
+        'minPollInterval': float(ingestion.get('minPollInterval', 0.25)),
+        'maxPollInterval': float(ingestion.get('maxPollInterval', 5)),
+        'pollBackoff': float(ingestion.get('pollBackoff', 1.5)),
+    }
+
+
+def get_engine_settings(app_settings):
+    """Return the ingestion engine settings with defaults filled in"""
+    ingestion = (app_settings or {}).get('EventIngestion', {}) or {}
+    settings = get_ingestion_settings(app_settings)
+    settings.update({
+        'engine': ingestion.get('engine', 'asyncio'),
+        'perDeviceConcurrency': int(ingestion.get('perDeviceConcurrency', 1)),  # Requests in flight per reader
+        'pollTimeout': float(ingestion.get('pollTimeout', 30)),
+        'outageTimeout': float(ingestion.get('outageTimeout', 5)),  # Search timeout while a reader is failing
+        'maxRestartSeconds': float(ingestion.get('maxRestartSeconds', 60)),
+    })
+    return settings
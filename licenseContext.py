@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import threading
+import time
+
+from metrics import metrics
+
+LICENSE_TTL_SECONDS = 3600
+LICENSE_RETRY_SECONDS = 60
+
+
+def _run_coroutine(coro):
+    # Own event loop: callers may be Qt threads, pool workers or the GUI thread
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class LicenseContext:
+    """Process-wide cache of this machine's license record.
+
+    LicenseManager.get_license_db() fingerprints the hardware, opens a
+    MySQL connection to the license server and queries the license table.
+    Here that happens once at startup (see prime()) and then at most every
+    ttl seconds, on a background thread, while callers keep getting the
+    cached record. get_license_key() is a plain attribute read once the
+    record is loaded, so handling a punch costs no network calls. If the
+    license server cannot be reached the last good record is kept, and an
+    empty result is retried after retry_seconds rather than on every call.
+    """
+
+    def __init__(self, ttl=LICENSE_TTL_SECONDS, retry_seconds=LICENSE_RETRY_SECONDS, manager_factory=None):
+        self.ttl = ttl
+        self.retry_seconds = retry_seconds
+        self.manager_factory = manager_factory
+        self.data = None
+        self.fetched_at = None  # monotonic time of the last successful fetch
+        self.attempted_at = None  # monotonic time of the last attempt
+        self.lock = threading.Lock()  # Serialises fetches
+        self.refreshing = False
+
+    def _manager(self):
+        if self.manager_factory is None:
+            from licenseManager import LicenseManager
+            self.manager_factory = LicenseManager
+        return self.manager_factory()
+
+    def _fetch(self):
+        started = time.monotonic()
+        self.attempted_at = started
+        try:
+            data = _run_coroutine(self._manager().get_license_db())
+        except Exception as e:
+            logging.error(f"Error getting license data: {e}")
+            data = None
+        metrics.observe('license_fetch_seconds', time.monotonic() - started)
+        if data:
+            self.data = data
+            self.fetched_at = time.monotonic()
+        elif self.data:
+            logging.warning("License refresh failed; keeping the cached license")
+        return self.data
+
+    def _is_fresh(self):
+        return self.fetched_at is not None and time.monotonic() - self.fetched_at < self.ttl
+
+    def _recently_attempted(self):
+        return self.attempted_at is not None and time.monotonic() - self.attempted_at < self.retry_seconds
+
+    def get_license_data(self):
+        """Cached license record (dict), or None if none could be loaded"""
+        if self.data is not None:
+            if not self._is_fresh():
+                self.refresh_in_background()
+            return self.data
+
+        # Nothing cached yet: load it now, once, however many threads are asking
+        with self.lock:
+            if self.data is None and not self._recently_attempted():
+                self._fetch()
+        return self.data
+
+    def get_license_key(self):
+        data = self.get_license_data()
+        return data.get('LicenseKey', '') if data else ''
+
+    def refresh_in_background(self):
+        """Re-read the license without blocking the caller"""
+        with self.lock:
+            if self.refreshing or self._recently_attempted():
+                return
+            self.refreshing = True
+        threading.Thread(target=self._refresh, name='LicenseRefresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            with self.lock:
+                self._fetch()
+        finally:
+            self.refreshing = False
+
+    def prime(self):
+        """Start loading the license at startup so the first punch does not wait for it"""
+        if self.data is None:
+            self.refresh_in_background()
+
+    def invalidate(self):
+        """Forget the cached record (e.g. after activating a new license)"""
+        with self.lock:
+            self.data = None
+            self.fetched_at = None
+            self.attempted_at = None
+
+
+license_context = LicenseContext()
+
+
+def get_license_key():
+    """License key for this machine from the shared cache ('' if unavailable)"""
+    return license_context.get_license_key()
+
+
+def get_license_data():
+    return license_context.get_license_data()
+
@@ -0,0 +1,177 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from mealWindows import get_compiled_schedule
+
+
+def get_meal_schedule(app_settings):
+    return (app_settings or {}).get('CanteenMenu', {}).get('MealSchedule', []) or []
+
+
+class MealScheduler:
+    """Opens and closes ingestion for every reader at the meal boundaries.
+
+    One thread works out the next boundary from CanteenMenu.MealSchedule and
+    sleeps until then, instead of every monitor checking the clock each
+    second. warmupSeconds before a meal opens it runs the registered warm-up
+    callbacks (e.g. re-opening device sessions), then wakes all waiting
+    monitors at once. A meal is open from fromTime through the end of the
+    toTime minute, matching the existing HH:MM string comparison, and a
+    window whose toTime is before its fromTime runs past midnight. With no
+    schedule configured ingestion is always open.
+    """
+
+    MAX_SLEEP_SECONDS = 300  # Re-check at least this often in case the clock is changed
+
+    def __init__(self, app_settings=None, warmup_seconds=None):
+        ingestion = (app_settings or {}).get('EventIngestion', {}) or {}
+        self.warmup_seconds = warmup_seconds if warmup_seconds is not None else int(ingestion.get('warmupSeconds', 30))
+        self.meal_schedule = get_meal_schedule(app_settings)
+        self.compiled = get_compiled_schedule(app_settings)
+        self.condition = threading.Condition()
+        self.open = self.is_open_at(datetime.now())
+        self.running = False
+        self.thread = None
+        self.listeners = []
+        self.warmups = {}
+
+    # Schedule arithmetic (see mealWindows.CompiledMealSchedule)
+
+    def is_open_at(self, now):
+        if not self.meal_schedule:
+            return True
+        return self.compiled.is_open_at(now)
+
+    def current_window_start(self, now=None):
+        """Start of the meal window containing now, or None outside meal times"""
+        return self.compiled.window_start(now)
+
+    def next_boundary(self, now=None):
+        """(time, opens) of the next change: opens is True when a meal starts"""
+        return self.compiled.next_boundary(now)
+
+    # Waiting
+
+    def is_open(self):
+        return self.open
+
+    def wait_until_open(self, should_continue=lambda: True):
+        """Block the calling monitor until a meal opens; returns False if it should stop"""
+        with self.condition:
+            while not self.open and should_continue():
+                self.condition.wait()
+            return self.open and should_continue()
+
+    def notify(self):
+        """Wake waiting monitors so they can re-check should_continue (e.g. on stop)"""
+        with self.condition:
+            self.condition.notify_all()
+
+    def add_listener(self, callback):
+        """callback(is_open) is called from the scheduler thread on every open/close"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def add_warmup(self, key, callback):
+        """Run callback shortly before each meal opens (one per key)"""
+        self.warmups[key] = callback
+
+    def reload(self, app_settings):
+        """Apply a new meal schedule and re-plan the next boundary"""
+        self.compiled = get_compiled_schedule(app_settings)
+        self.meal_schedule = get_meal_schedule(app_settings)
+        self.notify()
+
+    # Scheduler thread
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='MealScheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.notify()
+
+    def _set_open(self, is_open):
+        with self.condition:
+            changed = is_open != self.open
+            self.open = is_open
+            self.condition.notify_all()
+        if changed:
+            logging.info(f"Meal window {'opened' if is_open else 'closed'}; "
+                         f"{'waking' if is_open else 'parking'} event ingestion")
+            for callback in list(self.listeners):
+                try:
+                    callback(is_open)
+                except Exception as e:
+                    logging.error(f"Meal scheduler listener failed: {e}")
+
+    def _run_warmups(self):
+        for key, callback in list(self.warmups.items()):
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Warm-up {key} failed: {e}")
+
+    def _sleep_until(self, when):
+        """Sleep until when (or a reload/stop); True if the time was reached"""
+        while self.running:
+            remaining = (when - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return True
+            with self.condition:
+                schedule = self.meal_schedule
+                self.condition.wait(min(remaining, self.MAX_SLEEP_SECONDS))
+            if schedule is not self.meal_schedule:
+                return False  # Schedule reloaded; plan again
+        return False
+
+    def _run(self):
+        while self.running:
+            now = datetime.now()
+            self._set_open(self.is_open_at(now))
+            boundary, opens = self.next_boundary(now)
+            if boundary is None:
+                # Always open (no schedule); wait for a reload or stop
+                with self.condition:
+                    self.condition.wait(self.MAX_SLEEP_SECONDS)
+                continue
+
+            if opens:
+                logging.info(f"Event ingestion parked until {boundary.strftime('%H:%M')}")
+                warmup_at = boundary - timedelta(seconds=self.warmup_seconds)
+                if warmup_at > now and not self._sleep_until(warmup_at):
+                    continue
+                self._run_warmups()
+            self._sleep_until(boundary)
+
+
+if __name__ == "__main__":
+    # Boundary arithmetic against the original HH:MM string check
+    schedule = {'CanteenMenu': {'MealSchedule': [
+        {'fromTime': '07:30', 'toTime': '09:30', 'mealType': 'Breakfast'},
+        {'fromTime': '12:00', 'toTime': '14:00', 'mealType': 'Lunch'},
+        {'fromTime': '19:00', 'toTime': '21:30', 'mealType': 'Dinner'},
+    ]}}
+    scheduler = MealScheduler(schedule)
+    day = datetime(2025, 1, 31)
+    for minute in range(0, 24 * 60):
+        now = day + timedelta(minutes=minute, seconds=30)
+        current = now.strftime('%H:%M')
+        expected = any(m['fromTime'] <= current <= m['toTime'] for m in schedule['CanteenMenu']['MealSchedule'])
+        assert scheduler.is_open_at(now) == expected, current
+    assert scheduler.next_boundary(day.replace(hour=10)) == (day.replace(hour=12), True)
+    assert scheduler.next_boundary(day.replace(hour=13)) == (day.replace(hour=14, minute=1), False)
+    assert scheduler.next_boundary(day.replace(hour=22)) == (day.replace(hour=7, minute=30) + timedelta(days=1), True)
+    night = MealScheduler({'CanteenMenu': {'MealSchedule': [{'fromTime': '22:00', 'toTime': '02:00'}]}})
+    assert night.is_open_at(day.replace(hour=1)) and not night.is_open_at(day.replace(hour=3))
+    assert night.current_window_start(day.replace(hour=1)) == day - timedelta(hours=2)
+    assert night.next_boundary(day.replace(hour=1)) == (day.replace(hour=2, minute=1), False)
+    print("boundaries match the HH:MM check for every minute of the day")
@@ -0,0 +1,231 @@
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+MINUTES_PER_DAY = 24 * 60
+
+# One configured meal: start/end are minutes of the day, end is exclusive
+# (a meal runs through the whole toTime minute). wraps is True for windows
+# that cross midnight, e.g. 22:00-02:00.
+MealWindow = namedtuple('MealWindow', ['start', 'end', 'from_time', 'to_time', 'meal_type', 'price', 'wraps', 'meal'])
+
+
+def parse_minute(value):
+    """'HH:MM' as minutes since midnight, None if it is not a valid time"""
+    try:
+        hour, minute = str(value).strip().split(':')[:2]
+        hour, minute = int(hour), int(minute)
+    except (TypeError, ValueError):
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+    return hour * 60 + minute
+
+
+def minute_of(when):
+    """Minute of the day for a datetime, 'HH:MM' string or minute number"""
+    if isinstance(when, datetime):
+        return when.hour * 60 + when.minute
+    if isinstance(when, str):
+        return parse_minute(when)
+    return int(when) % MINUTES_PER_DAY
+
+
+class CompiledMealSchedule:
+    """CanteenMenu.MealSchedule compiled for fast lookups.
+
+    The day is cut into sorted, non-overlapping segments, each owned by one
+    meal (or none), so the meal at any minute is a single bisect. Windows
+    whose toTime is earlier than fromTime wrap past midnight. Where meals
+    overlap, the one listed first wins, as with the original linear scan.
+    Compile once per settings snapshot; see get_compiled_schedule().
+    """
+
+    def __init__(self, meal_schedule):
+        self.meal_schedule = meal_schedule
+        self.windows = []
+        for meal in meal_schedule or []:
+            start = parse_minute(meal.get('fromTime', ''))
+            end = parse_minute(meal.get('toTime', ''))
+            if start is None or end is None or not meal.get('fromTime') or not meal.get('toTime'):
+                continue
+            self.windows.append(MealWindow(
+                start=start,
+                end=end + 1,
+                from_time=meal.get('fromTime'),
+                to_time=meal.get('toTime'),
+                meal_type=meal.get('mealType', ''),
+                price=meal.get('price', '0'),
+                wraps=start > end,
+                meal=meal,
+            ))
+        self.starts, self.owners = self._segments()
+
+    def _segments(self):
+        # Every point where some window starts or stops, then the first-listed
+        # window covering each piece between those points
+        points = {0}
+        for window in self.windows:
+            points.add(window.start)
+            points.add(window.end % MINUTES_PER_DAY)
+        points = sorted(points)
+
+        starts, owners = [], []
+        for point in points:
+            owner = next((w for w in self.windows if self._covers(w, point)), None)
+            if owners and owners[-1] is owner:
+                continue  # Merge with the previous segment
+            starts.append(point)
+            owners.append(owner)
+        return starts, owners
+
+    @staticmethod
+    def _covers(window, minute):
+        if window.wraps:
+            return minute >= window.start or minute < window.end
+        return window.start <= minute < window.end
+
+    def __bool__(self):
+        return bool(self.windows)
+
+    # Lookups
+
+    def lookup(self, when):
+        """MealWindow open at when (datetime, 'HH:MM' or minute), or None"""
+        minute = minute_of(when)
+        if minute is None or not self.windows:
+            return None
+        return self.owners[bisect_right(self.starts, minute) - 1]
+
+    def is_open_at(self, when):
+        return self.lookup(when) is not None
+
+    def meal_type_at(self, when, default=None):
+        window = self.lookup(when)
+        return window.meal_type if window and window.meal_type else default
+
+    def price_at(self, when, default='0'):
+        window = self.lookup(when)
+        return window.price if window else default
+
+    def window_bounds(self, now=None):
+        """(start, end) datetimes of the window containing now, or None.
+
+        The end is exclusive. For a window that wrapped past midnight, the
+        start is on the previous day.
+        """
+        now = now or datetime.now()
+        window = self.lookup(now)
+        if window is None:
+            return None
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start = midnight + timedelta(minutes=window.start)
+        if window.wraps and minute_of(now) < window.start:
+            start -= timedelta(days=1)
+        length = (window.end - window.start) % MINUTES_PER_DAY or MINUTES_PER_DAY
+        return start, start + timedelta(minutes=length)
+
+    def window_start(self, now=None):
+        bounds = self.window_bounds(now)
+        return bounds[0] if bounds else None
+
+    def last_bounds(self, now=None):
+        """(start, end) of the window open at now, or else of the meal that
+        closed most recently (within the last day); None without meals"""
+        now = now or datetime.now()
+        bounds = self.window_bounds(now)
+        if bounds or not self.windows:
+            return bounds
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        index = bisect_right(self.starts, minute_of(now))
+        # Earlier today, then yesterday from the end back to this point
+        for day, segments in ((0, range(index - 1, -1, -1)), (-1, range(len(self.starts) - 1, index - 1, -1))):
+            for i in segments:
+                if self.owners[i] is not None:
+                    last_minute = (self.starts[i + 1] if i + 1 < len(self.starts) else MINUTES_PER_DAY) - 1
+                    return self.window_bounds(midnight + timedelta(days=day, minutes=last_minute))
+        return None
+
+    def next_start(self, now=None):
+        """When the next meal window starts (strictly after the current minute), or None"""
+        now = now or datetime.now()
+        if not self.windows:
+            return None
+        minute = minute_of(now)
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        starts = sorted(window.start for window in self.windows)
+        later = [start for start in starts if start > minute]
+        if later:
+            return midnight + timedelta(minutes=later[0])
+        return midnight + timedelta(days=1, minutes=starts[0])
+
+    def next_boundary(self, now=None):
+        """(time, opens) of the next change of meal: opens is False when every meal closes"""
+        now = now or datetime.now()
+        if not self.windows:
+            return None, True
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        index = bisect_right(self.starts, minute_of(now))
+        current = self.owners[index - 1]
+        # Later today, then the segments of tomorrow up to (and including) this one again
+        for day, segments in ((0, range(index, len(self.starts))), (1, range(0, index))):
+            for i in segments:
+                if self.owners[i] is not current:
+                    when = midnight + timedelta(days=day, minutes=self.starts[i])
+                    return when, self.owners[i] is not None
+        return None, True  # One meal covers the whole day
+
+
+_compiled_lock = threading.Lock()
+_compiled = (None, None)  # (meal schedule object, compiled schedule)
+
+
+def get_compiled_schedule(app_settings):
+    """Compiled meal schedule for a settings snapshot, built once per snapshot"""
+    global _compiled
+    meal_schedule = (app_settings or {}).get('CanteenMenu', {}).get('MealSchedule', []) or []
+    with _compiled_lock:
+        source, compiled = _compiled
+        if source is not meal_schedule:
+            compiled = CompiledMealSchedule(meal_schedule)
+            _compiled = (meal_schedule, compiled)
+    return compiled
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    def string_scan(meal_schedule, current_time):
+        # The lookup used across timeBase.py before this index existed
+        for meal in meal_schedule:
+            from_time = meal.get('fromTime', '')
+            to_time = meal.get('toTime', '')
+            if from_time and to_time and from_time <= current_time <= to_time:
+                return meal
+        return None
+
+    random.seed(7)
+    day = datetime(2025, 1, 31)
+
+    # Microbenchmark: typical three-meal schedule, lookups at random times
+    schedule = [
+        {'fromTime': '07:30', 'toTime': '09:30', 'mealType': 'Breakfast', 'price': '20'},
+        {'fromTime': '12:00', 'toTime': '14:00', 'mealType': 'Lunch', 'price': '40'},
+        {'fromTime': '16:00', 'toTime': '17:00', 'mealType': 'Snacks', 'price': '15'},
+        {'fromTime': '19:00', 'toTime': '21:30', 'mealType': 'Dinner', 'price': '40'},
+    ]
+    compiled = CompiledMealSchedule(schedule)
+    moments = [day + timedelta(minutes=random.randrange(MINUTES_PER_DAY)) for _ in range(100000)]
+
+    started = time.perf_counter()
+    for moment in moments:
+        string_scan(schedule, moment.strftime('%H:%M'))
+    scan = (time.perf_counter() - started) / len(moments)
+
+    started = time.perf_counter()
+    for moment in moments:
+        compiled.lookup(moment)
+    indexed = (time.perf_counter() - started) / len(moments)
+    print(f"string scan: {scan * 1e6:.2f}us per lookup, compiled index: {indexed * 1e6:.2f}us per lookup")
@@ -0,0 +1,79 @@
+import logging
+import threading
+from collections import deque
+
+
+class MetricsRegistry:
+    """In-process gauges and timing summaries.
+
+    Gauges hold the latest value (queue depth, page size, printer status);
+    observations keep count/sum/max plus a window of recent samples for
+    percentiles (latencies, drain times). Everything is keyed by metric name
+    and a label such as the device or printer address.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self.lock = threading.Lock()
+        self.gauges = {}
+        self.summaries = {}
+
+    def set_gauge(self, name, value, label=""):
+        with self.lock:
+            self.gauges[(name, label)] = value
+
+    def get_gauge(self, name, label="", default=None):
+        with self.lock:
+            return self.gauges.get((name, label), default)
+
+    def observe(self, name, value, label=""):
+        with self.lock:
+            summary = self.summaries.get((name, label))
+            if summary is None:
+                summary = {'count': 0, 'sum': 0.0, 'max': 0.0, 'last': 0.0,
+                           'samples': deque(maxlen=self.window)}
+                self.summaries[(name, label)] = summary
+            summary['count'] += 1
+            summary['sum'] += value
+            summary['max'] = max(summary['max'], value)
+            summary['last'] = value
+            summary['samples'].append(value)
+
+    def summary(self, name, label=""):
+        """count, mean, p50, p95, max and last for one observed metric"""
+        with self.lock:
+            summary = self.summaries.get((name, label))
+            if not summary:
+                return None
+            samples = sorted(summary['samples'])
+            count = summary['count']
+            return {
+                'count': count,
+                'mean': summary['sum'] / count,
+                'p50': samples[len(samples) // 2],
+                'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                'max': summary['max'],
+                'last': summary['last'],
+            }
+
+    def snapshot(self):
+        """Plain dict of every gauge and summary, e.g. for logging or a status view"""
+        with self.lock:
+            gauges = {f"{name}{{{label}}}" if label else name: value
+                      for (name, label), value in self.gauges.items()}
+            keys = list(self.summaries.keys())
+        summaries = {f"{name}{{{label}}}" if label else name: self.summary(name, label)
+                     for name, label in keys}
+        return {'gauges': gauges, 'summaries': summaries}
+
+    def log_snapshot(self):
+        snapshot = self.snapshot()
+        for name, value in sorted(snapshot['gauges'].items()):
+            logging.info(f"metric {name} = {value}")
+        for name, summary in sorted(snapshot['summaries'].items()):
+            logging.info(f"metric {name}: count={summary['count']} mean={summary['mean']:.3f} "
+                         f"p95={summary['p95']:.3f} max={summary['max']:.3f}")
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
@@ -0,0 +1,464 @@
+import hashlib
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from alertStream import ACCESS_CONTROL_MAJOR, ALERT_STREAM_PATH, DEFAULT_BOUNDARY
+
+# Local stand-ins for a Hikvision reader's ISAPI endpoints and alertStream.
+# They enforce digest authentication and count requests, 401 challenges and
+# TCP connections so the device client layer can be benchmarked without
+# hardware.
+
+REALM = "DS-K1T-MOCK"
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _parse_digest(header):
+    values = {}
+    for item in header[len('Digest '):].split(','):
+        if '=' in item:
+            key, value = item.strip().split('=', 1)
+            values[key] = value.strip('"')
+    return values
+
+
+def _digest_challenge(server, handler):
+    """None if the request carries valid digest credentials for server, else
+    the WWW-Authenticate challenge to answer it with"""
+    header = handler.headers.get('Authorization', '')
+    stale = False
+    if header.startswith('Digest '):
+        values = _parse_digest(header)
+        stale = values.get('nonce') not in server.nonces
+        if not stale and values.get('username') == server.username:
+            ha1 = _md5(f"{server.username}:{REALM}:{server.password}")
+            ha2 = _md5(f"{handler.command}:{values.get('uri', '')}")
+            expected = _md5(f"{ha1}:{values['nonce']}:{values.get('nc', '')}:"
+                            f"{values.get('cnonce', '')}:{values.get('qop', '')}:{ha2}")
+            if expected == values.get('response'):
+                return None
+    nonce = os.urandom(16).hex()
+    with server.lock:
+        server.nonces.add(nonce)
+        server.stats['challenges'] += 1
+    return (f'Digest qop="auth", realm="{REALM}", nonce="{nonce}", '
+            f'stale="{"TRUE" if stale else "FALSE"}"')
+
+
+class MockIsapiServer:
+    """Threaded HTTP/1.1 server answering the ISAPI calls EzeeCanteen makes"""
+
+    def __init__(self, username="admin", password="admin", host='127.0.0.1', port=0, max_results=30):
+        self.username = username
+        self.password = password
+        self.max_results = max_results  # Largest AcsEvent page the reader returns
+        self.response_delay = 0  # Seconds added to every AcsEvent search
+        self.offline = False  # Answer every request with 503 to simulate an outage
+        self.lock = threading.Lock()
+        self.events = []
+        self.users = {}  # employeeNo -> enrolled user, see add_user()
+        self.nonces = set()
+        self.expire_every = 0  # Forget every issued nonce after this many requests (0 to keep them)
+        self.stats = {'connections': 0, 'requests': 0, 'challenges': 0}
+        self.search_ids = []  # searchID of every AcsEvent search, in order
+        self.serial_no = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out as separate writes; without this,
+                # Nagle and the client's delayed ACK add ~40 ms to every reply
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server.lock:
+                    server.stats['connections'] += 1
+
+            def _reply(self, status, body=b"", content_type='application/json', headers=None):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode()
+                elif isinstance(body, str):
+                    body = body.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                length = int(self.headers.get('Content-Length', 0) or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _authorized(self):
+                challenge = _digest_challenge(server, self)
+                if challenge is None:
+                    return True
+                self._reply(401, b"", headers={'WWW-Authenticate': challenge})
+                return False
+
+            def _handle(self):
+                with server.lock:
+                    server.stats['requests'] += 1
+                    if server.expire_every and server.stats['requests'] % server.expire_every == 0:
+                        server.nonces.clear()
+                body = self._read_body()
+                if server.offline:
+                    self._reply(503, {"statusCode": 6, "statusString": "Device Busy"})
+                    return
+                if not self._authorized():
+                    return
+                path = urlparse(self.path).path
+                route = server.routes.get((self.command, path))
+                if route is None and self.command == 'GET' and path.startswith('/picture/'):
+                    route = server.handle_picture
+                if route is None:
+                    self._reply(404, {"statusCode": 4, "statusString": "Invalid Operation"})
+                    return
+                status, payload, content_type = route(self.path, body)
+                self._reply(status, payload, content_type)
+
+            do_GET = _handle
+            do_POST = _handle
+            do_PUT = _handle
+
+        self.routes = {
+            ('POST', '/ISAPI/AccessControl/AcsEvent'): self.handle_acs_event,
+            ('GET', '/ISAPI/AccessControl/AcsEvent/capabilities'): self.handle_acs_capabilities,
+            ('GET', '/ISAPI/System/deviceinfo'): self.handle_device_info,
+            ('PUT', '/ISAPI/AccessControl/UserInfo/Modify'): self.handle_user_modify,
+            ('POST', '/ISAPI/AccessControl/UserInfo/Search'): self.handle_user_search,
+            ('POST', '/ISAPI/Intelligent/FDLib/FDSearch'): self.handle_face_search,
+        }
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def add_event(self, employee_no, name="", minor=75, event_time=None):
+        """Record a punch that the AcsEvent search will return"""
+        with self.lock:
+            self.serial_no += 1
+            event = {
+                "major": 5,
+                "minor": minor,
+                "time": event_time or datetime.now().strftime('%Y-%m-%dT%H:%M:%S+05:30'),
+                "employeeNoString": str(employee_no),
+                "name": name,
+                "serialNo": self.serial_no,
+                "pictureURL": f"{self.base_url}/picture/{self.serial_no}.jpg",
+            }
+            self.events.append(event)
+        return event
+
+    def add_user(self, employee_no, name="", face=True):
+        """Enrol a user; calling it again with face=True re-enrols the face"""
+        with self.lock:
+            previous = self.users.get(str(employee_no))
+            version = (previous['faceVersion'] + 1) if previous else 1
+            self.users[str(employee_no)] = {'name': name, 'face': face, 'faceVersion': version}
+
+    def remove_user(self, employee_no):
+        with self.lock:
+            self.users.pop(str(employee_no), None)
+
+    @staticmethod
+    def _page(items, position, max_results):
+        page = items[position:position + max_results]
+        if not items:
+            status = "NO MATCH"
+        elif position + len(page) < len(items):
+            status = "MORE"
+        else:
+            status = "OK"
+        return page, status
+
+    def handle_user_search(self, path, body):
+        cond = json.loads(body or b"{}").get("UserInfoSearchCond", {})
+        position = int(cond.get("searchResultPosition", 0))
+        max_results = min(int(cond.get("maxResults", 10)), self.max_results)
+        with self.lock:
+            users = [{"employeeNo": no, "name": user['name'], "numOfFace": 1 if user['face'] else 0}
+                     for no, user in sorted(self.users.items())]
+        page, status = self._page(users, position, max_results)
+        return 200, {
+            "UserInfoSearch": {
+                "searchID": cond.get("searchID", "1"),
+                "responseStatusStrg": status,
+                "numOfMatches": len(page),
+                "totalMatches": len(users),
+                "UserInfo": page,
+            }
+        }, 'application/json'
+
+    def handle_face_search(self, path, body):
+        cond = json.loads(body or b"{}")
+        position = int(cond.get("searchResultPosition", 0))
+        max_results = min(int(cond.get("maxResults", 10)), self.max_results)
+        with self.lock:
+            faces = [{"FPID": no, "faceURL": f"{self.base_url}/picture/face/{no}.jpg@{user['faceVersion']}"}
+                     for no, user in sorted(self.users.items()) if user['face']]
+        page, status = self._page(faces, position, max_results)
+        return 200, {
+            "responseStatusStrg": status,
+            "numOfMatches": len(page),
+            "totalMatches": len(faces),
+            "MatchList": page,
+        }, 'application/json'
+
+    def handle_acs_event(self, path, body):
+        cond = json.loads(body or b"{}").get("AcsEventCond", {})
+        start = cond.get("startTime", "")[:19]
+        end = cond.get("endTime", "9999")[:19]
+        position = int(cond.get("searchResultPosition", 0))
+        max_results = min(int(cond.get("maxResults", 10)), self.max_results)
+        if self.response_delay:
+            time.sleep(self.response_delay)
+
+        with self.lock:
+            self.search_ids.append(cond.get("searchID"))
+            matches = [e for e in self.events if start <= e["time"][:19] <= end]
+
+        page = matches[position:position + max_results]
+        if not matches:
+            status = "NO MATCH"
+        elif position + len(page) < len(matches):
+            status = "MORE"
+        else:
+            status = "OK"
+        return 200, {
+            "AcsEvent": {
+                "searchID": cond.get("searchID", "1"),
+                "responseStatusStrg": status,
+                "numOfMatches": len(page),
+                "totalMatches": len(matches),
+                "InfoList": page,
+            }
+        }, 'application/json'
+
+    def handle_acs_capabilities(self, path, body):
+        return 200, {
+            "AcsEvent": {
+                "AcsEventCond": {
+                    "searchID": {"@min": 1, "@max": 36},
+                    "searchResultPosition": {"@min": 0, "@max": 100000},
+                    "maxResults": {"@min": 1, "@max": self.max_results},
+                }
+            }
+        }, 'application/json'
+
+    def handle_device_info(self, path, body):
+        xml = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<DeviceInfo version="2.0"><deviceName>Mock Reader</deviceName>'
+            '<model>DS-K1T-MOCK</model><serialNumber>DS-K1T-MOCK20250101</serialNumber>'
+            '<macAddress>00:11:22:33:44:55</macAddress></DeviceInfo>'
+        )
+        return 200, xml, 'application/xml'
+
+    def handle_user_modify(self, path, body):
+        return 200, {"statusCode": 1, "statusString": "OK", "subStatusCode": "ok"}, 'application/json'
+
+    def handle_picture(self, path, body):
+        return 200, b"\xff\xd8\xff\xe0mock-jpeg" + os.urandom(2048) + b"\xff\xd9", 'image/jpeg'
+
+
+class MockAlertStreamServer:
+    """Local stand-in for a reader's alertStream endpoint.
+
+    Serves an endless multipart/mixed body on ALERT_STREAM_PATH, one part per
+    pushed event plus a heartbeat every heartbeat_interval seconds, to
+    clients that pass digest authentication. Used to test and benchmark
+    stream ingestion without a physical device.
+    """
+
+    def __init__(self, username="admin", password="admin", host='127.0.0.1', port=0, heartbeat_interval=10):
+        self.username = username
+        self.password = password
+        self.heartbeat_interval = heartbeat_interval
+        self.clients = []
+        self.lock = threading.Lock()
+        self.nonces = set()
+        self.stats = {'connections': 0, 'requests': 0, 'challenges': 0}
+        self.serial_no = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.stats['connections'] += 1
+
+            def do_GET(self):
+                with server.lock:
+                    server.stats['requests'] += 1
+                if not self.path.startswith(ALERT_STREAM_PATH):
+                    self.send_error(404)
+                    return
+
+                challenge = _digest_challenge(server, self)
+                if challenge is not None:
+                    self.send_response(401)
+                    self.send_header('WWW-Authenticate', challenge)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                # Each part goes out as it is pushed, as from a reader
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/mixed; boundary={DEFAULT_BOUNDARY}')
+                self.send_header('Connection', 'keep-alive')
+                self.end_headers()
+
+                client = queue.Queue()
+                with server.lock:
+                    server.clients.append(client)
+                try:
+                    while True:
+                        try:
+                            part = client.get(timeout=server.heartbeat_interval)
+                        except queue.Empty:
+                            part = server._build_part(server._heartbeat())
+                        if part is None:
+                            break
+                        self.wfile.write(part)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server.lock:
+                        if client in server.clients:
+                            server.clients.remove(client)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Drop all streams and shut the server down"""
+        self.drop_clients()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def drop_clients(self):
+        """Close every open stream, simulating a network blip"""
+        with self.lock:
+            for client in self.clients:
+                client.put(None)
+
+    def client_count(self):
+        with self.lock:
+            return len(self.clients)
+
+    def push_event(self, employee_no, name="", sub_event_type=75, picture=None, event_time=None,
+                   pictures_number=None):
+        """Send one access control event to every connected stream.
+
+        pictures_number overrides the announced picture count, e.g. to
+        announce a picture that never follows.
+        """
+        with self.lock:
+            self.serial_no += 1
+            serial_no = self.serial_no
+
+        alert = {
+            "ipAddress": self.host,
+            "portNo": self.port,
+            "protocol": "HTTP",
+            "dateTime": event_time or datetime.now().strftime('%Y-%m-%dT%H:%M:%S+05:30'),
+            "activePostCount": 1,
+            "eventType": "AccessControllerEvent",
+            "eventState": "active",
+            "eventDescription": "Access Controller Event",
+            "AccessControllerEvent": {
+                "majorEventType": ACCESS_CONTROL_MAJOR,
+                "subEventType": sub_event_type,
+                "name": name,
+                "employeeNoString": str(employee_no),
+                "serialNo": serial_no,
+                "picturesNumber": (1 if picture else 0) if pictures_number is None else pictures_number,
+            }
+        }
+
+        data = self._build_part(alert)
+        if picture:
+            data += self._build_part(picture, 'image/jpeg')
+
+        with self.lock:
+            for client in self.clients:
+                client.put(data)
+        return serial_no
+
+    def push_picture(self, picture):
+        """Send a picture part on its own, as a reader does when it is slow to follow its event"""
+        data = self._build_part(picture, 'image/jpeg')
+        with self.lock:
+            for client in self.clients:
+                client.put(data)
+
+    def _heartbeat(self):
+        return {
+            "ipAddress": self.host,
+            "dateTime": datetime.now().strftime('%Y-%m-%dT%H:%M:%S+05:30'),
+            "activePostCount": 0,
+            "eventType": "heartBeat",
+            "eventState": "active",
+            "eventDescription": "heartBeat"
+        }
+
+    def _build_part(self, payload, content_type='application/json; charset="UTF-8"'):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        header = (
+            f"--{DEFAULT_BOUNDARY}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode()
+        return header + body + b"\r\n"
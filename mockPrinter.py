@@ -0,0 +1,74 @@
+import socket
+import threading
+import time
+
+from printSpooler import STATUS_QUERY
+
+# Local stand-in for a raw 9100 thermal printer. It accepts connections,
+# keeps every byte it receives and answers DLE EOT status queries with
+# status_reply, so the print spooler can be tested without hardware.
+
+
+class MockPrinter:
+    """Accepts connections and counts what arrives, like a raw 9100 printer"""
+
+    def __init__(self, port=0):
+        self.server = socket.create_server(('127.0.0.1', port))
+        self.port = self.server.getsockname()[1]
+        self.lock = threading.Lock()
+        self.received = bytearray()
+        self.connections = 0
+        self.clients = []
+        self.status_reply = b'\x12\x12\x12'  # Online, paper present
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+                self.clients.append(client)
+            threading.Thread(target=self._read, args=(client,), daemon=True).start()
+
+    def _read(self, client):
+        while True:
+            try:
+                data = client.recv(65536)
+            except OSError:
+                return
+            if not data:
+                client.close()
+                return
+            if STATUS_QUERY in data:
+                data = data.replace(STATUS_QUERY, b'')
+                client.sendall(self.status_reply)
+            with self.lock:
+                self.received += data
+
+    def drop_clients(self):
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+                client.close()
+            except OSError:
+                pass  # Already closed by the client
+
+    def wait_for(self, size, timeout=10):
+        deadline = time.monotonic() + timeout
+        while len(self.received) < size and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return len(self.received) >= size
+
+    def close(self):
+        # shutdown() wakes the accept() thread so the port really closes
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Already closed
+        self.server.close()
+        self.drop_clients()
@@ -1,15 +1,217 @@
-import socket
 from datetime import datetime
+from functools import lru_cache
 
+from printLogo import get_logo
+from printSpooler import get_print_spooler, shutdown_print_spooler
+from slipTemplate import SlipTemplate
 
+# Thermal printer (ESC/POS) commands
+INIT_PRINTER = b'\x1B\x40'  # Initialize printer
+CENTER_ALIGN = b'\x1B\x61\x01'  # Center alignment
+LEFT_ALIGN = b'\x1B\x61\x00'  # Left alignment
+BOLD_ON = b'\x1B\x45\x01'  # Bold on
+BOLD_OFF = b'\x1B\x45\x00'  # Bold off
+DOUBLE_SIZE = b'\x1D\x21\x11'  # Double width, double height
+NORMAL_SIZE = b'\x1D\x21\x00'  # Normal size
+SMALL_FONT = b'\x1B\x4D\x01'
+NORMAL_FONT = b'\x1B\x4D\x00'
+FEED_AND_CUT = b'\x1Bd\x02\x1Bd\x02\x1D\x56\x01'  # Feed paper and cut
 
 
+def _enabled_text(block):
+    """Text of an enabled Header/Footer block, or None (hashable, for the template cache)"""
+    return block['text'] if block.get('enable', False) else None
 
 
+def _printed_at(fields):
+    return f"Printed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n".encode()
 
-def print_custom_slip(ip, port, header, cart_items, id, name, punchTime, specialMessage, footer):
+
+def _custom_cart_lines(fields):
+    grand_total = 0
+    total_items = 0
+
+    # Each cart item (centered)
+    out = []
+    for item_name, item_data in fields['cart_items'].items():
+        quantity = item_data['quantity']
+        total_price = item_data['total']
+        grand_total += total_price
+        total_items += quantity
+
+        display_name = item_name[:16] if len(item_name) > 16 else item_name
+        line_content = f"{display_name:<16} {quantity:>4} {total_price:>8.0f}"
+        padding = (32 - len(line_content)) // 2
+        out.append(' ' * padding + line_content + '\n')
+
+    out.append("--------------------------------\n")
+
+    # Totals
+    total_line = f"{'TOTAL ITEMS:':<16} {total_items:>4}"
+    grand_total_line = f"{'GRAND TOTAL:':<16} Rs.{grand_total:>6.0f}"
+    return (''.join(out).encode() + BOLD_ON
+            + (' ' * ((32 - len(total_line)) // 2) + total_line + '\n').encode()
+            + (' ' * ((32 - len(grand_total_line)) // 2) + grand_total_line + '\n').encode())
+
+
+def _wide_cart_lines(fields):
+    grand_total = 0
+    total_items = 0
+
+    # Each cart item
+    out = []
+    for item_name, item_data in fields['cart_items'].items():
+        quantity = item_data['quantity']
+        price = item_data['price']
+        total_price = item_data['total']
+        grand_total += total_price
+        total_items += quantity
+
+        # Truncate item name if too long
+        display_name = item_name[:25] if len(item_name) > 25 else item_name
+        line = f"{display_name:<25} {quantity:>6} {price:>7.0f} {total_price:>8.0f}\n"
+        out.append(line)
+        out.append(line + " ")
+
+    out.append("================================================\n")
+
+    # Totals
+    return (''.join(out).encode() + BOLD_ON
+            + f"{'TOTAL ITEMS:':<32} {total_items:>6}\n".encode()
+            + f"{'GRAND TOTAL:':<32} Rs.{grand_total:>6.0f}\n".encode())
+
+
+def _logo_segments(logo):
+    return [CENTER_ALIGN, logo] if logo else []
+
+
+@lru_cache(maxsize=32)
+def custom_slip_template(header_text, special_message, footer_text, logo=b''):
+    """Custom order slip for 32 character printers, compiled once per header/message/footer"""
+    segments = [INIT_PRINTER] + _logo_segments(logo)
+
+    if header_text is not None:
+        segments += [CENTER_ALIGN, BOLD_ON, DOUBLE_SIZE, f"{header_text}\n", NORMAL_SIZE, BOLD_OFF, b"\n"]
+
+    # Order title and customer details
+    segments += [CENTER_ALIGN, BOLD_ON, b"FOOD ORDER RECEIPT\n", BOLD_OFF, b"\n", LEFT_ALIGN,
+                 lambda f: f"Customer: {f['name']}\nID: {f['id']}\nTime: {f['punch_time']}\n".encode(), b"\n"]
+
+    # Table header (centered)
+    header_line = f"{'ITEM':<16} {'QTY':>4} {'TOTAL':>8}"
+    segments += [CENTER_ALIGN, BOLD_ON, SMALL_FONT, ' ' * ((32 - len(header_line)) // 2) + header_line + '\n',
+                 BOLD_OFF, b"--------------------------------\n", NORMAL_FONT]
+
+    segments += [_custom_cart_lines, BOLD_OFF, b"--------------------------------\n", b"\n"]
+
+    if special_message and special_message.strip():
+        segments += [CENTER_ALIGN, SMALL_FONT, f"{special_message}\n", NORMAL_FONT, b"\n"]
+
+    # Order instructions
+    segments += [CENTER_ALIGN, SMALL_FONT, b"Please show this receipt\n", b"when collecting your order\n",
+                 NORMAL_FONT, b"\n"]
+
+    if footer_text is not None:
+        segments += [CENTER_ALIGN, SMALL_FONT, f"{footer_text}\n", NORMAL_FONT]
+
+    segments += [b"\n", CENTER_ALIGN, SMALL_FONT, _printed_at, NORMAL_FONT, FEED_AND_CUT]
+    return SlipTemplate(segments)
+
+
+@lru_cache(maxsize=32)
+def custom_slip_wide_template(header_text, special_message, footer_text, logo=b''):
+    """Custom order slip for 48+ character printers, compiled once per header/message/footer"""
+    segments = [INIT_PRINTER] + _logo_segments(logo)
+
+    if header_text is not None:
+        segments += [CENTER_ALIGN, BOLD_ON, DOUBLE_SIZE, f"{header_text}\n", NORMAL_SIZE, BOLD_OFF, b"\n"]
+
+    # Order title and customer details
+    segments += [CENTER_ALIGN, BOLD_ON, b"FOOD ORDER RECEIPT\n", BOLD_OFF, b"\n", LEFT_ALIGN,
+                 lambda f: f"Customer: {f['name']:<20} ID: {f['id']}\nDate & Time: {f['punch_time']}\n".encode(),
+                 b"\n"]
+
+    # Table header between 48 character separators
+    segments += [b"================================================\n", BOLD_ON,
+                 f"{'ITEM':<25} {'QTY':>6} {'PRICE':>7} {'TOTAL':>8}\n", BOLD_OFF,
+                 b"================================================\n"]
+
+    segments += [_wide_cart_lines, BOLD_OFF, b"================================================\n", b"\n"]
+
+    if special_message and special_message.strip():
+        segments += [CENTER_ALIGN, f"{special_message}\n", b"\n"]
+
+    # Order instructions
+    segments += [CENTER_ALIGN, b"Please show this receipt when collecting your order\n", b"\n"]
+
+    if footer_text is not None:
+        segments += [CENTER_ALIGN, f"{footer_text}\n"]
+
+    segments += [b"\n", CENTER_ALIGN, SMALL_FONT, _printed_at, NORMAL_FONT, FEED_AND_CUT]
+    return SlipTemplate(segments)
+
+
+def _token_line(fields):
+    # Token number if provided - bold
+    if fields['token'] != 0:
+        return BOLD_ON + f"Token No: {fields['token']}\n".encode() + BOLD_OFF
+    return b''
+
+
+@lru_cache(maxsize=32)
+def token_slip_template(header_text, special_message, footer_text, logo=b''):
+    """Meal token slip, compiled once per header/message/footer"""
+    # Initialize printer and set center alignment
+    segments = [INIT_PRINTER, CENTER_ALIGN, logo, _token_line]
+
+    # Header if enabled - bold
+    if header_text is not None:
+        segments += [BOLD_ON, f"{header_text}\n", BOLD_OFF]
+
+    # Coupon type with double size font, then user details - centered
+    segments += [b"\n", DOUBLE_SIZE, lambda f: f"{f['coupon_type']}\n".encode(), NORMAL_SIZE, b"\n",
+                 lambda f: f"User: {f['id']}, {f['name']}\nDate Time: {f['punch_time']}\n".encode()]
+
+    # Special message if provided
+    if special_message.strip() != "":
+        segments += [b"\n", f"{special_message}\n"]
+
+    # Footer
+    segments.append(b"\n")
+    if footer_text is not None:
+        segments.append(f"{footer_text}\n")
+
+    segments.append(FEED_AND_CUT)
+    return SlipTemplate(segments)
+
+
+def render_custom_slip(header, cart_items, id, name, punchTime, specialMessage, footer, logo=None):
+    """Bytes of a custom order slip for 32 character thermal printers"""
+    template = custom_slip_template(_enabled_text(header), specialMessage, _enabled_text(footer), get_logo(logo))
+    return template.render({'cart_items': cart_items, 'id': id, 'name': name, 'punch_time': punchTime})
+
+
+def render_custom_slip_wide(header, cart_items, id, name, punchTime, specialMessage, footer, logo=None):
+    """Bytes of a custom order slip for wider thermal printers (48+ characters)"""
+    template = custom_slip_wide_template(_enabled_text(header), specialMessage, _enabled_text(footer), get_logo(logo))
+    return template.render({'cart_items': cart_items, 'id': id, 'name': name, 'punch_time': punchTime})
+
+
+def render_slip(CouponCount, header, CouponType, id, name, punchTime, specialMessage, footer, logo=None):
+    """Bytes of a meal token slip"""
+    template = token_slip_template(_enabled_text(header), specialMessage, _enabled_text(footer), get_logo(logo))
+    return template.render({'token': CouponCount, 'coupon_type': CouponType, 'id': id, 'name': name,
+                            'punch_time': punchTime})
+
+
+def print_custom_slip(ip, port, header, cart_items, id, name, punchTime, specialMessage, footer, on_result=None, token=None, logo=None):
     """
-    Print a custom order slip to a thermal printer using socket communication
+    Queue a custom order slip for a thermal printer
+
+    The slip is rendered here, recorded in the print journal and sent by
+    the printer's spooler queue (printSpooler), so this returns without
+    waiting for the printer. A slip the printer misses is printed when it
+    is reachable again.
 
     Args:
         ip (str): Printer IP address
@@ -21,292 +223,44 @@ def print_custom_slip(ip, port, header, cart_items, id, name, punchTime, special
         punchTime (str): Date and time
         specialMessage (str): Special message to print (optional)
         footer (dict): Footer with enable flag and text
+        on_result (callable): Called with True/False once the slip was sent (optional)
+        token (int): Token number the slip is journaled under for reprints (optional)
+        logo (dict): PrinterConfig Logo block with enable flag, path and width (optional)
+
+    Returns:
+        bool: True if the slip was queued
     """
     try:
-        # Create a socket connection
-        printer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        printer.connect((ip, port))
-
-        # Define thermal printer commands
-        INIT_PRINTER = b'\x1B\x40'
-        CENTER_ALIGN = b'\x1B\x61\x01'
-        LEFT_ALIGN = b'\x1B\x61\x00'
-        RIGHT_ALIGN = b'\x1B\x61\x02'
-        BOLD_ON = b'\x1B\x45\x01'
-        BOLD_OFF = b'\x1B\x45\x00'
-        DOUBLE_SIZE = b'\x1D\x21\x11'
-        NORMAL_SIZE = b'\x1D\x21\x00'
-        SMALL_FONT = b'\x1B\x4D\x01'
-        NORMAL_FONT = b'\x1B\x4D\x00'
-        UNDERLINE_ON = b'\x1B\x2D\x01'
-        UNDERLINE_OFF = b'\x1B\x2D\x00'
-        FEED_AND_CUT = b'\x1Bd\x02\x1Bd\x02\x1D\x56\x01'
-
-        # Initialize printer
-        printer.send(INIT_PRINTER)
-
-        # Print header if enabled
-        if header.get('enable', False):
-            printer.send(CENTER_ALIGN)
-            printer.send(BOLD_ON)
-            printer.send(DOUBLE_SIZE)
-            printer.send(f"{header['text']}\n".encode())
-            printer.send(NORMAL_SIZE)
-            printer.send(BOLD_OFF)
-            printer.send(b"\n")
-
-        # Print order title
-        printer.send(CENTER_ALIGN)
-        printer.send(BOLD_ON)
-        printer.send(b"FOOD ORDER RECEIPT\n")
-        printer.send(BOLD_OFF)
-        printer.send(b"\n")
-
-        # Print customer details
-        printer.send(LEFT_ALIGN)
-        printer.send(f"Customer: {name}\n".encode())
-        printer.send(f"ID: {id}\n".encode())
-        printer.send(f"Time: {punchTime}\n".encode())
-        printer.send(b"\n")
-
-        # Print separator line
-        # printer.send(b"--------------------------------\n")
-
-        # Print table header (centered)
-        printer.send(CENTER_ALIGN)
-        printer.send(BOLD_ON)
-        printer.send(SMALL_FONT)
-
-        header_text = f"{'ITEM':<16} {'QTY':>4} {'TOTAL':>8}"
-        padding = (32 - len(header_text)) // 2
-        printer.send((' ' * padding + header_text + '\n').encode())
-
-        printer.send(BOLD_OFF)
-        printer.send(b"--------------------------------\n")
-        printer.send(NORMAL_FONT)
-
-        grand_total = 0
-        total_items = 0
-
-        # Print each cart item (centered)
-        for item_name, item_data in cart_items.items():
-            quantity = item_data['quantity']
-            total_price = item_data['total']
-            grand_total += total_price
-            total_items += quantity
-
-            display_name = item_name[:16] if len(item_name) > 16 else item_name
-            line_content = f"{display_name:<16} {quantity:>4} {total_price:>8.0f}"
-            padding = (32 - len(line_content)) // 2
-            printer.send((' ' * padding + line_content + '\n').encode())
-
-        # Print separator
-        printer.send(b"--------------------------------\n")
-
-        # Print totals
-        printer.send(BOLD_ON)
-
-        total_line = f"{'TOTAL ITEMS:':<16} {total_items:>4}"
-        padding = (32 - len(total_line)) // 2
-        printer.send((' ' * padding + total_line + '\n').encode())
-
-        grand_total_line = f"{'GRAND TOTAL:':<16} Rs.{grand_total:>6.0f}"
-        padding = (32 - len(grand_total_line)) // 2
-        printer.send((' ' * padding + grand_total_line + '\n').encode())
-
-        printer.send(BOLD_OFF)
-        printer.send(b"--------------------------------\n")
-        printer.send(b"\n")
-
-        # Print special message if provided
-        if specialMessage and specialMessage.strip():
-            printer.send(CENTER_ALIGN)
-            printer.send(SMALL_FONT)
-            printer.send(f"{specialMessage}\n".encode())
-            printer.send(NORMAL_FONT)
-            printer.send(b"\n")
-
-        # Print order instructions
-        printer.send(CENTER_ALIGN)
-        printer.send(SMALL_FONT)
-        printer.send(b"Please show this receipt\n")
-        printer.send(b"when collecting your order\n")
-        printer.send(NORMAL_FONT)
-        printer.send(b"\n")
-
-        # Print footer if enabled
-        if footer.get('enable', False):
-            printer.send(CENTER_ALIGN)
-            printer.send(SMALL_FONT)
-            printer.send(f"{footer['text']}\n".encode())
-            printer.send(NORMAL_FONT)
-
-        # Print timestamp
-        printer.send(b"\n")
-        printer.send(CENTER_ALIGN)
-        printer.send(SMALL_FONT)
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        printer.send(f"Printed: {current_time}\n".encode())
-        printer.send(NORMAL_FONT)
-
-        # Feed paper and cut
-        printer.send(FEED_AND_CUT)
-
-        # Close connection
-        printer.close()
-        print(f"Custom order receipt printed successfully for {name}")
-
+        data = render_custom_slip(header, cart_items, id, name, punchTime, specialMessage, footer, logo)
+        return get_print_spooler().submit(ip, port, data, on_result, token)
     except Exception as e:
         print(f"Error printing custom slip: {e}")
+        return False
 
 
-
-def print_custom_slip_wide(ip, port, header, cart_items, id, name, punchTime, specialMessage, footer):
+def print_custom_slip_wide(ip, port, header, cart_items, id, name, punchTime, specialMessage, footer, on_result=None, token=None, logo=None):
     """
-    Print a custom order slip for wider thermal printers (48+ characters)
-    
-    Args:
-        ip (str): Printer IP address
-        port (int): Printer port number
-        header (dict): Header with enable flag and text
-        cart_items (dict): Dictionary of cart items {item_name: {quantity, price, total}}
-        id (str): User ID
-        name (str): User name
-        punchTime (str): Date and time
-        specialMessage (str): Special message to print (optional)
-        footer (dict): Footer with enable flag and text
+    Queue a custom order slip for wider thermal printers (48+ characters)
+
+    Args and return value as for print_custom_slip.
     """
     try:
-        # Create a socket connection
-        printer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        printer.connect((ip, port))
-        
-        # Define thermal printer commands
-        INIT_PRINTER = b'\x1B\x40'
-        CENTER_ALIGN = b'\x1B\x61\x01'
-        LEFT_ALIGN = b'\x1B\x61\x00'
-        RIGHT_ALIGN = b'\x1B\x61\x02'
-        BOLD_ON = b'\x1B\x45\x01'
-        BOLD_OFF = b'\x1B\x45\x00'
-        DOUBLE_SIZE = b'\x1D\x21\x11'
-        NORMAL_SIZE = b'\x1D\x21\x00'
-        SMALL_FONT = b'\x1B\x4D\x01'
-        NORMAL_FONT = b'\x1B\x4D\x00'
-        FEED_AND_CUT = b'\x1Bd\x02\x1Bd\x02\x1D\x56\x01'
-
-        # Initialize printer
-        printer.send(INIT_PRINTER)
-        
-        # Print header if enabled
-        if header.get('enable', False):
-            printer.send(CENTER_ALIGN)
-            printer.send(BOLD_ON)
-            printer.send(DOUBLE_SIZE)
-            printer.send(f"{header['text']}\n".encode())
-            printer.send(NORMAL_SIZE)
-            printer.send(BOLD_OFF)
-            printer.send(b"\n")
-        
-        # Print order title
-        printer.send(CENTER_ALIGN)
-        printer.send(BOLD_ON)
-        printer.send(b"FOOD ORDER RECEIPT\n")
-        printer.send(BOLD_OFF)
-        printer.send(b"\n")
-        
-        # Print customer details
-        printer.send(LEFT_ALIGN)
-        printer.send(f"Customer: {name:<20} ID: {id}\n".encode())
-        printer.send(f"Date & Time: {punchTime}\n".encode())
-        printer.send(b"\n")
-        
-        # Print separator line (48 characters wide)
-        printer.send(b"================================================\n")
-        
-        # Print table header
-        printer.send(BOLD_ON)
-        header_line = f"{'ITEM':<25} {'QTY':>6} {'PRICE':>7} {'TOTAL':>8}\n"
-        printer.send(header_line.encode())
-        printer.send(BOLD_OFF)
-        printer.send(b"================================================\n")
-        
-        # Calculate totals
-        grand_total = 0
-        total_items = 0
-        
-        # Print each cart item
-        for item_name, item_data in cart_items.items():
-            quantity = item_data['quantity']
-            price = item_data['price']
-            total_price = item_data['total']
-            grand_total += total_price
-            total_items += quantity
-            
-            # Truncate item name if too long
-            display_name = item_name[:25] if len(item_name) > 25 else item_name
-            
-            # Format the line with proper spacing
-            line = f"{display_name:<25} {quantity:>6} {price:>7.0f} {total_price:>8.0f}\n"
-            printer.send(line.encode())
-            printer.send((line + " ").encode())
-
-        # Print separator
-        printer.send(b"================================================\n")
-        
-        # Print totals
-        printer.send(BOLD_ON)
-        total_items_line = f"{'TOTAL ITEMS:':<32} {total_items:>6}\n"
-        printer.send(total_items_line.encode())
-        
-        grand_total_line = f"{'GRAND TOTAL:':<32} Rs.{grand_total:>6.0f}\n"
-        printer.send(grand_total_line.encode())
-        printer.send(BOLD_OFF)
-        
-        printer.send(b"================================================\n")
-        printer.send(b"\n")
-        
-        # Print special message if provided
-        if specialMessage and specialMessage.strip():
-            printer.send(CENTER_ALIGN)
-            printer.send(f"{specialMessage}\n".encode())
-            printer.send(b"\n")
-        
-        # Print order instructions
-        printer.send(CENTER_ALIGN)
-        printer.send(b"Please show this receipt when collecting your order\n")
-        printer.send(b"\n")
-        
-        # Print footer if enabled
-        if footer.get('enable', False):
-            printer.send(CENTER_ALIGN)
-            printer.send(f"{footer['text']}\n".encode())
-        
-        # Print timestamp
-        printer.send(b"\n")
-        printer.send(CENTER_ALIGN)
-        printer.send(SMALL_FONT)
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        printer.send(f"Printed: {current_time}\n".encode())
-        printer.send(NORMAL_FONT)
-        
-        # Feed paper and cut
-        printer.send(FEED_AND_CUT)
-        
-        # Close connection
-        printer.close()
-        print(f"Wide custom order receipt printed successfully for {name}")
-        
+        data = render_custom_slip_wide(header, cart_items, id, name, punchTime, specialMessage, footer, logo)
+        return get_print_spooler().submit(ip, port, data, on_result, token)
     except Exception as e:
         print(f"Error printing wide custom slip: {e}")
+        return False
 
 
+def print_slip(ip, port, CouponCount, header, CouponType, id, name, punchTime, specialMessage, footer, on_result=None, token=None, logo=None):
+    """
+    Queue a token slip for a thermal printer
 
+    The slip is rendered here, recorded in the print journal and sent by
+    the printer's spooler queue (printSpooler), so this returns without
+    waiting for the printer. A slip the printer misses is printed when it
+    is reachable again.
 
-
-def print_slip(ip, port, CouponCount, header, CouponType, id, name, punchTime, specialMessage, footer):
-    """
-    Print a slip to a thermal printer using socket communication
-    
     Args:
         ip (str): Printer IP address
         port (int): Printer port number
@@ -318,69 +272,19 @@ def print_slip(ip, port, CouponCount, header, CouponType, id, name, punchTime, s
         punchTime (str): Date and time
         specialMessage (str): Special message to print (optional)
         footer (dict): Footer with enable flag and text
+        on_result (callable): Called with True/False once the slip was sent (optional)
+        token (int): Token number the slip is journaled under for reprints (optional)
+        logo (dict): PrinterConfig Logo block with enable flag, path and width (optional)
+
+    Returns:
+        bool: True if the slip was queued
     """
     try:
-        # Create a socket connection
-        printer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        printer.connect((ip, port))
-        # print("Connected to printer")
-        
-        # Define commands
-        INIT_PRINTER = b'\x1B\x40'  # Initialize printer
-        CENTER_ALIGN = b'\x1B\x61\x01'  # Center alignment
-        LEFT_ALIGN = b'\x1B\x61\x00'  # Left alignment
-        BOLD_ON = b'\x1B\x45\x01'  # Bold on
-        BOLD_OFF = b'\x1B\x45\x00'  # Bold off
-        DOUBLE_SIZE = b'\x1D\x21\x11'  # Double width, double height
-        NORMAL_SIZE = b'\x1D\x21\x00'  # Normal size
-        FEED_AND_CUT = b'\x1Bd\x02\x1Bd\x02\x1D\x56\x01'  # Feed paper and cut
-        
-        # Initialize printer and set center alignment
-        printer.send(INIT_PRINTER)
-        printer.send(CENTER_ALIGN)
-        
-        # Print token number if provided - bold
-        if CouponCount != 0:
-            printer.send(BOLD_ON)
-            printer.send(f"Token No: {CouponCount}\n".encode())
-            printer.send(BOLD_OFF)
-        
-        # Print header if enabled - bold
-        if header.get('enable', False):
-            printer.send(BOLD_ON)
-            printer.send(f"{header['text']}\n".encode())
-            printer.send(BOLD_OFF)
-        
-        # Print coupon type with double size font
-        printer.send(b"\n")
-        printer.send(DOUBLE_SIZE)
-        printer.send(f"{CouponType}\n".encode())
-        printer.send(NORMAL_SIZE)
-        printer.send(b"\n")
-        
-        # Print user details - centered
-        printer.send(f"User: {id}, {name}\n".encode())
-        printer.send(f"Date Time: {punchTime}\n".encode())
-        
-        # Print special message if provided
-        if specialMessage.strip() != "":
-            printer.send(b"\n")
-            printer.send(f"{specialMessage}\n".encode())
-        
-        # Print footer
-        printer.send(b"\n")
-        
-        if footer.get('enable', False):
-            printer.send(f"{footer['text']}\n".encode())
-        
-        # Feed paper and cut
-        printer.send(FEED_AND_CUT)
-        
-        # Close connection
-        printer.close()
-        
+        data = render_slip(CouponCount, header, CouponType, id, name, punchTime, specialMessage, footer, logo)
+        return get_print_spooler().submit(ip, port, data, on_result, token)
     except Exception as e:
         print(f"Error printing SLIP: {e}")
+        return False
 
 # Example usage:
 if __name__ == "__main__":
@@ -469,3 +373,6 @@ if __name__ == "__main__":
         )
     except Exception as e:
         print(f"Wide print test failed: {e}")
+
+    # Slips are sent by the spooler's worker; let it finish before exiting
+    shutdown_print_spooler()
@@ -0,0 +1,145 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from appPaths import get_data_file
+
+JOURNAL_FILE = "printJournal.sqlite3"
+
+# Defaults for the "PrintJournal" block of appSettings.json
+DEFAULT_PRINT_JOURNAL = {
+    'enabled': True,
+    'maxAgeMinutes': 30,  # Unprinted jobs older than this are never printed
+    'keepDays': 7,  # How long printed jobs stay available for reprint
+}
+
+PENDING = 'pending'
+PRINTED = 'printed'
+EXPIRED = 'expired'
+
+
+def get_print_journal_settings(app_settings):
+    """Return the print journal settings with defaults filled in"""
+    settings = dict(DEFAULT_PRINT_JOURNAL)
+    settings.update((app_settings or {}).get('PrintJournal', {}) or {})
+    return settings
+
+
+class PrintJournal:
+    """Every print job, written to SQLite before it is sent.
+
+    A job stays pending until the printer has taken it (ack()), so a token
+    issued while its printer is down, or still queued when the application
+    stops, is printed when the printer is reachable again. pending() hands
+    jobs back oldest first and expires those older than maxAgeMinutes, so
+    a token from an earlier meal is never printed late. Printed jobs are
+    kept keepDays for reprinting by token number.
+    """
+
+    def __init__(self, path, max_age_minutes=30, keep_days=7):
+        self.path = path
+        self.max_age = float(max_age_minutes) * 60
+        self.keep_days = keep_days
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ip TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                token INTEGER,
+                label TEXT,
+                data BLOB NOT NULL,
+                created REAL NOT NULL,
+                status TEXT NOT NULL,
+                printed REAL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, ip, port, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_token ON jobs (token, id)")
+        self.purge()
+
+    def add(self, ip, port, data, token=None, label=None):
+        """Record a job before it is sent; returns its id"""
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (ip, port, token, label, data, created, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ip, int(port), token, label, sqlite3.Binary(data), time.time(), PENDING))
+            return cursor.lastrowid
+
+    def ack(self, job_id):
+        """The printer took the job"""
+        with self.lock:
+            self.db.execute("UPDATE jobs SET status = ?, printed = ? WHERE id = ?", (PRINTED, time.time(), job_id))
+
+    def move(self, job_id, ip, port):
+        """Hand a job that has not printed to another printer"""
+        with self.lock:
+            self.db.execute("UPDATE jobs SET ip = ?, port = ? WHERE id = ?", (ip, int(port), job_id))
+
+    def status(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def pending(self, ip, port):
+        """[(id, data)] still to print on ip:port, oldest first; stale jobs are expired"""
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            expired = self.db.execute(
+                "UPDATE jobs SET status = ? WHERE status = ? AND ip = ? AND port = ? AND created < ?",
+                (EXPIRED, PENDING, ip, int(port), cutoff)).rowcount
+            rows = self.db.execute(
+                "SELECT id, data FROM jobs WHERE status = ? AND ip = ? AND port = ? ORDER BY id",
+                (PENDING, ip, int(port))).fetchall()
+        if expired:
+            logging.warning(f"Dropped {expired} print jobs for {ip}:{port} older than {self.max_age / 60:.0f} minutes")
+        return [(job_id, bytes(data)) for job_id, data in rows]
+
+    def has_pending(self, ip, port):
+        with self.lock:
+            row = self.db.execute("SELECT 1 FROM jobs WHERE status = ? AND ip = ? AND port = ? LIMIT 1",
+                                  (PENDING, ip, int(port))).fetchone()
+        return row is not None
+
+    def printers_with_pending(self):
+        """[(ip, port)] of printers that still owe jobs"""
+        with self.lock:
+            return self.db.execute("SELECT DISTINCT ip, port FROM jobs WHERE status = ?", (PENDING,)).fetchall()
+
+    def find_token(self, token, since=None):
+        """(ip, port, data) of the latest job for a token number, or None.
+        Token numbers restart every meal, so only jobs since since (epoch
+        seconds, default the start of today) are considered"""
+        if since is None:
+            since = datetime.combine(datetime.now().date(), datetime.min.time()).timestamp()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT ip, port, data FROM jobs WHERE token = ? AND created >= ? ORDER BY id DESC LIMIT 1",
+                (token, since)).fetchone()
+        return (row[0], row[1], bytes(row[2])) if row else None
+
+    def purge(self):
+        """Delete jobs older than keepDays"""
+        cutoff = time.time() - float(self.keep_days) * 86400
+        with self.lock:
+            self.db.execute("DELETE FROM jobs WHERE created < ?", (cutoff,))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def open_print_journal(app_settings):
+    """The journal in the user data directory, or None if disabled in settings"""
+    settings = get_print_journal_settings(app_settings)
+    if not settings['enabled']:
+        return None
+    try:
+        return PrintJournal(get_data_file(JOURNAL_FILE), settings['maxAgeMinutes'], settings['keepDays'])
+    except sqlite3.Error as e:
+        logging.error(f"Could not open the print journal; printing without it: {e}")
+        return None
@@ -0,0 +1,78 @@
+import logging
+import os
+from functools import lru_cache
+
+GS_V_0 = b'\x1D\x76\x30\x00'  # Print raster bit image, normal density
+
+
+def raster_image(width, height, rows):
+    """ESC/POS raster image (GS v 0) from 1-bit rows, MSB first, 1 = black.
+    Each row holds (width + 7) // 8 bytes"""
+    width_bytes = (width + 7) // 8
+    return (GS_V_0 + bytes((width_bytes & 0xFF, width_bytes >> 8, height & 0xFF, height >> 8))
+            + b''.join(rows))
+
+
+def convert_logo(path, max_width=384):
+    """A logo file as an ESC/POS raster image no wider than max_width dots, or b'' if it cannot be read"""
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QColor, QImage, QPainter, qGray
+
+    image = QImage(path)
+    if image.isNull():
+        logging.error(f"Could not read logo {path}")
+        return b''
+    if image.width() > max_width:
+        image = image.scaledToWidth(max_width, Qt.SmoothTransformation)
+
+    # Transparent areas print as paper
+    flat = QImage(image.size(), QImage.Format_RGB32)
+    flat.fill(QColor(Qt.white))
+    painter = QPainter(flat)
+    painter.drawImage(0, 0, image)
+    painter.end()
+
+    mono = flat.convertToFormat(QImage.Format_Mono, Qt.MonoOnly | Qt.ThresholdDither)
+    invert = qGray(mono.color(1)) >= 128  # Set bits must mean black
+    width, height = mono.width(), mono.height()
+    width_bytes = (width + 7) // 8
+    line_bytes = mono.bytesPerLine()
+    bits = mono.constBits()
+    bits.setsize(line_bytes * height)
+    data = bytes(bits)
+    rows = []
+    for y in range(height):
+        row = data[y * line_bytes:y * line_bytes + width_bytes]
+        if invert:
+            row = bytes(255 - byte for byte in row)
+        if width % 8:
+            # Padding bits past the right edge stay blank
+            row = row[:-1] + bytes((row[-1] & (0xFF << (8 - width % 8)) & 0xFF,))
+        rows.append(row)
+    return raster_image(width, height, rows)
+
+
+@lru_cache(maxsize=8)
+def _cached_logo(path, mtime, max_width):
+    return convert_logo(path, max_width)
+
+
+_missing_logos = set()  # Paths already reported missing, so each is logged once
+
+
+def get_logo(logo):
+    """Raster bytes for a PrinterConfig 'Logo' block ({'enable', 'path', 'width'}),
+    converted on first use and again only when the file changes"""
+    if not logo or not logo.get('enable', False) or not logo.get('path'):
+        return b''
+    path = logo['path']
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        if path not in _missing_logos:
+            _missing_logos.add(path)
+            logging.error(f"Logo {path} not found; printing slips without it")
+        return b''
+    _missing_logos.discard(path)
+    return _cached_logo(path, mtime, int(logo.get('width', 384)))
+
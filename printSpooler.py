@@ -0,0 +1,612 @@
+import logging
+import queue
+import socket
+import threading
+import time
+
+from metrics import metrics
+from printJournal import PENDING, PRINTED, open_print_journal
+
+# Defaults for the "PrintSpooler" block of appSettings.json
+DEFAULT_PRINT_SPOOLER = {
+    'connectTimeout': 2,
+    'sendTimeout': 5,
+    'idleSeconds': 60,  # Close the printer connection after this long without a job
+    'retrySeconds': 5,  # After a failed connect, jobs fail at once for this long
+    'maxQueue': 200,
+    'statusSeconds': 10,  # How often each printer is asked for its status (0 to disable)
+    'statusTimeout': 1,  # How long to wait for the status reply
+}
+
+# Defaults for the "PrinterGroups" block of appSettings.json. groups maps a
+# counter's printer ("ip" or "ip:port", as in DevicePrinterIP) to the other
+# printers its jobs may go to, in fallback order
+DEFAULT_PRINTER_GROUPS = {
+    'routing': 'shortestQueue',  # or 'inOrder': the first healthy printer in the group
+    'groups': {},
+}
+
+ROUTE_SHORTEST_QUEUE = 'shortestQueue'
+ROUTE_IN_ORDER = 'inOrder'
+
+# Printer status, as cached by each PrinterQueue
+UNKNOWN = 'unknown'
+ONLINE = 'online'
+PAPER_LOW = 'paperLow'
+PAPER_OUT = 'paperOut'
+OFFLINE = 'offline'
+STATUS_SEVERITY = {ONLINE: 0, UNKNOWN: 1, PAPER_LOW: 2, PAPER_OUT: 3, OFFLINE: 4}  # Worst last
+
+# DLE EOT real-time status requests: printer (1), offline cause (2), roll paper sensor (4).
+# The printer answers each with one byte straight away, even mid-job
+STATUS_QUERY = b'\x10\x04\x01\x10\x04\x02\x10\x04\x04'
+
+
+def get_print_spooler_settings(app_settings):
+    """Return the print spooler settings with defaults filled in"""
+    settings = dict(DEFAULT_PRINT_SPOOLER)
+    settings.update((app_settings or {}).get('PrintSpooler', {}) or {})
+    return settings
+
+
+def get_printer_groups_settings(app_settings):
+    """Return the printer group settings with defaults filled in"""
+    settings = dict(DEFAULT_PRINTER_GROUPS)
+    settings.update((app_settings or {}).get('PrinterGroups', {}) or {})
+    return settings
+
+
+def parse_printer_address(address, default_port=9100):
+    """(ip, port) from an "ip" or "ip:port" address"""
+    ip, _, port = str(address).strip().partition(':')
+    return ip, int(port) if port else default_port
+
+
+def parse_status(reply):
+    """Status from the three DLE EOT reply bytes, or None if they are not a status reply"""
+    if len(reply) != 3 or any(byte & 0x93 != 0x12 for byte in reply):
+        return None  # Every status byte has bits 1 and 4 set, 0 and 7 clear
+    printer, offline, paper = reply
+    if paper & 0x60 or offline & 0x20:
+        return PAPER_OUT
+    if printer & 0x08 or offline & 0x44:
+        # Offline, cover open or an error
+        return OFFLINE
+    if paper & 0x0C:
+        return PAPER_LOW
+    return ONLINE
+
+
+class PrinterQueue:
+    """Jobs for one printer, sent in order by one worker over a kept-alive connection.
+
+    A job is the whole slip already rendered to bytes, written with a
+    single sendall(). The connection is opened on the first job, reused
+    while jobs keep coming and closed after idleSeconds, since many
+    network printers only serve one client at a time. A connection the
+    printer has dropped is noticed before writing and reopened; a job whose
+    write fails is retried once on a fresh connection. While the printer
+    cannot be reached, jobs fail at once instead of each waiting out
+    connectTimeout.
+
+    With a PrintJournal every job is recorded before it is queued and
+    acknowledged once sent. Jobs the printer missed stay in the journal;
+    the worker keeps trying to reconnect every retrySeconds and then
+    replays them in order (the journal drops stale ones), ahead of
+    anything queued since.
+
+    Between jobs the worker asks the printer for its real-time status
+    (DLE EOT) every statusSeconds over the same connection and caches it
+    in self.status; on_status(ip, port, status) is called when it
+    changes. A printer that does not answer these queries is taken to be
+    online while it accepts connections. With a journal, slips are held
+    back while the printer reports paper out or offline (cover open,
+    error) and printed once it recovers.
+
+    A job submitted for a printer group carries the group's key. If this
+    printer cannot take it (unreachable, paper out, offline) the job is
+    handed to on_reroute(queue, job) instead, which moves it to another
+    printer of the group; only what was already sent is lost with a jam.
+    """
+
+    def __init__(self, ip, port, connect_timeout=2, send_timeout=5, idle_seconds=60, retry_seconds=5, max_queue=200,
+                 journal=None, status_seconds=10, status_timeout=1, on_status=None, on_reroute=None):
+        self.ip = ip
+        self.port = int(port)
+        self.key = f"{ip}:{self.port}"
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.idle_seconds = idle_seconds
+        self.retry_seconds = retry_seconds
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.sock = None
+        self.failed_at = None
+        self.last_used = 0
+        self.journal = journal
+        self.status_seconds = status_seconds
+        self.status_timeout = status_timeout
+        self.on_status = on_status
+        self.on_reroute = on_reroute
+        self.status = UNKNOWN
+        self.status_supported = True  # Until the printer ignores a query
+        self.next_poll = time.monotonic()
+        # Jobs from an earlier run may still be waiting for this printer
+        self.needs_replay = bool(journal) and journal.has_pending(self.ip, self.port)
+        self.thread = threading.Thread(target=self._run, name=f'print-{self.key}', daemon=True)
+        self.thread.start()
+
+    def submit(self, data, on_result=None, token=None, label=None, group=None):
+        """Queue data for the printer; returns False if the queue is full.
+        on_result(ok) is called from the worker once the job is done"""
+        job_id = self.journal.add(self.ip, self.port, data, token, label) if self.journal else None
+        try:
+            self.jobs.put_nowait((data, on_result, time.monotonic(), job_id, group, 0))
+        except queue.Full:
+            logging.error(f"Print queue for {self.key} is full; job rejected")
+            metrics.observe('print_rejected', 1, self.key)
+            if job_id is not None:
+                # Printed with the backlog once the queue drains
+                self.needs_replay = True
+            return False
+        metrics.set_gauge('print_queue_depth', self.jobs.qsize(), self.key)
+        return True
+
+    def enqueue(self, job):
+        """Take over a job (already journaled) from another printer of its group"""
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            return False
+        metrics.set_gauge('print_queue_depth', self.jobs.qsize(), self.key)
+        return True
+
+    def usable(self):
+        """Whether a job sent now would print, judged from cached state (no network I/O)"""
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.retry_seconds:
+            return False
+        # Without status polling nothing else would notice the printer come back
+        return self.status not in (PAPER_OUT, OFFLINE) or not self.status_seconds
+
+    def _wait_seconds(self):
+        """How long the worker may block for the next job"""
+        now = time.monotonic()
+        waits = [self.idle_seconds]
+        if self.sock is not None:
+            waits.append(self.last_used + self.idle_seconds - now)
+        if self.needs_replay:
+            waits.append(self.retry_seconds)
+        if self.status_seconds:
+            waits.append(self.next_poll - now)
+        return max(0.01, min(waits))
+
+    def _run(self):
+        while True:
+            try:
+                job = self.jobs.get(timeout=self._wait_seconds())
+            except queue.Empty:
+                job = False
+            if job is None:
+                break
+            if self.status_seconds and time.monotonic() >= self.next_poll:
+                self._poll_status()
+            if self.needs_replay:
+                self._replay()
+            if job:
+                self._handle(job)
+            if self.sock is not None and time.monotonic() - self.last_used >= self.idle_seconds:
+                self._close()
+        self._close()
+
+    def _handle(self, job):
+        data, on_result, enqueued_at, job_id, group, hops = job
+        journaled = self.journal.status(job_id) if job_id is not None else None
+        if journaled is not None and journaled != PENDING:
+            # Already sent (or expired) by the replay
+            ok = journaled == PRINTED
+        else:
+            # A journaled slip sent while the printer is holding would be lost
+            ok = not (journaled is not None and self._holding()) and self._print(data)
+            if ok:
+                if job_id is not None:
+                    self.journal.ack(job_id)
+            elif group is not None and self.on_reroute \
+                    and self.on_reroute(self, (data, on_result, enqueued_at, job_id, group, hops + 1)):
+                # Another printer of the group has it now
+                return
+            elif job_id is not None:
+                # Kept in the journal until the printer can print again
+                self.needs_replay = True
+        finished = time.monotonic()
+        metrics.set_gauge('print_queue_depth', self.jobs.qsize(), self.key)
+        metrics.observe('print_latency_seconds', finished - enqueued_at, self.key)
+        if on_result:
+            try:
+                on_result(ok)
+            except Exception as e:
+                logging.error(f"Print result callback failed for {self.key}: {e}")
+
+    def _print(self, data):
+        if self.sock is None and self.failed_at is not None \
+                and time.monotonic() - self.failed_at < self.retry_seconds:
+            return False
+        for attempt in range(2):
+            try:
+                if self.sock is None or not self._is_alive():
+                    self._connect()
+            except OSError as e:
+                logging.error(f"Cannot connect to printer {self.key}: {e}")
+                self.failed_at = time.monotonic()
+                self._set_status(OFFLINE)
+                return False
+            try:
+                started = time.monotonic()
+                self.sock.sendall(data)
+                self.last_used = time.monotonic()
+                metrics.observe('print_send_seconds', self.last_used - started, self.key)
+                self.failed_at = None
+                if self.status in (UNKNOWN, OFFLINE):
+                    self._set_status(ONLINE)
+                return True
+            except OSError as e:
+                self._close()
+                if attempt:
+                    logging.error(f"Printing on {self.key} failed: {e}")
+                    return False
+                logging.warning(f"Printer connection {self.key} lost ({e}); reconnecting")
+        return False
+
+    def _holding(self):
+        # Reachable, but out of paper, cover open or in error: a slip sent now would be lost
+        return self.status in (PAPER_OUT, OFFLINE) and self.failed_at is None
+
+    def _replay(self):
+        """Send the journal's backlog for this printer, oldest first"""
+        if self._holding():
+            return
+        replayed = 0
+        for job_id, data in self.journal.pending(self.ip, self.port):
+            if not self._print(data):
+                break
+            self.journal.ack(job_id)
+            replayed += 1
+        else:
+            self.needs_replay = False
+        if replayed:
+            logging.info(f"Printed {replayed} journaled jobs on {self.key}")
+            metrics.observe('print_replayed', replayed, self.key)
+
+    def _poll_status(self):
+        self.next_poll = time.monotonic() + self.status_seconds
+        try:
+            if self.sock is None or not self._is_alive():
+                self._connect()
+            if not self.status_supported:
+                status = ONLINE  # Reachable is all we can tell
+            else:
+                self.sock.sendall(STATUS_QUERY)
+                status = parse_status(self._read_reply(3))
+                if status is None:
+                    logging.info(f"Printer {self.key} does not report its status; checking the connection only")
+                    self.status_supported = False
+                    status = ONLINE
+        except OSError as e:
+            self._close()
+            if self.status != OFFLINE:
+                logging.warning(f"Printer {self.key} is not reachable: {e}")
+            self.failed_at = time.monotonic()
+            status = OFFLINE
+        else:
+            self.failed_at = None
+        self._set_status(status)
+
+    def _read_reply(self, size):
+        reply = b''
+        self.sock.settimeout(self.status_timeout)
+        try:
+            while len(reply) < size:
+                data = self.sock.recv(size - len(reply))
+                if not data:
+                    raise ConnectionError("printer closed the connection")
+                reply += data
+        except socket.timeout:
+            pass
+        finally:
+            self.sock.settimeout(self.send_timeout)
+        return reply
+
+    def _set_status(self, status):
+        if status == self.status:
+            return
+        previous, self.status = self.status, status
+        metrics.set_gauge('printer_status', status, self.key)
+        logging.info(f"Printer {self.key}: {previous} -> {status}")
+        if self.on_status:
+            try:
+                self.on_status(self.ip, self.port, status)
+            except Exception as e:
+                logging.error(f"Printer status callback failed for {self.key}: {e}")
+
+    def _connect(self):
+        self._close()
+        started = time.monotonic()
+        sock = socket.create_connection((self.ip, self.port), timeout=self.connect_timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.send_timeout)
+        self.sock = sock
+        metrics.observe('print_connect_seconds', time.monotonic() - started, self.key)
+
+    def _is_alive(self):
+        # Printers rarely talk back, so a readable socket is either status
+        # bytes (discarded) or the printer having closed the connection
+        try:
+            self.sock.setblocking(False)
+            try:
+                while True:
+                    data = self.sock.recv(4096)
+                    if not data:
+                        return False
+            except BlockingIOError:
+                return True
+            finally:
+                self.sock.settimeout(self.send_timeout)
+        except OSError:
+            return False
+
+    def _close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def stop(self, timeout=5):
+        """Let queued jobs finish for up to timeout seconds, then close"""
+        try:
+            self.jobs.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+
+
+class PrintSpooler:
+    """One PrinterQueue per printer address, created on first use"""
+
+    def __init__(self, app_settings=None, journal=None):
+        self.settings = get_print_spooler_settings(app_settings)
+        self.journal = journal
+        self.lock = threading.Lock()
+        self.printers = {}
+        self.status_listeners = []
+        self.closed = False
+        groups = get_printer_groups_settings(app_settings)
+        self.routing = groups['routing']
+        self.groups = {}  # (ip, port) of a counter's printer -> its group's members, in fallback order
+        for primary, others in (groups['groups'] or {}).items():
+            members = [parse_printer_address(address) for address in [primary] + list(others)]
+            self.groups[members[0]] = list(dict.fromkeys(members))
+
+    def queue_for(self, ip, port):
+        key = (ip, int(port))
+        with self.lock:
+            printer = self.printers.get(key)
+            if printer is None:
+                printer = PrinterQueue(
+                    ip, port,
+                    connect_timeout=self.settings['connectTimeout'],
+                    send_timeout=self.settings['sendTimeout'],
+                    idle_seconds=self.settings['idleSeconds'],
+                    retry_seconds=self.settings['retrySeconds'],
+                    max_queue=int(self.settings['maxQueue']),
+                    journal=self.journal,
+                    status_seconds=float(self.settings['statusSeconds']),
+                    status_timeout=float(self.settings['statusTimeout']),
+                    on_status=self._status_changed,
+                    on_reroute=self._reroute,
+                )
+                self.printers[key] = printer
+            return printer
+
+    def submit(self, ip, port, data, on_result=None, token=None, label=None):
+        """Queue a rendered job for the printer at ip:port, or for the best
+        printer of its group; returns at once"""
+        key = (ip, int(port))
+        if key not in self.groups:
+            return self.queue_for(ip, port).submit(data, on_result, token, label)
+        printer, reason = self._route(key)
+        if printer is None:
+            # Nothing in the group can print: the journal keeps it for ip:port
+            printer, reason = self.queue_for(ip, port), "no printer in the group is ready"
+        self._record(key, printer, reason, token)
+        return printer.submit(data, on_result, token, label, key)
+
+    def _route(self, key, exclude=None):
+        """(queue, reason) for the group member that should take the next job, or (None, None)"""
+        members = [self.queue_for(ip, port) for ip, port in self.groups[key]]
+        ready = [printer for printer in members if printer is not exclude and printer.usable()]
+        if not ready:
+            return None, None
+        if self.routing == ROUTE_IN_ORDER or len(ready) == 1:
+            printer = ready[0]
+            if printer is members[0]:
+                return printer, "first choice"
+            return printer, f"fallback, {members[0].key} is {members[0].status}"
+        # min() keeps the first of equal queues, so ties follow the fallback order
+        printer = min(ready, key=lambda printer: printer.jobs.qsize())
+        return printer, f"shortest queue ({printer.jobs.qsize()} waiting)"
+
+    def _record(self, key, printer, reason, token):
+        metrics.observe('print_routed', 1, f"{key[0]}:{key[1]}->{printer.key}")
+        job = f"Token {token}" if token is not None else "Print job"
+        logging.info(f"{job} for {key[0]}:{key[1]} sent to {printer.key}: {reason}")
+
+    def _reroute(self, failed, job):
+        """Move a job failed could not print to another ready printer of its
+        group (called from failed's worker); False if there is none"""
+        data, on_result, enqueued_at, job_id, group, hops = job
+        if self.closed or group not in self.groups or hops >= len(self.groups[group]):
+            return False
+        printer, reason = self._route(group, exclude=failed)
+        if printer is None:
+            return False
+        # The journal follows the job first, so the new printer never sees it pending elsewhere
+        if job_id is not None and self.journal:
+            self.journal.move(job_id, printer.ip, printer.port)
+        if not printer.enqueue(job):
+            if job_id is not None and self.journal:
+                self.journal.move(job_id, failed.ip, failed.port)
+            return False
+        metrics.observe('print_rerouted', 1, f"{failed.key}->{printer.key}")
+        logging.warning(f"Printer {failed.key} is {failed.status}; job moved to {printer.key} ({reason})")
+        return True
+
+    def available(self, ip, port):
+        """Whether the printer at ip:port, or another of its group, reports it can print (no network I/O)"""
+        key = (ip, int(port))
+        for member in self.groups.get(key, [key]):
+            printer = self.printers.get(member)
+            if printer and printer.status in (ONLINE, PAPER_LOW):
+                return True
+        return False
+
+    def watch(self, ip, port):
+        """Start monitoring a printer's status, and its group's, before it has any jobs"""
+        for member_ip, member_port in self.groups.get((ip, int(port)), [(ip, port)]):
+            self.queue_for(member_ip, member_port)
+
+    def status(self, ip, port):
+        """Cached status of the printer at ip:port (no network I/O)"""
+        printer = self.printers.get((ip, int(port)))
+        return printer.status if printer else UNKNOWN
+
+    def add_status_listener(self, listener):
+        """listener(ip, port, status) is called from printer workers on every change"""
+        self.status_listeners.append(listener)
+
+    def remove_status_listener(self, listener):
+        if listener in self.status_listeners:
+            self.status_listeners.remove(listener)
+
+    def _status_changed(self, ip, port, status):
+        for listener in list(self.status_listeners):
+            listener(ip, port, status)
+
+    def resume(self):
+        """Start the queues of printers the journal still owes jobs, e.g. after a restart"""
+        if self.journal:
+            for ip, port in self.journal.printers_with_pending():
+                self.queue_for(ip, port)
+
+    def reprint(self, token, on_result=None, since=None):
+        """Print the latest slip with this token number issued since since
+        (epoch seconds, default today) again; returns False if there is no such slip"""
+        if not self.journal:
+            return False
+        job = self.journal.find_token(token, since)
+        if job is None:
+            return False
+        ip, port, data = job
+        return self.submit(ip, port, data, on_result, token, 'reprint')
+
+    def shutdown(self, timeout=5):
+        self.closed = True
+        with self.lock:
+            printers = list(self.printers.values())
+            self.printers = {}
+        deadline = time.monotonic() + timeout
+        for printer in printers:
+            printer.stop(max(0, deadline - time.monotonic()))
+
+
+_print_spooler = None
+_print_spooler_lock = threading.Lock()
+
+
+def get_print_spooler():
+    """Process-wide print spooler, configured from appSettings.json on first use"""
+    global _print_spooler
+    with _print_spooler_lock:
+        if _print_spooler is None:
+            from settingsService import settings_service
+            app_settings = settings_service.get_or_default()
+            _print_spooler = PrintSpooler(app_settings, open_print_journal(app_settings))
+            _print_spooler.resume()
+        return _print_spooler
+
+
+def shutdown_print_spooler(timeout=5):
+    """Flush and close the process-wide spooler, if it was started"""
+    global _print_spooler
+    with _print_spooler_lock:
+        spooler, _print_spooler = _print_spooler, None
+    if spooler:
+        spooler.shutdown(timeout)
+
+
+if __name__ == "__main__":
+    import os
+    import re
+    import shutil
+    import tempfile
+
+    from mockPrinter import MockPrinter
+    from print import render_slip
+    from printJournal import PrintJournal
+
+    header = {'enable': True, 'text': "EzeeCanteen"}
+    footer = {'enable': True, 'text': "Thank you!"}
+    slips = [render_slip(token, header, "LUNCH", "EMP001", "John Doe", "2025-01-15 12:30:00", "ENJOY!!", footer)
+             for token in range(1, 501)]
+    total = sum(len(slip) for slip in slips)
+
+    # Benchmark: the old path (probe socket, then a new connection with one
+    # send() per command and line) against the spooler, with the slip split
+    # the way the old code sent it
+    def old_print(port, slip):
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        probe.settimeout(0.5)
+        probe.connect_ex(('127.0.0.1', port))
+        probe.close()
+        printer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        printer.connect(('127.0.0.1', port))
+        for part in parts[slip]:
+            printer.send(part)
+        printer.close()
+
+    parts = {slip: re.findall(rb'[\x1b\x1d][^\x1b\x1d\n]*|[^\x1b\x1d\n]*\n', slip) for slip in slips}
+    assert all(b''.join(parts[slip]) == slip for slip in slips)
+    sink = MockPrinter()
+    started = time.perf_counter()
+    for slip in slips:
+        old_print(sink.port, slip)
+    assert sink.wait_for(total)
+    old_rate = len(slips) / (time.perf_counter() - started) * 60
+
+    sink.received.clear()
+    spooler = PrintSpooler({'PrintSpooler': {'maxQueue': len(slips), 'statusSeconds': 0}})
+    started = time.perf_counter()
+    for slip in slips:
+        spooler.submit('127.0.0.1', sink.port, slip)
+    assert sink.wait_for(total)
+    spooler_rate = len(slips) / (time.perf_counter() - started) * 60
+    spooler.shutdown()
+
+    directory = tempfile.mkdtemp()
+    try:
+        journal = PrintJournal(os.path.join(directory, 'journal.sqlite3'))
+        sink.received.clear()
+        spooler = PrintSpooler({'PrintSpooler': {'maxQueue': len(slips), 'statusSeconds': 0}}, journal)
+        started = time.perf_counter()
+        for token, slip in enumerate(slips, 1):
+            spooler.submit('127.0.0.1', sink.port, slip, None, token)
+        assert sink.wait_for(total)
+        journal_rate = len(slips) / (time.perf_counter() - started) * 60
+        spooler.shutdown()
+        journal.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    sink.close()
+    print(f"connection per token: {old_rate:,.0f} tokens/min, spooler: {spooler_rate:,.0f} tokens/min, "
+          f"spooler with journal: {journal_rate:,.0f} tokens/min "
+          f"(local sink, {len(slips)} tokens of {total // len(slips)} bytes)")
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+# Default worker count, queue bound and timeout (seconds) for each stage.
+# Printing has one worker so tokens come out in the order they were issued.
+DEFAULT_STAGES = {
+    'persist': {'workers': 2, 'maxQueue': 500, 'timeout': 10},
+    'print': {'workers': 1, 'maxQueue': 200, 'timeout': 10},
+    'device': {'workers': 2, 'maxQueue': 200, 'timeout': 10},
+}
+
+
+def get_pipeline_settings(app_settings):
+    """Return the per-stage pipeline settings with defaults filled in"""
+    configured = (app_settings or {}).get('PunchPipeline', {}) or {}
+    settings = {}
+    for name, defaults in DEFAULT_STAGES.items():
+        stage = dict(defaults)
+        stage.update(configured.get(name, {}) or {})
+        settings[name] = stage
+    return settings
+
+
+class PipelineStage:
+    """One step of punch processing with its own workers, bounded queue and timeout.
+
+    Jobs beyond maxQueue are rejected (and counted) rather than queued
+    without limit. Python threads cannot be interrupted, so the timeout is
+    handed to the job for its own I/O (DB connect, socket, HTTP) and any
+    job that still runs past it is logged.
+    """
+
+    def __init__(self, name, workers=1, maxQueue=100, timeout=10):
+        self.name = name
+        self.max_queue = maxQueue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'pipeline-{name}')
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.rejected = 0
+
+    def submit(self, handler, *args):
+        """Queue handler(*args); returns False if the stage is full"""
+        with self.lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                metrics.set_gauge('pipeline_rejected', self.rejected, self.name)
+                logging.error(f"{self.name} stage is full ({self.pending} pending); job rejected")
+                return False
+            self.pending += 1
+            metrics.set_gauge('pipeline_depth', self.pending, self.name)
+        self.executor.submit(self._run, handler, args, time.monotonic())
+        return True
+
+    def _run(self, handler, args, enqueued_at):
+        started = time.monotonic()
+        try:
+            handler(*args)
+        except Exception as e:
+            logging.error(f"{self.name} stage job failed: {e}")
+        finally:
+            finished = time.monotonic()
+            with self.lock:
+                self.pending -= 1
+                metrics.set_gauge('pipeline_depth', self.pending, self.name)
+            metrics.observe('pipeline_wait_seconds', started - enqueued_at, self.name)
+            metrics.observe('pipeline_run_seconds', finished - started, self.name)
+            metrics.observe('pipeline_latency_seconds', finished - enqueued_at, self.name)
+            if finished - started > self.timeout:
+                logging.warning(f"{self.name} stage job ran {finished - started:.1f}s "
+                                f"(timeout {self.timeout}s)")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PunchPipeline:
+    """Independent stages for the slow parts of handling a punch.
+
+    The GUI thread assigns the token and hands the rest off: persist (MySQL
+    insert), print (token slip) and device (user begin-time update) each run
+    on their own pool, so a slow database never holds up printing and
+    neither blocks the display. Rendering stays on the GUI thread; the
+    display records its latency under the 'render' label.
+    """
+
+    def __init__(self, app_settings=None):
+        self.settings = get_pipeline_settings(app_settings)
+        self.stages = {name: PipelineStage(name, **config) for name, config in self.settings.items()}
+
+    def submit(self, stage, handler, *args):
+        return self.stages[stage].submit(handler, *args)
+
+    def timeout(self, stage):
+        return self.stages[stage].timeout
+
+    def pending(self):
+        return sum(stage.pending for stage in self.stages.values())
+
+    def shutdown(self, timeout=5):
+        """Give queued jobs up to timeout seconds to finish, then abandon the rest"""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if self.pending():
+            logging.warning(f"Punch pipeline shut down with {self.pending()} jobs unfinished")
+        for stage in self.stages.values():
+            stage.shutdown()
+
+    def log_latency(self):
+        for name in list(self.stages) + ['render']:
+            summary = metrics.summary('pipeline_latency_seconds', name)
+            if summary:
+                logging.info(f"pipeline {name}: n={summary['count']} p50={summary['p50'] * 1000:.0f}ms "
+                             f"p95={summary['p95'] * 1000:.0f}ms max={summary['max'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    # A database that takes 2 s per insert must not delay printing
+    pipeline = PunchPipeline({'PunchPipeline': {'persist': {'workers': 1}}})
+    printed = []
+    start = time.monotonic()
+    for token in range(1, 6):
+        pipeline.submit('persist', time.sleep, 2)
+        pipeline.submit('print', lambda token=token: printed.append((token, time.monotonic() - start)))
+    time.sleep(0.2)
+    print("printed:", [(token, f"{at * 1000:.1f}ms") for token, at in printed])
+    assert len(printed) == 5 and printed[-1][1] < 0.2, "printing waited for the database"
+    pipeline.shutdown(timeout=0)
+    pipeline.log_latency()
@@ -14,7 +14,7 @@ from reportGen import generate_monthly_report, generate_daily_report, generate_l
 # Import email functions
 from AddMail import send_daily_report_email, send_monthly_report_email
 # Import license manager
-from licenseManager import LicenseManager
+from licenseContext import get_license_key
 import asyncio
 
 
@@ -75,23 +75,7 @@ class WorkerThread(QThread):
 
     def get_license_key(self):
         try:
-            from licenseManager import LicenseManager
-            import asyncio
-
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_manager = LicenseManager()
-                    license_data = loop.run_until_complete(license_manager.get_license_db())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            # Get license data and extract the key
-            license_data = get_license_data()
-            if license_data and 'LicenseKey' in license_data:
-                return license_data['LicenseKey']
+            return get_license_key() or None
         except Exception as e:
             print(f"Error getting license key: {str(e)}")
         return None
@@ -14,6 +14,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import datetime
 from datetime import timedelta
 from AddMail import send_daily_report_email
+from settingsService import settings_service
 import threading
 import time
 import logging
@@ -739,12 +740,11 @@ class EzeeCanteenWindow(QMainWindow):
             # Load from file if it exists
             if os.path.exists(file_path):
                 try:
-                    with open(file_path, 'r') as file:
-                        file_settings = json.load(file)
+                    file_settings = settings_service.edit()
                         
-                        # Update settings with values from file
-                        if 'ServerSetting' in file_settings:
-                            settings['ServerSetting'] = file_settings['ServerSetting']
+                    # Update settings with values from file
+                    if 'ServerSetting' in file_settings:
+                        settings['ServerSetting'] = file_settings['ServerSetting']
                 except Exception as e:
                     print(f"Error loading settings from {file_path}: {e}")
             
@@ -782,8 +782,7 @@ class EzeeCanteenWindow(QMainWindow):
             # Load existing settings if file exists
             if os.path.exists(file_path):
                 try:
-                    with open(file_path, 'r') as file:
-                        app_settings = json.load(file)
+                    app_settings = settings_service.edit()
                 except Exception as e:
                     print(f"Error loading settings: {e}")
             
@@ -796,8 +795,7 @@ class EzeeCanteenWindow(QMainWindow):
             app_settings['ServerSetting'] = server_settings
             
             # Save updated settings
-            with open(file_path, 'w') as file:
-                json.dump(app_settings, file, indent=4)
+            settings_service.save(app_settings)
             
             print("Server settings saved successfully!")
         except Exception as e:
@@ -1715,8 +1713,7 @@ class EzeeCanteenWindow(QMainWindow):
             from CustomLiveDisplay import custom_main
 
             if os.path.exists('appSettings.json'):
-                with open('appSettings.json', 'r') as f:
-                    self.initial_settings = json.load(f)
+                self.initial_settings = settings_service.get()
             canteenMenu = self.initial_settings.get('CanteenMenu')
             mode = canteenMenu.get('currentMode')
 
@@ -2175,18 +2172,17 @@ class EzeeCanteenWindow(QMainWindow):
         # Load from file if it exists
         if os.path.exists(file_path):
             try:
-                with open(file_path, 'r') as file:
-                    file_settings = json.load(file)
+                file_settings = settings_service.edit()
                     
-                    # Update settings with values from file
-                    if 'ServerSetting' in file_settings:
-                        settings['ServerSetting'] = file_settings['ServerSetting']
+                # Update settings with values from file
+                if 'ServerSetting' in file_settings:
+                    settings['ServerSetting'] = file_settings['ServerSetting']
                     
-                    if 'printers' in file_settings:
-                        settings['printers'] = file_settings['printers']
+                if 'printers' in file_settings:
+                    settings['printers'] = file_settings['printers']
                     
-                    if 'devices' in file_settings:
-                        settings['devices'] = file_settings['devices']
+                if 'devices' in file_settings:
+                    settings['devices'] = file_settings['devices']
                         
                 print(f"Settings loaded from {file_path}")
             except Exception as e:
@@ -2232,8 +2228,7 @@ class EzeeCanteenWindow(QMainWindow):
         # Load existing settings if file exists
         if os.path.exists(file_path):
             try:
-                with open(file_path, 'r') as file:
-                    existing_settings = json.load(file)
+                existing_settings = settings_service.edit()
             except Exception as e:
                 print(f"Error reading existing settings: {e}")
         
@@ -2249,8 +2244,7 @@ class EzeeCanteenWindow(QMainWindow):
         
         # Save updated settings back to file
         try:
-            with open(file_path, 'w') as file:
-                json.dump(existing_settings, file, indent=4)
+            settings_service.save(existing_settings)
             print(f"Settings saved to {file_path}")
         except Exception as e:
             print(f"Error saving settings to {file_path}: {e}")
@@ -2564,8 +2558,7 @@ class EzeeCanteenWindow(QMainWindow):
                 print("appSettings.json not found, skipping email check")
                 return
             
-            with open('appSettings.json', 'r') as file:
-                settings = json.load(file)
+            settings = settings_service.get()
             
             mail_settings = settings.get('MailSettings', {})
             
@@ -2634,13 +2627,14 @@ class EzeeCanteenWindow(QMainWindow):
             result = send_daily_report_email(yesterday)
             
             if result:
-                # Email sent successfully, update the lastEmailSent field
+                # Email sent successfully, update the lastEmailSent field on a fresh
+                # copy so edits made while the report was being sent are kept
+                settings = settings_service.edit()
+                mail_settings = settings.setdefault('MailSettings', {})
                 mail_settings['lastEmailSent'] = current_time.strftime('%Y-%m-%d %H:%M:%S')
-                settings['MailSettings'] = mail_settings
                 
                 # Save the updated settings back to the file
-                with open('appSettings.json', 'w') as file:
-                    json.dump(settings, file, indent=4)
+                settings_service.save(settings)
                 
                 print(f"✅ Auto email sent successfully with yesterday's report ({yesterday})")
                 print(f"✅ Updated lastEmailSent to {mail_settings['lastEmailSent']}")
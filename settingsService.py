@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import threading
+
+SETTINGS_FILE = 'appSettings.json'
+
+
+class FrozenDict(dict):
+    """Read-only dict used for settings snapshots.
+
+    Still a dict, so .get() chains, isinstance checks and json.dumps keep
+    working, but any attempt to change it raises TypeError. Use
+    SettingsService.edit() to get a mutable copy for writing.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("settings snapshots are read-only; use settings_service.edit()")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(value):
+    """Parsed JSON as nested FrozenDicts and tuples"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Mutable copy of a snapshot (plain dicts and lists)"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+class SettingsService:
+    """Process-wide cache of appSettings.json.
+
+    The file is parsed once and handed out as an immutable snapshot; a
+    snapshot never changes under its reader. get() re-parses only when the
+    file's modification time or size changes (a single os.stat), and
+    watch() lets a QFileSystemWatcher invalidate the cache as soon as
+    another process edits the file. If a reload fails (e.g. the file is
+    being hand-edited) the last good snapshot is kept. save() writes to a
+    temporary file and renames it over the original, so no reader ever
+    sees a half-written file.
+    """
+
+    def __init__(self, path=SETTINGS_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.snapshot = None
+        self.signature = None  # (mtime_ns, size) of the parsed file
+        self.listeners = []
+        self.watcher = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def get(self):
+        """Current settings snapshot; raises the open/parse error if the file was never readable"""
+        signature = self._stat()
+        if self.snapshot is not None and signature == self.signature:
+            return self.snapshot
+        return self.reload(signature)
+
+    def reload(self, signature=None):
+        with self.lock:
+            signature = signature or self._stat()
+            if self.snapshot is not None and signature == self.signature:
+                return self.snapshot
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    snapshot = freeze(json.load(f))
+            except Exception as e:
+                if self.snapshot is None:
+                    raise
+                logging.error(f"Could not reload {self.path}, keeping previous settings: {e}")
+                self.signature = signature  # Don't retry until the file changes again
+                return self.snapshot
+            changed = self.snapshot is not None
+            self.snapshot = snapshot
+            self.signature = signature
+        if changed:
+            logging.info(f"Reloaded {self.path}")
+            self._notify(snapshot)
+        return snapshot
+
+    def get_or_default(self, default=None):
+        """Snapshot, or default (an empty snapshot) if the file is missing or invalid"""
+        try:
+            return self.get()
+        except Exception as e:
+            logging.error(f"Could not read {self.path}: {e}")
+            return freeze(default or {})
+
+    def exists(self):
+        return self.snapshot is not None or os.path.exists(self.path)
+
+    def invalidate(self):
+        """Force the next get() to re-read the file"""
+        self.signature = None
+
+    def edit(self):
+        """Mutable copy of the current settings, to change and pass to save()"""
+        try:
+            return thaw(self.get())
+        except FileNotFoundError:
+            return {}
+
+    def save(self, settings, indent=4):
+        """Atomically replace the settings file and refresh the snapshot"""
+        with self.lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(thaw(settings), f, indent=indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self.invalidate()
+        return self.get()
+
+    def add_listener(self, callback):
+        """callback(snapshot) is called whenever changed settings are loaded"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _notify(self, snapshot):
+        for callback in list(self.listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logging.error(f"Settings listener failed: {e}")
+
+    def watch(self, parent=None):
+        """Reload on file change notifications (needs a running Qt event loop)"""
+        if self.watcher is not None:
+            return self.watcher
+        from PyQt5.QtCore import QFileSystemWatcher
+
+        self.watcher = QFileSystemWatcher(parent)
+        # Watch the directory too: an atomic rename replaces the file, which
+        # drops the file watch on most platforms
+        directory = os.path.dirname(os.path.abspath(self.path))
+        self.watcher.addPaths([os.path.abspath(self.path), directory])
+        self.watcher.fileChanged.connect(self._on_file_changed)
+        self.watcher.directoryChanged.connect(self._on_file_changed)
+        return self.watcher
+
+    def _on_file_changed(self, path):
+        file_path = os.path.abspath(self.path)
+        if os.path.exists(file_path) and file_path not in self.watcher.files():
+            self.watcher.addPath(file_path)
+        try:
+            self.get()
+        except Exception as e:
+            logging.error(f"Could not reload {self.path}: {e}")
+
+
+settings_service = SettingsService()
+
+
+def get_app_settings():
+    """Shortcut for settings_service.get_or_default()"""
+    return settings_service.get_or_default()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.mkdtemp(), SETTINGS_FILE)
+    service = SettingsService(path)
+    service.save({'CanteenMenu': {'DisablePunch': True}})
+    count = 100000
+    started = time.perf_counter()
+    for _ in range(count):
+        service.get()['CanteenMenu'].get('DisablePunch')
+    cached = (time.perf_counter() - started) / count
+    started = time.perf_counter()
+    for _ in range(count // 10):
+        with open(path, 'r') as f:
+            json.load(f)['CanteenMenu'].get('DisablePunch')
+    parsed = (time.perf_counter() - started) / (count // 10)
+    print(f"cached get: {cached * 1e6:.1f}us, open+parse: {parsed * 1e6:.1f}us")
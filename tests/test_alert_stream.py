@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+
+from alertStream import AlertEventAssembler, AlertStreamListener
+from mockIsapiServer import MockAlertStreamServer
+
+PICTURE = b"\xff\xd8fake-jpeg\xff\xd9"
+
+
+def json_part(serial_no, pictures_number):
+    alert = {
+        "eventType": "AccessControllerEvent",
+        "dateTime": "2025-01-31T12:00:00+05:30",
+        "AccessControllerEvent": {"majorEventType": 5, "subEventType": 75, "employeeNoString": "1001",
+                                  "serialNo": serial_no, "picturesNumber": pictures_number},
+    }
+    return {'content-type': 'application/json'}, json.dumps(alert).encode()
+
+
+class AlertEventAssemblerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.assembler = AlertEventAssembler(self.events.append, "test", picture_wait=0.05)
+
+    def test_picture_is_attached_to_the_event_before_it(self):
+        self.assembler.add_part(*json_part(1, 1))
+        self.assertEqual(self.events, [])
+        self.assembler.add_part({'content-type': 'image/jpeg'}, PICTURE)
+        self.assertEqual(self.events[0]['pictureData'], PICTURE)
+        self.assertIsNone(self.assembler.time_left())
+
+    def test_held_event_is_delivered_after_its_deadline(self):
+        self.assembler.add_part(*json_part(1, 1))
+        self.assembler.expire()
+        self.assertEqual(self.events, [], "delivered before the deadline")
+        time.sleep(self.assembler.time_left())
+        self.assembler.expire()
+        self.assertEqual(len(self.events), 1)
+        self.assertNotIn('pictureData', self.events[0])
+
+    def test_next_event_flushes_the_held_one(self):
+        self.assembler.add_part(*json_part(1, 1))
+        self.assembler.add_part(*json_part(2, 0))
+        self.assertEqual([event['serialNo'] for event in self.events], [1, 2])
+
+
+class AlertStreamListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockAlertStreamServer(heartbeat_interval=2).start()
+        self.events = []
+        self.running = True
+
+    def tearDown(self):
+        self.running = False
+        self.server.stop()
+
+    def listener(self, password="admin"):
+        return AlertStreamListener(self.server.host, self.server.port, "admin", password, read_timeout=10)
+
+    def wait_for(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(self.events) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return len(self.events) >= count
+
+    def push_events(self):
+        while self.server.client_count() == 0:
+            time.sleep(0.01)
+        self.server.push_event(1001, "With picture", picture=PICTURE)
+        # Announces a picture that never follows: delivered at the deadline,
+        # not held until the next heartbeat
+        started = time.monotonic()
+        self.server.push_event(1002, "Late picture", pictures_number=1)
+        self.assertTrue(self.wait_for(2, timeout=3))
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(self.events[0]['pictureData'], PICTURE)
+        self.assertNotIn('pictureData', self.events[1])
+
+    def test_listen_authenticates_and_delivers(self):
+        listener = self.listener()
+        thread = threading.Thread(target=listener.listen, args=(self.events.append, lambda: self.running), daemon=True)
+        thread.start()
+        self.push_events()
+        self.assertGreaterEqual(self.server.stats['challenges'], 1)
+        listener.close()
+        thread.join(5)
+
+    def test_listen_async_authenticates_and_delivers(self):
+        listener = self.listener()
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_until_complete,
+                                  args=(listener.listen_async(self.events.append, lambda: self.running),), daemon=True)
+        thread.start()
+        self.push_events()
+        self.assertGreaterEqual(self.server.stats['challenges'], 1)
+        loop.call_soon_threadsafe(listener.close)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        loop.close()
+
+    def test_wrong_password_is_refused(self):
+        self.assertEqual(self.listener(password="wrong").listen(self.events.append), 0)
+        self.assertEqual(self.server.client_count(), 0)
+        delivered = asyncio.run(self.listener(password="wrong").listen_async(self.events.append))
+        self.assertEqual(delivered, 0)
+        self.assertEqual(self.events, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from dedupIndex import EventDedupIndex
+
+START = datetime(2025, 1, 31, 12, 0, 0)
+
+
+class EventDedupIndexTest(unittest.TestCase):
+
+    def test_size_stays_bounded_and_recent_events_are_kept(self):
+        index = EventDedupIndex(max_entries=500, max_age=timedelta(minutes=30))
+        for i in range(20000):
+            self.assertTrue(index.add(f"emp{i}", START + timedelta(seconds=i)))
+            self.assertLessEqual(len(index), 500)
+        # No recent event was evicted: each is still recognised as a duplicate
+        for i in range(20000 - 500, 20000):
+            self.assertFalse(index.add(f"emp{i}", START + timedelta(seconds=i)), f"emp{i} evicted")
+
+    def test_evicted_events_are_rejected_behind_the_horizon(self):
+        index = EventDedupIndex(max_entries=500, max_age=timedelta(minutes=30))
+        for i in range(20000):
+            index.add(f"emp{i}", START + timedelta(seconds=i))
+        for i in range(0, 19000, 97):
+            self.assertNotIn(f"emp{i}", index)
+            self.assertFalse(index.add(f"emp{i}", START + timedelta(seconds=i)), f"emp{i} delivered twice")
+        # A new id older than the horizon is rejected too
+        self.assertFalse(index.add("late", START))
+
+    def test_eviction_is_oldest_event_time_first(self):
+        # Shuffled arrival (stream and poll interleaving): the newest entries survive
+        random.seed(3)
+        index = EventDedupIndex(max_entries=300, max_age=timedelta(hours=1))
+        times = [START + timedelta(seconds=i) for i in range(2000)]
+        order = []
+        for block in range(0, 2000, 50):
+            chunk = list(range(block, block + 50))
+            random.shuffle(chunk)
+            order.extend(chunk)
+        for i in order:
+            index.add(f"emp{i}", times[i])
+        self.assertEqual(len(index), 300)
+        kept = sorted(index.entries.values())
+        self.assertEqual(kept[0], times[1700])
+        self.assertEqual(kept[-1], times[1999])
+
+    def test_age_eviction_is_relative_to_the_newest_event(self):
+        index = EventDedupIndex(max_entries=10000, max_age=timedelta(minutes=5))
+        for i in range(600):
+            index.add(f"emp{i}", START + timedelta(seconds=i))
+        self.assertEqual(len(index), 301)
+        self.assertIn("emp599", index)
+        self.assertIn("emp299", index)
+        self.assertNotIn("emp298", index)
+
+    def test_device_time_strings(self):
+        index = EventDedupIndex()
+        self.assertTrue(index.add("1001-2025-01-31T12:00:05+05:30", "2025-01-31T12:00:05+05:30"))
+        self.assertFalse(index.add("1001-2025-01-31T12:00:05+05:30", "2025-01-31T12:00:05+05:30"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from deviceClient import AsyncDeviceClient, DeviceClient, SharedDigestAuth, is_stale_challenge
+from mockIsapiServer import MockIsapiServer
+
+DEVICE_INFO = "/ISAPI/System/deviceinfo"
+
+
+class DeviceClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockIsapiServer().start()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.stop()
+
+    def client(self, password="admin", pool_size=4):
+        client = DeviceClient(self.server.host, self.server.port, "admin", password, pool_size=pool_size)
+        self.clients.append(client)
+        return client
+
+    def test_stale_challenge(self):
+        self.assertTrue(is_stale_challenge('Digest realm="x", nonce="n", stale="TRUE"'))
+        self.assertTrue(is_stale_challenge('Digest realm="x", nonce="n", stale=true'))
+        self.assertFalse(is_stale_challenge('Digest realm="x", nonce="n", stale="FALSE"'))
+        self.assertFalse(is_stale_challenge('Digest realm="x", nonce="n"'))
+
+    def test_nonce_is_shared_across_threads(self):
+        client = self.client()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            statuses = list(pool.map(lambda _: client.get(DEVICE_INFO).status_code, range(200)))
+        self.assertEqual(statuses, [200] * 200)
+        self.assertLessEqual(self.server.stats['challenges'], 4)
+
+    def test_expiring_nonces_never_reach_the_caller(self):
+        self.server.expire_every = 20
+        client = self.client(pool_size=8)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(lambda _: client.get(DEVICE_INFO).status_code, range(1000)))
+        self.assertEqual(statuses.count(401), 0)
+
+    def test_wrong_password_is_not_retried(self):
+        response = self.client(password="wrong").get(DEVICE_INFO)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.server.stats['requests'], 2)
+
+    def test_async_client(self):
+        async def fetch(password, count):
+            client = AsyncDeviceClient(self.server.host, self.server.port, SharedDigestAuth("admin", password),
+                                       max_connections=2)
+            try:
+                return [response.status_code for response in
+                        await asyncio.gather(*(client.get(DEVICE_INFO) for _ in range(count)))]
+            finally:
+                client.close()
+
+        self.server.expire_every = 7
+        self.assertEqual(asyncio.run(fetch("admin", 50)), [200] * 50)
+        self.server.expire_every = 0
+        self.server.reset_stats()
+        self.assertEqual(asyncio.run(fetch("wrong", 1)), [401])
+        self.assertEqual(self.server.stats['requests'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import shutil
+import tempfile
+import unittest
+
+from deviceClient import close_all_clients
+from employeePhotos import EmployeePhotoStore, EmployeePhotoSync
+from mockIsapiServer import MockIsapiServer
+
+
+def passthrough(content, height):
+    # PyQt may be absent, so thumbnails are stored as downloaded
+    return content
+
+
+class EmployeePhotoSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockIsapiServer(max_results=5).start()
+        for no in range(1, 13):
+            self.server.add_user(f"E{no:03d}", f"Employee {no}", face=(no != 12))
+        self.config = {'ip': self.server.host, 'port': self.server.port, 'user': 'admin', 'password': 'admin'}
+        self.directory = tempfile.mkdtemp()
+        self.store = EmployeePhotoStore(self.directory, thumbnailer=passthrough)
+        self.sync = EmployeePhotoSync(self.store, lambda: {'reader': self.config}, {'EmployeePhotos': {'pageSize': 5}})
+
+    def tearDown(self):
+        self.server.stop()
+        close_all_clients()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_incremental_sync(self):
+        # First pass pages through everything and downloads 11 faces
+        self.assertEqual(self.sync.sync_device('reader', self.config), 11)
+        self.assertTrue(self.store.path_for('E001'))
+        self.assertFalse(self.store.path_for('E012'))
+
+        # Nothing changed: no downloads
+        self.server.reset_stats()
+        self.assertEqual(self.sync.sync_device('reader', self.config), 0)
+        self.assertLess(self.server.stats['requests'], 20)
+
+        # A re-enrolled face is fetched again, a deleted user is dropped
+        self.server.add_user('E003', 'Employee 3')
+        self.server.remove_user('E004')
+        self.assertEqual(self.sync.sync_device('reader', self.config), 1)
+        self.assertFalse(self.store.path_for('E004'))
+
+        # The store survives a restart
+        reopened = EmployeePhotoStore(self.directory, thumbnailer=passthrough)
+        self.assertTrue(reopened.path_for('E001'))
+        self.assertTrue(reopened.face_url('E003').endswith('@2'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from eventHistory import EventHistory, event_sort_key
+
+START = datetime(2025, 1, 31, 12, 0)
+
+
+def make_event(seconds, serial):
+    when = START + timedelta(seconds=seconds)
+    return {'time': when.strftime('%Y-%m-%dT%H:%M:%S+05:30'), 'serialNo': serial,
+            'employeeNoString': str(serial % 50), 'name': f"Employee {serial % 50}"}
+
+
+class EventHistoryTest(unittest.TestCase):
+
+    def test_matches_append_sort_truncate(self):
+        # Late arrivals and equal times land where a stable sort would put them
+        random.seed(11)
+        history = EventHistory(21)
+        reference = []
+        for i in range(2000):
+            event = make_event(i // 2 + random.randint(-30, 5), i)
+            history.add(event)
+            reference.append(event)
+            reference.sort(key=event_sort_key, reverse=True)
+            reference = reference[:21]
+            self.assertEqual(list(history), reference)
+
+    def test_event_older_than_the_whole_history_is_not_kept(self):
+        history = EventHistory(21)
+        for i in range(30):
+            history.add(make_event(i, i))
+        self.assertEqual(history.add(make_event(-3600, -1)), -1)
+        self.assertEqual(len(history), 21)
+
+
+if __name__ == "__main__":
+    unittest.main()
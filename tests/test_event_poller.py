@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from deviceClient import close_all_clients
+from eventPoller import AcsEventPoller, JsonStateStore
+from mockIsapiServer import MockIsapiServer
+
+
+class IterRangeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MockIsapiServer(max_results=5).start()
+        for i in range(12):
+            self.server.add_event(f"{1000 + i}", event_time=f"2025-01-31T12:00:{i:02d}+05:30")
+        self.directory = tempfile.mkdtemp()
+        self.poller = AcsEventPoller(self.server.host, self.server.port, 'admin', 'admin',
+                                  cursor_store=JsonStateStore(os.path.join(self.directory, 'cursor.json')))
+
+    def tearDown(self):
+        self.server.stop()
+        close_all_clients()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_each_range_has_its_own_search_id(self):
+        start, end = "2025-01-31T12:00:00+05:30", "2025-01-31T12:59:59+05:30"
+        pages = list(self.poller.iter_range(start, end))
+        self.assertEqual(sum(len(page) for page in pages), 12)
+        first = self.server.search_ids[:]
+        self.assertEqual(len(first), len(pages))
+        self.assertEqual(len(set(first)), 1, "search ID changed between pages of one range")
+        self.assertNotEqual(first[0], "1", "backfill shares live polling's search ID")
+
+        list(self.poller.iter_range(start, end))
+        self.assertNotEqual(self.server.search_ids[-1], first[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
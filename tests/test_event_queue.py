@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from eventQueue import SPILL_FILE, EventQueue, replay_cutoff
+from eventRecord import PunchEvent
+
+
+class EventQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spill_path = os.path.join(self.directory, SPILL_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_busy_reader_does_not_starve_the_others(self):
+        queue = EventQueue({'EventQueue': {'maxDepth': 20}}, spill_path=self.spill_path)
+        for i in range(60):
+            queue.put({'employeeNoString': f"busy{i}", 'source_device_ip': '10.0.0.1'})
+        for i in range(5):
+            queue.put({'employeeNoString': f"a{i}", 'source_device_ip': '10.0.0.2'})
+            queue.put({'employeeNoString': f"b{i}", 'source_device_ip': '10.0.0.3'})
+        self.assertEqual(len(queue), 70)
+
+        first = [e['employeeNoString'] for e in queue.get_batch(6)]
+        self.assertTrue(any(name.startswith('a') for name in first))
+        self.assertTrue(any(name.startswith('b') for name in first))
+
+        drained = first
+        while len(queue):
+            drained.extend(e['employeeNoString'] for e in queue.get_batch(10))
+        self.assertEqual(len(drained), 70)
+        self.assertEqual([name for name in drained if name.startswith('busy')], [f"busy{i}" for i in range(60)])
+        self.assertFalse(os.path.exists(self.spill_path), "spill file left behind once read back")
+
+    def test_refills_read_by_offset_and_survive_a_restart(self):
+        queue = EventQueue({'EventQueue': {'maxDepth': 10}}, spill_path=self.spill_path)
+        for i in range(40):
+            queue.put({'employeeNoString': f"e{i}", 'source_device_ip': '10.0.0.1', 'time': '2025-01-31T12:00:00'})
+        size = os.path.getsize(self.spill_path)
+        taken = [e['employeeNoString'] for e in queue.get_batch(10)]
+        taken += [e['employeeNoString'] for e in queue.get_batch(10)]
+        # The file is never rewritten while running
+        self.assertEqual(os.path.getsize(self.spill_path), size)
+        self.assertLess(queue.spilled, 30)
+
+        queue.spill_all()
+        restarted = EventQueue({'EventQueue': {'maxDepth': 10}}, spill_path=self.spill_path)
+        while len(restarted):
+            taken.extend(e['employeeNoString'] for e in restarted.get_batch(10))
+        self.assertEqual(taken, [f"e{i}" for i in range(40)])
+
+    def test_replay_cutoff_follows_the_meal_window(self):
+        lunch = {'CanteenMenu': {'MealSchedule': [{'fromTime': '12:00', 'toTime': '14:00', 'mealType': 'Lunch'}]}}
+        self.assertEqual(replay_cutoff(lunch, datetime(2025, 1, 31, 12, 20)), datetime(2025, 1, 31, 12, 0))
+        self.assertEqual(replay_cutoff(lunch, datetime(2025, 1, 31, 13, 50)), datetime(2025, 1, 31, 13, 20))
+        self.assertEqual(replay_cutoff(lunch, datetime(2025, 1, 31, 18, 0)), datetime(2025, 1, 31, 18, 0))
+        self.assertEqual(replay_cutoff({}, datetime(2025, 1, 31, 18, 0)), datetime(2025, 1, 31, 17, 30))
+
+    def test_drop_oldest_with_punch_events(self):
+        settings = {'CanteenMenu': {'MealSchedule': []}}
+        queue = EventQueue({'EventQueue': {'maxDepth': 2, 'policy': 'dropOldest'}}, spill_path=self.spill_path)
+        for i in range(3):
+            queue.put(PunchEvent.from_device({'employeeNoString': f"p{i}", 'time': f"2025-01-31T12:00:0{i}",
+                                              'source_device_ip': '10.0.0.1'}, settings))
+        self.assertEqual([e.employee_no for e in queue.get_batch(10)], ["p1", "p2"])
+        self.assertEqual(queue.dropped, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import unittest
+from datetime import datetime
+
+from eventRecord import PunchEvent, Recognition
+
+SETTINGS = {'CanteenMenu': {'MealSchedule': [
+    {'fromTime': '12:00', 'toTime': '14:00', 'mealType': 'Lunch', 'price': '40'},
+]}}
+RAW = {
+    "major": 5, "minor": 75, "time": "2025-01-31T12:30:05+05:30", "cardReaderNo": 1,
+    "doorNo": 1, "employeeNoString": "1042", "name": "Asha", "userType": "normal",
+    "currentVerifyMode": "cardOrFace", "mask": "no", "serialNo": 881,
+    "pictureURL": "http://10.0.0.5/LOCALS/pic/acsLinkCap/881.jpg",
+    "AttendanceInfo": {"attendanceStatus": "checkIn", "labelName": "IN"},
+    "source_device_ip": "10.0.0.5", "deviceIP": "10.0.0.5",
+}
+AT_LUNCH = datetime(2025, 1, 31, 12, 31)
+
+
+class PunchEventTest(unittest.TestCase):
+
+    def test_fields_from_device_event(self):
+        record = PunchEvent.from_device(RAW, SETTINGS, AT_LUNCH)
+        self.assertEqual(record.employee_no, "1042")
+        self.assertIs(record.recognition, Recognition.FACE)
+        self.assertEqual(record.recognition.label, "Face")
+        self.assertEqual(record.time, datetime(2025, 1, 31, 12, 30, 5))
+        self.assertEqual(record.punch_time, "2025-01-31 12:30:05")
+        self.assertEqual((record.meal_type, record.meal_price), ("LUNCH", '40'))
+        self.assertEqual(record.att_in_out, "IN")
+
+    def test_record_is_immutable(self):
+        record = PunchEvent.from_device(RAW, SETTINGS, AT_LUNCH)
+        with self.assertRaises(AttributeError):
+            record.name = "changed"
+
+    def test_spill_round_trip_after_the_meal_closed(self):
+        record = PunchEvent.from_device(RAW, SETTINGS, AT_LUNCH)
+        again = PunchEvent.from_device(json.loads(json.dumps(record.to_dict())), SETTINGS,
+                                       datetime(2025, 1, 31, 18, 0))
+        self.assertEqual(again, record)
+        self.assertEqual(again.time_text, RAW['time'])
+        self.assertEqual(again.meal_price, '40')
+
+    def test_fallbacks(self):
+        # employeeNo fallback, another time zone, unknown minor, backfilled meal at punch time
+        other = PunchEvent.from_device({'employeeNo': 7, 'time': '2025-01-31T12:10:00-05:00', 'minor': 3,
+                                        'backfilled': True}, SETTINGS, datetime(2025, 1, 31, 18, 0))
+        self.assertEqual(other.employee_no, "7")
+        self.assertEqual(other.time.hour, 12)
+        self.assertIs(other.recognition, Recognition.UNKNOWN)
+        self.assertEqual(other.meal_type, "LUNCH")
+
+
+if __name__ == "__main__":
+    unittest.main()
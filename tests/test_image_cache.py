@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from deviceClient import close_all_clients
+from imageCache import ImageCache, LruCache
+
+
+class FaceHandler(BaseHTTPRequestHandler):
+    served = []
+
+    def do_GET(self):
+        self.served.append(self.path)
+        time.sleep(0.05)  # Reader serving a JPEG
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.path.encode() * 100
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        FaceHandler.served = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FaceHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.directory = tempfile.mkdtemp()
+        self.cache = ImageCache(self.directory, max_bytes=5000, retry_seconds=60)
+
+    def tearDown(self):
+        self.cache.shutdown()
+        self.server.shutdown()
+        self.server.server_close()
+        close_all_clients()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_concurrent_fetches_share_one_download(self):
+        done = threading.Event()
+        results = []
+
+        def collect(path):
+            results.append(path)
+            if len(results) == 3:
+                done.set()
+
+        for _ in range(3):
+            self.assertIsNone(self.cache.fetch(f"{self.base}/face/1", collect, 'admin', 'pw'))
+        self.assertTrue(done.wait(5))
+        self.assertEqual(len(set(results)), 1)
+        self.assertTrue(results[0])
+        self.assertEqual(FaceHandler.served, ['/face/1'])
+
+        # Re-binding the grid: served from disk, no further requests
+        for _ in range(100):
+            self.assertEqual(self.cache.fetch(f"{self.base}/face/1", collect, 'admin', 'pw'), results[0])
+        self.assertEqual(FaceHandler.served, ['/face/1'])
+
+    def test_failed_url_is_not_retried_on_every_rebind(self):
+        failures = []
+        self.cache.fetch(f"{self.base}/missing", failures.append, 'admin', 'pw')
+        time.sleep(0.3)
+        self.cache.fetch(f"{self.base}/missing", failures.append, 'admin', 'pw')
+        self.assertEqual(failures, [None, None])
+        self.assertEqual(FaceHandler.served.count('/missing'), 1)
+
+    def test_size_budget_evicts_least_recently_used_and_survives_restart(self):
+        self.cache.store('a', b'x' * 2000)
+        self.cache.store('b', b'x' * 2000)
+        self.cache.lookup('a')
+        self.cache.store('c', b'x' * 2000)
+        self.assertTrue(self.cache.lookup('a') and self.cache.lookup('c'))
+        self.assertFalse(self.cache.lookup('b'))
+        self.assertLessEqual(self.cache.total_bytes, 5000)
+
+        self.cache.shutdown()
+        self.cache = ImageCache(self.directory, max_bytes=5000)
+        self.assertTrue(self.cache.lookup('a') and self.cache.lookup('c'))
+        self.assertFalse(self.cache.lookup('b'))
+
+
+class LruCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_is_dropped(self):
+        pixmaps = LruCache(2)
+        pixmaps.put('a', 1)
+        pixmaps.put('b', 2)
+        pixmaps.get('a')
+        pixmaps.put('c', 3)
+        self.assertIn('a', pixmaps)
+        self.assertNotIn('b', pixmaps)
+        self.assertEqual(len(pixmaps), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
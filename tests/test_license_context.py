@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from licenseContext import LicenseContext
+
+
+class FakeManager:
+    calls = 0
+    available = True
+
+    async def get_license_db(self):
+        FakeManager.calls += 1
+        await asyncio.sleep(0.05)  # Fingerprint + remote MySQL round trip
+        return {'LicenseKey': f"KEY-{FakeManager.calls}"} if FakeManager.available else False
+
+
+class LicenseContextTest(unittest.TestCase):
+
+    def setUp(self):
+        FakeManager.calls = 0
+        FakeManager.available = True
+
+    def test_concurrent_first_callers_share_one_fetch(self):
+        context = LicenseContext(manager_factory=FakeManager)
+        threads = [threading.Thread(target=context.get_license_key) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(FakeManager.calls, 1)
+        for _ in range(1000):
+            self.assertEqual(context.get_license_key(), "KEY-1")
+        self.assertEqual(FakeManager.calls, 1)
+
+    def test_stale_key_is_served_while_refreshing(self):
+        context = LicenseContext(ttl=0.3, retry_seconds=0.2, manager_factory=FakeManager)
+        self.assertEqual(context.get_license_key(), "KEY-1")
+        time.sleep(0.35)
+        self.assertEqual(context.get_license_key(), "KEY-1")
+        time.sleep(0.1)
+        self.assertEqual(FakeManager.calls, 2)
+        self.assertEqual(context.get_license_key(), "KEY-2")
+
+        # The license server going away keeps the last good key
+        FakeManager.available = False
+        time.sleep(0.35)
+        context.get_license_key()
+        time.sleep(0.1)
+        self.assertEqual(context.get_license_key(), "KEY-2")
+
+    def test_failing_lookup_is_retried_after_retry_seconds(self):
+        FakeManager.available = False
+        context = LicenseContext(retry_seconds=0.2, manager_factory=FakeManager)
+        for _ in range(50):
+            self.assertEqual(context.get_license_key(), '')
+        self.assertEqual(FakeManager.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
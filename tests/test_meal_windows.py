@@ -0,0 +1,148 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+
+from mealWindows import MINUTES_PER_DAY, CompiledMealSchedule, get_compiled_schedule
+
+DAY = datetime(2025, 1, 31)
+
+
+def string_scan(meal_schedule, current_time):
+    # The lookup used across timeBase.py before the compiled index existed
+    for meal in meal_schedule:
+        from_time = meal.get('fromTime', '')
+        to_time = meal.get('toTime', '')
+        if from_time and to_time and from_time <= current_time <= to_time:
+            return meal
+    return None
+
+
+def wrapping_scan(meal_schedule, current_time):
+    # The string scan with windows such as 22:00-02:00 running past midnight
+    for meal in meal_schedule:
+        from_time = meal.get('fromTime', '')
+        to_time = meal.get('toTime', '')
+        if not from_time or not to_time:
+            continue
+        if from_time <= to_time:
+            if from_time <= current_time <= to_time:
+                return meal
+        elif current_time >= from_time or current_time <= to_time:
+            return meal
+    return None
+
+
+def random_time(rng):
+    return f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+
+
+def random_moment(rng):
+    return DAY + timedelta(seconds=rng.randrange(MINUTES_PER_DAY * 60), microseconds=rng.randrange(10 ** 6))
+
+
+class CompiledMealScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(7)
+
+    def test_matches_string_scan_at_random_times(self):
+        # Overlapping meals included: the one listed first wins
+        for _ in range(300):
+            meals = []
+            for i in range(self.rng.randint(0, 6)):
+                from_time, to_time = sorted([random_time(self.rng), random_time(self.rng)])
+                meals.append({'fromTime': from_time, 'toTime': to_time, 'mealType': f"M{i}", 'price': str(i)})
+            compiled = CompiledMealSchedule(meals)
+            for _ in range(200):
+                moment = random_moment(self.rng)
+                window = compiled.lookup(moment)
+                self.assertIs(window.meal if window else None, string_scan(meals, moment.strftime('%H:%M')),
+                              (meals, moment))
+
+    def test_matches_string_scan_at_every_boundary(self):
+        # The first and last minute of each meal, and the minutes either side
+        for _ in range(300):
+            meals = []
+            for i in range(self.rng.randint(1, 6)):
+                from_time, to_time = sorted([random_time(self.rng), random_time(self.rng)])
+                meals.append({'fromTime': from_time, 'toTime': to_time, 'mealType': f"M{i}"})
+            compiled = CompiledMealSchedule(meals)
+            for meal in meals:
+                for text in (meal['fromTime'], meal['toTime']):
+                    hour, minute = map(int, text.split(':'))
+                    for offset in (-1, 0, 1):
+                        moment = DAY + timedelta(hours=hour, minutes=minute + offset, seconds=59)
+                        window = compiled.lookup(moment)
+                        self.assertIs(window.meal if window else None, string_scan(meals, moment.strftime('%H:%M')),
+                                      (meals, moment))
+
+    def test_matches_wrapping_scan_past_midnight(self):
+        for _ in range(300):
+            meals = [{'fromTime': random_time(self.rng), 'toTime': random_time(self.rng), 'mealType': f"M{i}"}
+                     for i in range(self.rng.randint(1, 4))]
+            compiled = CompiledMealSchedule(meals)
+            for _ in range(200):
+                moment = random_moment(self.rng)
+                window = compiled.lookup(moment)
+                self.assertIs(window.meal if window else None, wrapping_scan(meals, moment.strftime('%H:%M')),
+                              (meals, moment))
+
+    def test_midnight_wrap(self):
+        night = CompiledMealSchedule([
+            {'fromTime': '12:00', 'toTime': '14:00', 'mealType': 'Lunch', 'price': '40'},
+            {'fromTime': '22:00', 'toTime': '02:00', 'mealType': 'Dinner', 'price': '60'},
+        ])
+        self.assertEqual(night.meal_type_at('23:30'), 'Dinner')
+        self.assertEqual(night.meal_type_at('00:00'), 'Dinner')
+        self.assertEqual(night.meal_type_at('02:00'), 'Dinner')
+        self.assertIsNone(night.lookup('02:01'))
+        self.assertIsNone(night.lookup('21:59'))
+        self.assertEqual(night.price_at('00:15'), '60')
+        # After midnight the window started the previous evening
+        self.assertEqual(night.window_bounds(DAY.replace(hour=1)), (DAY - timedelta(hours=2), DAY.replace(hour=2, minute=1)))
+        self.assertEqual(night.window_bounds(DAY.replace(hour=23)),
+                         (DAY.replace(hour=22), DAY + timedelta(days=1, hours=2, minutes=1)))
+        self.assertEqual(night.next_start(DAY.replace(hour=12, minute=30)), DAY.replace(hour=22))
+        self.assertEqual(night.next_start(DAY.replace(hour=22)), DAY.replace(hour=12) + timedelta(days=1))
+
+    def test_last_bounds(self):
+        night = CompiledMealSchedule([
+            {'fromTime': '12:00', 'toTime': '14:00', 'mealType': 'Lunch'},
+            {'fromTime': '22:00', 'toTime': '02:00', 'mealType': 'Dinner'},
+        ])
+        self.assertEqual(night.last_bounds(DAY.replace(hour=13)), night.window_bounds(DAY.replace(hour=13)))
+        self.assertEqual(night.last_bounds(DAY.replace(hour=15)), (DAY.replace(hour=12), DAY.replace(hour=14, minute=1)))
+        self.assertEqual(night.last_bounds(DAY.replace(hour=9)), (DAY - timedelta(hours=2), DAY.replace(hour=2, minute=1)))
+        self.assertIsNone(CompiledMealSchedule([]).last_bounds(DAY))
+
+    def test_next_boundary_is_the_first_minute_the_meal_changes(self):
+        for _ in range(200):
+            meals = [{'fromTime': random_time(self.rng), 'toTime': random_time(self.rng), 'mealType': f"M{i}"}
+                     for i in range(self.rng.randint(1, 4))]
+            compiled = CompiledMealSchedule(meals)
+            now = DAY + timedelta(minutes=self.rng.randrange(MINUTES_PER_DAY))
+            boundary, opens = compiled.next_boundary(now)
+            if boundary is None:
+                continue
+            current = compiled.lookup(now)
+            probe = now + timedelta(minutes=1)
+            while probe < boundary:
+                self.assertIs(compiled.lookup(probe), current, (meals, now, probe))
+                probe += timedelta(minutes=1)
+            self.assertIsNot(compiled.lookup(boundary), current)
+            self.assertEqual(opens, compiled.lookup(boundary) is not None)
+
+    def test_invalid_times_are_skipped(self):
+        compiled = CompiledMealSchedule([{'fromTime': '', 'toTime': '14:00'}, {'fromTime': '25:00', 'toTime': '26:00'}])
+        self.assertFalse(compiled)
+        self.assertIsNone(compiled.lookup('12:00'))
+
+    def test_compiled_once_per_snapshot(self):
+        settings = {'CanteenMenu': {'MealSchedule': [{'fromTime': '12:00', 'toTime': '14:00'}]}}
+        self.assertIs(get_compiled_schedule(settings), get_compiled_schedule(settings))
+        changed = {'CanteenMenu': {'MealSchedule': [{'fromTime': '12:00', 'toTime': '15:00'}]}}
+        self.assertTrue(get_compiled_schedule(changed).is_open_at('14:30'))
+
+
+if __name__ == "__main__":
+    unittest.main()
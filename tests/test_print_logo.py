@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import printLogo
+from printLogo import get_logo, raster_image
+
+LOGO = raster_image(10, 2, [b'\xFF\xC0', b'\x80\x40'])
+
+
+class RasterImageTest(unittest.TestCase):
+
+    def test_row_width_rounds_up_to_whole_bytes(self):
+        self.assertEqual(LOGO, b'\x1D\x76\x30\x00\x02\x00\x02\x00\xFF\xC0\x80\x40')
+
+
+class GetLogoTest(unittest.TestCase):
+
+    def setUp(self):
+        printLogo._cached_logo.cache_clear()
+        printLogo._missing_logos.clear()
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+            self.path = f.name
+        self.addCleanup(os.remove, self.path)
+
+    def test_disabled_or_unset(self):
+        self.assertEqual(get_logo({'enable': False, 'path': self.path}), b'')
+        self.assertEqual(get_logo({'enable': True}), b'')
+        self.assertEqual(get_logo(None), b'')
+
+    def test_converted_once_and_again_when_the_file_changes(self):
+        block = {'enable': True, 'path': self.path}
+        with mock.patch.object(printLogo, 'convert_logo', return_value=LOGO) as convert:
+            self.assertEqual(get_logo(block), LOGO)
+            self.assertEqual(get_logo(block), LOGO)
+            convert.assert_called_once_with(self.path, 384)
+            os.utime(self.path, (0, os.path.getmtime(self.path) + 10))
+            self.assertEqual(get_logo(block), LOGO)
+            self.assertEqual(convert.call_count, 2)
+
+    def test_missing_logo_is_logged_once(self):
+        block = {'enable': True, 'path': os.path.join(os.path.dirname(self.path), 'missing-logo.png')}
+        with self.assertLogs(level='ERROR') as logs:
+            self.assertEqual(get_logo(block), b'')
+            self.assertEqual(get_logo(block), b'')
+        self.assertEqual(len(logs.records), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,235 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mockPrinter import MockPrinter
+from print import render_slip
+from printJournal import PrintJournal
+from printSpooler import (OFFLINE, ONLINE, PAPER_LOW, PAPER_OUT, ROUTE_IN_ORDER, UNKNOWN, PrintSpooler,
+                          parse_status)
+
+HEADER = {'enable': True, 'text': "EzeeCanteen"}
+FOOTER = {'enable': True, 'text': "Thank you!"}
+SLIPS = [render_slip(token, HEADER, "LUNCH", "EMP001", "John Doe", "2025-01-15 12:30:00", "ENJOY!!", FOOTER)
+         for token in range(1, 51)]
+
+
+def wait_status(spooler, statuses):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if all(spooler.status('127.0.0.1', port) == status for port, status in statuses.items()):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def wait_total(printers, size):
+    deadline = time.monotonic() + 10
+    while sum(len(printer.received) for printer in printers) < size and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def slow_down(printer, seconds):
+    send = printer._print
+    printer._print = lambda data: time.sleep(seconds) or send(data)
+
+
+class ParseStatusTest(unittest.TestCase):
+
+    def test_status_bytes(self):
+        self.assertEqual(parse_status(b'\x12\x12\x12'), ONLINE)
+        self.assertEqual(parse_status(b'\x12\x12\x1e'), PAPER_LOW)
+        self.assertEqual(parse_status(b'\x12\x12\x72'), PAPER_OUT)
+        self.assertEqual(parse_status(b'\x1a\x12\x12'), OFFLINE)
+        self.assertEqual(parse_status(b'\x16\x16\x12'), OFFLINE)
+        self.assertIsNone(parse_status(b''))
+
+
+class PrintSpoolerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.printers = []
+        self.spoolers = []
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for spooler in self.spoolers:
+            spooler.shutdown()
+        for printer in self.printers:
+            printer.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def printer(self, port=0):
+        printer = MockPrinter(port)
+        self.printers.append(printer)
+        return printer
+
+    def spooler(self, app_settings, journal=None):
+        spooler = PrintSpooler(app_settings, journal)
+        self.spoolers.append(spooler)
+        return spooler
+
+    def journal(self, **kwargs):
+        journal = PrintJournal(os.path.join(self.directory, 'journal.sqlite3'), **kwargs)
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_tokens_arrive_in_order_over_one_connection(self):
+        printer = self.printer()
+        spooler = self.spooler({'PrintSpooler': {'statusSeconds': 0}})
+        results = []
+        for slip in SLIPS:
+            self.assertTrue(spooler.submit('127.0.0.1', printer.port, slip, results.append))
+        self.assertTrue(printer.wait_for(sum(len(slip) for slip in SLIPS)))
+        self.assertEqual(bytes(printer.received), b''.join(SLIPS))
+        self.assertEqual(printer.connections, 1)
+
+        # The printer dropping the connection costs a reconnect, not a token
+        printer.drop_clients()
+        time.sleep(0.05)
+        printer.received.clear()
+        spooler.submit('127.0.0.1', printer.port, SLIPS[0], results.append)
+        self.assertTrue(printer.wait_for(len(SLIPS[0])))
+        self.assertEqual(printer.connections, 2)
+        spooler.shutdown()
+        self.assertEqual(results, [True] * 51)
+
+    def test_unreachable_printer_fails_fast(self):
+        printer = MockPrinter()
+        printer.close()
+        failures = []
+        spooler = self.spooler({'PrintSpooler': {'retrySeconds': 60, 'statusSeconds': 0}})
+        started = time.monotonic()
+        for slip in SLIPS[:20]:
+            spooler.submit('127.0.0.1', printer.port, slip, failures.append)
+        spooler.shutdown()
+        self.assertEqual(failures, [False] * 20)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_journal_replays_in_order_keeps_across_restart_and_skips_stale(self):
+        port = MockPrinter()
+        port.close()
+        port = port.port
+        journal = self.journal(max_age_minutes=30)
+        settings = {'PrintSpooler': {'retrySeconds': 0.2, 'statusSeconds': 0}}
+
+        # Tokens issued while the printer is down come out once it is back
+        spooler = self.spooler(settings, journal)
+        failures = []
+        for token in range(1, 4):
+            spooler.submit('127.0.0.1', port, SLIPS[token], failures.append, token)
+        time.sleep(0.1)
+        self.assertEqual(failures, [False] * 3)
+        printer = self.printer(port)
+        self.assertTrue(printer.wait_for(sum(len(slip) for slip in SLIPS[1:4])))
+        self.assertEqual(bytes(printer.received), b''.join(SLIPS[1:4]))
+        self.assertFalse(journal.printers_with_pending())
+        spooler.shutdown()
+        printer.close()
+
+        # A restart keeps pending tokens; stale ones are never printed
+        spooler = self.spooler(settings, journal)
+        spooler.submit('127.0.0.1', port, SLIPS[4], None, 4)
+        spooler.submit('127.0.0.1', port, SLIPS[5], None, 5)
+        spooler.shutdown()
+        journal.db.execute("UPDATE jobs SET created = created - 3600 WHERE token = 4")
+        restarted = self.spooler(settings, journal)
+        printer = self.printer(port)
+        restarted.resume()
+        self.assertTrue(printer.wait_for(len(SLIPS[5])))
+        self.assertEqual(bytes(printer.received), SLIPS[5])
+
+        # The counter operator reprints token 2; token 4 is from an earlier meal
+        printer.received.clear()
+        self.assertFalse(restarted.reprint(4, since=time.time() - 60))
+        self.assertTrue(restarted.reprint(2, since=time.time() - 60))
+        self.assertFalse(restarted.reprint(99))
+        self.assertTrue(printer.wait_for(len(SLIPS[2])))
+        self.assertEqual(bytes(printer.received), SLIPS[2])
+
+    def test_status_changes_are_cached_and_reported(self):
+        printer = self.printer()
+        changes = []
+        spooler = self.spooler({'PrintSpooler': {'statusSeconds': 0.05}})
+        spooler.add_status_listener(lambda ip, port, status: changes.append(status))
+        self.assertEqual(spooler.status('127.0.0.1', printer.port), UNKNOWN)
+        spooler.watch('127.0.0.1', printer.port)
+        self.assertTrue(wait_status(spooler, {printer.port: ONLINE}))
+        printer.status_reply = b'\x12\x12\x1e'
+        self.assertTrue(wait_status(spooler, {printer.port: PAPER_LOW}))
+        printer.status_reply = b'\x12\x12\x72'
+        self.assertTrue(wait_status(spooler, {printer.port: PAPER_OUT}))
+        printer.close()
+        self.assertTrue(wait_status(spooler, {printer.port: OFFLINE}))
+        spooler.shutdown()
+        self.assertEqual(changes, [ONLINE, PAPER_LOW, PAPER_OUT, OFFLINE])
+
+    def test_journaled_slip_waits_out_paper_out(self):
+        journal = self.journal()
+        printer = self.printer()
+        printer.status_reply = b'\x12\x12\x72'
+        spooler = self.spooler({'PrintSpooler': {'statusSeconds': 0.05, 'retrySeconds': 0.05}}, journal)
+        spooler.watch('127.0.0.1', printer.port)
+        self.assertTrue(wait_status(spooler, {printer.port: PAPER_OUT}))
+        held = []
+        spooler.submit('127.0.0.1', printer.port, SLIPS[7], held.append, 7)
+        time.sleep(0.2)
+        self.assertEqual(held, [False])
+        self.assertFalse(printer.received)
+        printer.status_reply = b'\x12\x12\x12'
+        self.assertTrue(printer.wait_for(len(SLIPS[7])))
+        self.assertEqual(bytes(printer.received), SLIPS[7])
+
+    def test_group_balances_away_from_a_slow_printer(self):
+        first, second = self.printer(), self.printer()
+        groups = {'groups': {f"127.0.0.1:{first.port}": [f"127.0.0.1:{second.port}"]}}
+        spooler = self.spooler({'PrintSpooler': {'statusSeconds': 0.05}, 'PrinterGroups': groups})
+        spooler.watch('127.0.0.1', first.port)
+        self.assertTrue(wait_status(spooler, {first.port: ONLINE, second.port: ONLINE}))
+        slow_down(spooler.queue_for('127.0.0.1', first.port), 0.02)
+        for slip in SLIPS[:40]:
+            spooler.submit('127.0.0.1', first.port, slip)
+        wait_total([first, second], sum(len(slip) for slip in SLIPS[:40]))
+        printed = first.received + second.received
+        self.assertTrue(all(printed.count(slip) == 1 for slip in SLIPS[:40]))
+        self.assertLess(0, len(first.received))
+        self.assertLess(len(first.received), len(second.received))
+
+    def test_paper_out_moves_queued_slips_to_the_other_printer(self):
+        journal = self.journal()
+        first, second = self.printer(), self.printer()
+        groups = {'routing': ROUTE_IN_ORDER, 'groups': {f"127.0.0.1:{first.port}": [f"127.0.0.1:{second.port}"]}}
+        spooler = self.spooler({'PrintSpooler': {'statusSeconds': 0.05, 'retrySeconds': 0.05},
+                                'PrinterGroups': groups}, journal)
+        spooler.watch('127.0.0.1', first.port)
+        self.assertTrue(wait_status(spooler, {first.port: ONLINE, second.port: ONLINE}))
+        slow_down(spooler.queue_for('127.0.0.1', first.port), 0.02)
+        results = []
+        for token in range(1, 31):
+            spooler.submit('127.0.0.1', first.port, SLIPS[token], results.append, token)
+        time.sleep(0.1)
+        first.status_reply = b'\x12\x12\x72'
+        wait_total([first, second], sum(len(slip) for slip in SLIPS[1:31]))
+        # Every token prints exactly once and the journal owes nothing
+        printed = first.received + second.received
+        self.assertTrue(all(printed.count(slip) == 1 for slip in SLIPS[1:31]))
+        self.assertTrue(first.received and second.received)
+        self.assertFalse(journal.printers_with_pending())
+        self.assertEqual(spooler.status('127.0.0.1', first.port), PAPER_OUT)
+        self.assertTrue(spooler.available('127.0.0.1', first.port))
+
+        # With the first printer gone, new jobs go straight to the second
+        first.close()
+        self.assertTrue(wait_status(spooler, {first.port: OFFLINE}))
+        second.received.clear()
+        spooler.submit('127.0.0.1', first.port, SLIPS[31], results.append, 31)
+        self.assertTrue(second.wait_for(len(SLIPS[31])))
+        self.assertEqual(bytes(second.received), SLIPS[31])
+        spooler.shutdown()
+        self.assertEqual(results, [True] * 31)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from settingsService import SETTINGS_FILE, SettingsService
+
+
+class SettingsServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, SETTINGS_FILE)
+        self.write({'CanteenMenu': {'DisablePunch': False, 'MealSchedule': [{'fromTime': '12:00'}]}})
+        self.service = SettingsService(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, settings):
+        with open(self.path, 'w') as f:
+            json.dump(settings, f)
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        first = self.service.get()
+        self.assertIs(self.service.get(), first)
+
+    def test_snapshot_is_read_only(self):
+        with self.assertRaises(TypeError):
+            self.service.get()['CanteenMenu']['DisablePunch'] = True
+
+    def test_save_leaves_old_snapshot_alone(self):
+        first = self.service.get()
+        settings = self.service.edit()
+        settings['CanteenMenu']['DisablePunch'] = True
+        settings['CanteenMenu']['MealSchedule'].append({'fromTime': '19:00'})
+        second = self.service.save(settings)
+        self.assertTrue(second['CanteenMenu']['DisablePunch'])
+        self.assertEqual(len(second['CanteenMenu']['MealSchedule']), 2)
+        self.assertFalse(first['CanteenMenu']['DisablePunch'], "old snapshot changed under its reader")
+
+    def test_edit_by_another_process_is_picked_up(self):
+        self.service.get()
+        self.write({'CanteenMenu': {'DisablePunch': False, 'SpecialMessage': 'x' * 10}})
+        self.assertEqual(self.service.get()['CanteenMenu']['SpecialMessage'], 'x' * 10)
+
+        # A half-written file keeps the last good snapshot
+        with open(self.path, 'w') as f:
+            f.write('{"CanteenMenu": ')
+        self.assertEqual(self.service.get()['CanteenMenu']['SpecialMessage'], 'x' * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
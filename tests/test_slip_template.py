@@ -0,0 +1,60 @@
+import unittest
+
+from print import (BOLD_OFF, BOLD_ON, CENTER_ALIGN, DOUBLE_SIZE, FEED_AND_CUT, INIT_PRINTER, NORMAL_SIZE,
+                   render_slip, token_slip_template)
+from printLogo import raster_image
+from slipTemplate import SlipTemplate
+
+HEADER = {'enable': True, 'text': "EzeeCanteen"}
+FOOTER = {'enable': True, 'text': "Thank you!"}
+
+
+def render_per_call(logo, CouponCount, header, CouponType, id, name, punchTime, specialMessage, footer):
+    # Every command and field issued one by one, as before the templates
+    out = [INIT_PRINTER, CENTER_ALIGN, logo]
+    if CouponCount != 0:
+        out += [BOLD_ON, f"Token No: {CouponCount}\n".encode(), BOLD_OFF]
+    if header.get('enable', False):
+        out += [BOLD_ON, f"{header['text']}\n".encode(), BOLD_OFF]
+    out += [b"\n", DOUBLE_SIZE, f"{CouponType}\n".encode(), NORMAL_SIZE, b"\n"]
+    out += [f"User: {id}, {name}\n".encode(), f"Date Time: {punchTime}\n".encode()]
+    if specialMessage.strip() != "":
+        out += [b"\n", f"{specialMessage}\n".encode()]
+    out.append(b"\n")
+    if footer.get('enable', False):
+        out.append(f"{footer['text']}\n".encode())
+    out.append(FEED_AND_CUT)
+    return b''.join(out)
+
+
+class SlipTemplateTest(unittest.TestCase):
+
+    def test_fixed_segments_are_merged(self):
+        template = SlipTemplate([b'\x1B\x40', "Hi ", b'\n', lambda f: f['name'].encode(), b'', b'\n'])
+        self.assertEqual(template.parts[0], b'\x1B\x40Hi \n')
+        self.assertEqual(len(template.parts), 3)
+        self.assertEqual(template.render({'name': 'Asha'}), b'\x1B\x40Hi \nAsha\n')
+        self.assertEqual(template.render({'name': 'Ravi'}), b'\x1B\x40Hi \nRavi\n')
+
+
+class TokenSlipTest(unittest.TestCase):
+
+    def test_matches_per_call_rendering(self):
+        disabled = {'enable': False, 'text': "unused"}
+        for token, header, message, footer in ((12, HEADER, "ENJOY!!", FOOTER), (0, HEADER, "ENJOY!!", FOOTER),
+                                               (3, disabled, "  ", FOOTER), (4, HEADER, "", disabled)):
+            args = (token, header, "LUNCH", "EMP001", "John Doe", "2025-01-15 12:30:00", message, footer)
+            self.assertEqual(render_slip(*args), render_per_call(b'', *args), args)
+
+    def test_logo_is_part_of_the_compiled_template(self):
+        logo = raster_image(16, 2, [b'\xFF\x00', b'\x00\xFF'])
+        template = token_slip_template("EzeeCanteen", "ENJOY!!", "Thank you!", logo)
+        self.assertIs(token_slip_template("EzeeCanteen", "ENJOY!!", "Thank you!", logo), template)
+        slip = template.render({'token': 12, 'coupon_type': "LUNCH", 'id': "EMP001", 'name': "John Doe",
+                                'punch_time': "2025-01-15 12:30:00"})
+        args = (12, HEADER, "LUNCH", "EMP001", "John Doe", "2025-01-15 12:30:00", "ENJOY!!", FOOTER)
+        self.assertEqual(slip, render_per_call(logo, *args))
+
+
+if __name__ == "__main__":
+    unittest.main()
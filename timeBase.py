@@ -1,5 +1,4 @@
 import requests
-from requests.auth import HTTPDigestAuth
 import json
 from datetime import datetime, timedelta
 import time
@@ -7,9 +6,7 @@ import sys
 import os
 import tempfile
 import shutil
-import uuid
 import mysql.connector
-import socket
 import logging
 import xmltodict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QGridLayout, 
@@ -19,11 +16,30 @@ from PyQt5.QtCore import Qt, QTimer, QSize, pyqtSignal, QObject, QThread, QFile
 from PyQt5.QtGui import QFont, QIcon, QPixmap, QColor, QLinearGradient, QBrush, QPalette
 from PyQt5.QtWidgets import QGraphicsDropShadowEffect, QSizePolicy
 import urllib.request
+from urllib.parse import urlparse
 from io import BytesIO
 from print import print_slip  # Import print_slip function
+from printSpooler import (get_print_spooler, shutdown_print_spooler, STATUS_SEVERITY,
+                          UNKNOWN, ONLINE, PAPER_LOW, PAPER_OUT, OFFLINE)
 from PyQt5 import sip
-from licenseManager import LicenseManager
-import asyncio
+from alertStream import AlertStreamListener
+from eventPoller import AcsEventPoller, get_meal_window_start
+from mealWindows import get_compiled_schedule
+from deviceClient import get_device_client, get_client_for_url, close_all_clients
+from ingestionEngine import IngestionEngine
+from ingestionSettings import get_ingestion_settings, get_engine_settings
+from backfill import BackfillManager
+from eventQueue import EventQueue, replay_cutoff
+from mealScheduler import MealScheduler
+from punchPipeline import PunchPipeline
+from eventGrid import EventListModel, EventCardGrid, grid_columns
+from eventRecord import PunchEvent, Recognition, punch_sort_key
+from imageCache import LruCache, get_image_cache, get_image_cache_settings
+from imagePrefetch import ImagePrefetcher, thumbnail_cache
+from employeePhotos import EmployeePhotoSync, get_employee_photos
+from metrics import metrics
+from settingsService import settings_service
+from licenseContext import license_context, get_license_key
 
 # Default device configuration (will be used if DB fetch fails)
 IP = "192.168.0.85"
@@ -45,8 +61,17 @@ DEVICES = {}
 # Global flag to track if configs have been refreshed
 CONFIG_REFRESHED = False
 
+# Header text and colour for each printer status
+PRINTER_STATUS_DISPLAY = {
+    ONLINE: ("Online", "#2ecc71"),
+    UNKNOWN: ("Checking...", "#bdc3c7"),
+    PAPER_LOW: ("Paper low", "#f1c40f"),
+    PAPER_OUT: ("Paper out", "#e74c3c"),
+    OFFLINE: ("Offline", "#e74c3c"),
+}
+
 # Function to modify user begin time
-def modify_user_begin_time(base_url, username, password, employee_no, begin_time, employee_name=None):
+def modify_user_begin_time(base_url, username, password, employee_no, begin_time, employee_name=None, timeout=10):
     """Update a user's begin time on the device"""
     url = f"{base_url}/ISAPI/AccessControl/UserInfo/Modify?format=json"
 
@@ -66,15 +91,14 @@ def modify_user_begin_time(base_url, username, password, employee_no, begin_time
     }
 
     headers = {'Content-Type': 'application/json'}
-    auth = HTTPDigestAuth(username, password)
 
     try:
-        response = requests.put(
+        # Reuse the device's keep-alive session and digest nonce
+        response = get_client_for_url(url, username, password).put(
             url,
-            auth=auth,
             headers=headers,
             data=json.dumps(payload),
-            timeout=10
+            timeout=timeout
         )
 
         logging.info(f"API response for updating begin time for employee {employee_no}: Status {response.status_code}")
@@ -107,31 +131,10 @@ def fetch_device_config(force_refresh=False):
         DEVICES.clear()
     
     try:
-        # Get the current license key first
-        license_key = ""
-        try:
-            # Create a license manager instance
-            license_manager = LicenseManager()
-            
-            # We need to run the async method in a synchronous context
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_data = loop.run_until_complete(license_manager.get_license_db())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            # Get license data and extract the key
-            license_data = get_license_data()
-            if license_data and 'LicenseKey' in license_data:
-                license_key = license_data['LicenseKey']
-                # logging.info(f"Retrieved license key for device filtering: {license_key}")
-            else:
-                logging.warning("Could not retrieve license key for device filtering")
-        except Exception as e:
-            logging.error(f"Error getting license key: {e}")
+        # Get the current license key first (cached; no license server round trip)
+        license_key = get_license_key()
+        if not license_key:
+            logging.warning("Could not retrieve license key for device filtering")
         
         # Connect to the database
         # logging.info(f"Connecting to database at {DB_HOST}:{DB_PORT}")
@@ -366,12 +369,11 @@ def print_server_addresses():
     if not DEVICES:    
         # Try to get printer IP from appSettings.json
         try:
-            with open('appSettings.json', 'r') as f:
-                app_settings = json.load(f)
-                printer_config = app_settings.get('PrinterConfig', {})
-                printer_ip = printer_config.get('IP', "192.168.0.253")
-                printer_port = printer_config.get('Port', 9100)
-                print(f"Default Printer: {printer_ip}:{printer_port}")
+            app_settings = settings_service.get()
+            printer_config = app_settings.get('PrinterConfig', {})
+            printer_ip = printer_config.get('IP', "192.168.0.253")
+            printer_port = printer_config.get('Port', 9100)
+            print(f"Default Printer: {printer_ip}:{printer_port}")
         except Exception as e:
             print(f"Default Printer: Unknown (Error: {e})")
     
@@ -393,8 +395,8 @@ def getDeviceDetails(ip, port, user, psw):
         # logging.info(f"Getting device details for {ip}:{port} with user: {user}")
         # print(f"Getting device details for {ip}:{port} with user: {user}")
        
-        response = requests.get(url, auth=HTTPDigestAuth(
-            user, psw), headers=headers, data=payload, timeout=5)
+        response = get_device_client(ip, port, user, psw).get(
+            url, headers=headers, data=payload, timeout=5)
            
         if response.status_code == 401:
             logging.error(f"Authentication failed (401 Unauthorized) for {ip}:{port} with user: {user}. Check credentials.")
@@ -440,6 +442,9 @@ class Communicator(QObject):
     # Signal to communicate between components
     stop_server = pyqtSignal()
     new_auth_event = pyqtSignal(dict)
+    thumbnail_ready = pyqtSignal(str)
+    printer_status = pyqtSignal(str, int, str)  # ip, port, status (from the print spooler's workers)
+    token_count_ready = pyqtSignal(object, int)  # meal start, punches counted (from the persist stage)
 
 class TimeDisplay(QLabel):
     def __init__(self, parent=None):
@@ -465,16 +470,15 @@ class TimeDisplay(QLabel):
         self.setText(f"{current_time}\n{current_date}")
 
 class AuthEventMonitor(QThread):
-    def __init__(self, communicator, device_ip=None):
+    def __init__(self, communicator, device_ip=None, scheduler=None):
         """Initialize AuthEventMonitor with comprehensive error handling"""
         super().__init__()
         self.communicator = communicator
+        self.scheduler = scheduler  # Shared MealScheduler; parks this thread between meals
         self.running = True
         self.communicator.stop_server.connect(self.stop)
-        self.start_time = datetime.now()  # Store initialization time
         self.consecutive_errors = 0  # Counter for consecutive errors
         self.max_consecutive_errors = 5  # Maximum allowed consecutive errors
-        self.last_successful_fetch = datetime.now()  # Track when we last successfully fetched events
         
         # Initialize meal_schedule and related variables to prevent AttributeError
         self.meal_schedule = []
@@ -491,13 +495,14 @@ class AuthEventMonitor(QThread):
         self.device_ip = device_ip
         self._setup_device_configuration()
         
-        # URL for access control events
-        self.url = f"http://{self.ip}:{self.port}/ISAPI/AccessControl/AcsEvent?format=json"
-        # logging.info(f"AuthEventMonitor initialized with endpoint: {self.url}")
-        # logging.info(f"Starting to monitor events from: {self.start_time}")
+        # Push-based ingestion (alertStream) with polling as the fallback
+        self.ingestion = get_ingestion_settings(self.app_settings)
         
-        # Keep track of processed events
-        self.processed_events = set()
+        # AcsEvent search, paging and de-duplication for this device
+        self.poller = AcsEventPoller(self.ip, self.port, self.username, self.password, self.device_ip,
+                                     settings=self.ingestion)
+        self.alert_listener = None
+        self.stream_retry_at = None
         
         # Add watchdog timer that will restart the monitor if no events are received for a long time
         self.watchdog_timer = QTimer()
@@ -507,8 +512,7 @@ class AuthEventMonitor(QThread):
     def _load_app_settings(self):
         """Load application settings from appSettings.json with comprehensive error handling"""
         try:
-            with open('appSettings.json', 'r', encoding='utf-8') as f:
-                self.app_settings = json.load(f)
+            self.app_settings = settings_service.get()
             
             # Get meal schedule
             canteen_menu = self.app_settings.get('CanteenMenu', {})
@@ -633,17 +637,8 @@ class AuthEventMonitor(QThread):
                         self.last_error_shown = current_time
                 return True
             
-            current_time = datetime.now().strftime('%H:%M')
-            
             # Check all meal schedule entries
-            for meal in self.meal_schedule:
-                from_time = meal.get('fromTime', '')
-                to_time = meal.get('toTime', '')
-                
-                if from_time and to_time and from_time <= current_time <= to_time:
-                    return True
-            
-            return False
+            return get_compiled_schedule(self.app_settings).is_open_at(datetime.now())
             
         except Exception as e:
             error_msg = f"Error checking time range: {str(e)}"
@@ -653,80 +648,18 @@ class AuthEventMonitor(QThread):
             # Return True to allow operation to continue despite error
             return True
 
-    def run(self):
-        """Main monitoring loop with comprehensive error handling"""
-        while self.running:
-            try:
-                # Check time range with error handling
-                try:
-                    current_in_meal_time = self.check_time_range()
-                except Exception as e:
-                    error_msg = f"Error in time range check: {str(e)}"
-                    logging.error(error_msg)
-                    self.communicator.show_error_message.emit("Time Check Error", error_msg)
-                    current_in_meal_time = True  # Default to allowing operation
-                
-                if not current_in_meal_time:
-                    # Not in meal time, wait and continue
-                    time.sleep(5)
-                    continue
-                
-                # Rest of your monitoring logic here...
-                # (Add your existing event monitoring code)
-                
-            except Exception as e:
-                error_msg = f"Critical error in monitoring loop: {str(e)}"
-                logging.error(error_msg)
-                self.communicator.show_error_message.emit("Monitor Error", error_msg)
-                
-                # Increment error counter
-                self.consecutive_errors += 1
-                
-                if self.consecutive_errors >= self.max_consecutive_errors:
-                    error_msg = f"Too many consecutive errors ({self.consecutive_errors}). Stopping monitor."
-                    logging.error(error_msg)
-                    self.communicator.show_error_message.emit("Monitor Stopped", error_msg)
-                    break
-                
-                # Wait before retrying
-                time.sleep(10)
-                
-            except KeyboardInterrupt:
-                logging.info("Monitor stopped by user")
-                break    
-    def check_time_range(self):
-        """Check if current time is within the specified meal time range"""
-        if not self.meal_schedule:
-            return True  # If no meal schedule specified, always proceed
-        
-        current_time = datetime.now().strftime('%H:%M')
-        
-        # Check all meal schedule entries
-        for meal in self.meal_schedule:
-            from_time = meal.get('fromTime', '')
-            to_time = meal.get('toTime', '')
-            
-            if from_time and to_time and from_time <= current_time <= to_time:
-                return True
-            
-        return False
-    
     def check_watchdog(self):
         """Check if we haven't received events for too long and reset if needed"""
         if not self.running:
             return
         
         # If it's been more than 10 minutes since our last successful fetch during a meal time
-        time_since_last_fetch = (datetime.now() - self.last_successful_fetch).total_seconds()
+        time_since_last_fetch = (datetime.now() - self.poller.last_successful_fetch).total_seconds()
         
         if self.check_time_range() and time_since_last_fetch > 600:  # 10 minutes
             logging.warning(f"No events received for {time_since_last_fetch} seconds during meal time. Resetting connection.")
-            # Reset the start time to now to avoid fetching old events
-            self.start_time = datetime.now()
-            # Reset consecutive errors counter
-            self.consecutive_errors = 0
-            # Update last fetch time to avoid immediate reset
-            self.last_successful_fetch = datetime.now()
+            # Search from now on and reset the error counter and fetch time
+            self.poller.reset_window()
     
     def retry_connection(self):
         """Retry establishing connection with exponential backoff"""
@@ -755,17 +688,29 @@ class AuthEventMonitor(QThread):
         
         while self.running:
             # Check if current time is within a meal time
-            current_in_meal_time = self.check_time_range()
+            if self.scheduler:
+                current_in_meal_time = self.scheduler.is_open()
+            else:
+                current_in_meal_time = self.check_time_range()
             
             # If we just entered a meal time period, update the start time
             if current_in_meal_time and not in_meal_time:
-                self.start_time = datetime.now()
+                if self.scheduler:
+                    self.poller.open_window(self.scheduler.current_window_start())
+                else:
+                    self.poller.open_window(get_meal_window_start(self.meal_schedule))
                 # logging.info(f"Entered meal time period. Updated start time to: {self.start_time}")
             
             # Update meal time status for next iteration
             in_meal_time = current_in_meal_time
             
             # If not in meal time, skip processing and sleep
+            if not current_in_meal_time and self.scheduler:
+                # Parked with no wake-ups until the scheduler opens the next meal
+                if not self.scheduler.wait_until_open(lambda: self.running):
+                    logging.info("Auth event monitoring stopping while parked")
+                    return
+                continue
             if not current_in_meal_time:
                 # Sleep for shorter intervals to respond to stop signals more quickly
                 for _ in range(6):  # 6 x 1 seconds = 6 seconds total
@@ -774,164 +719,62 @@ class AuthEventMonitor(QThread):
                         return
                     time.sleep(1)
                 continue
+            
+            # Hold the alertStream while it is healthy. When it returns (drop, timeout
+            # or end of meal) fall through to one polling pass, which searches from
+            # the event cursor and picks up anything missed around the reconnect.
+            if self.ingestion['mode'] == 'alertStream' and (
+                    self.stream_retry_at is None or datetime.now() >= self.stream_retry_at):
+                self._consume_alert_stream()
+                if not self.running:
+                    return
+                self.stream_retry_at = datetime.now() + timedelta(seconds=self.ingestion['streamRetrySeconds'])
                 
-            try:
-                # Set time range (from start time to now)
-                end_time = datetime.now() 
-                
-                # Format times with timezone
-                end_time_str = end_time.strftime('%Y-%m-%dT%H:%M:%S+05:30')
-                start_time_str = self.start_time.strftime('%Y-%m-%dT%H:%M:%S+05:30')
-                
-                # Initialize pagination variables
-                search_position = 0
-                total_matches = None
-                num_matches = 0
-                has_more_pages = True
-                processed_ids = set()  # Track processed event IDs to avoid duplicates
-                
-                # Fetch all pages of results
-                while has_more_pages and self.running:
-                    # Create payload for authentication events with current search position
-                    payload = {
-                        "AcsEventCond": {
-                            "searchID": "1",
-                            "searchResultPosition": search_position,
-                            "maxResults": 5,  # Keep batch size reasonable
-                            "major": 5,  # Access Control
-                            "minor": 0,  # Authentication passed
-                            "startTime": start_time_str,
-                            "endTime": end_time_str
-                        }
-                    }
-                    
-                    # Make the request with increased timeout
-                    # self.password = self.password.decode('utf-8')
-                    # self.password = "a1234@4321"
-                    # print({self.username})
-                    # print({self.password})
-                    response = requests.post(
-                        self.url,
-                        json=payload,
-                        auth=HTTPDigestAuth(self.username, self.password),
-                        timeout=30,  # Increased timeout from 15 to 30 seconds
-                        headers={'Content-Type': 'application/json'}
-                    )
-                    # Process successful responses
-                    if response.status_code == 200:
-                        # Reset consecutive errors on success
-                        self.consecutive_errors = 0
-                        # Update last successful fetch time
-                        self.last_successful_fetch = datetime.now()
-                        
-                        try:
-                            data = response.json()
-                            
-                            # Get pagination information if this is the first page
-                            if total_matches is None and "AcsEvent" in data and "totalMatches" in data["AcsEvent"]:
-                                total_matches = int(data["AcsEvent"]["totalMatches"])
-                                # logging.info(f"Found {total_matches} total authentication events")
-                            
-                            # Extract event information if available
-                            if "AcsEvent" in data:
-                                info_list = data["AcsEvent"].get("InfoList", [])
-                                page_events = len(info_list)
-                                
-                                # If no events were returned, we've reached the end
-                                if page_events == 0:
-                                    has_more_pages = False
-                                    break
-                                
-                                # Process each event
-                                for event in info_list:
-                                    event_time = event.get('time')
-                                    event_id = f"{event.get('employeeNoString', event.get('employeeNo', 'N/A'))}-{event_time}"
-                                    
-                                    # Check for duplicates within this batch
-                                    if event_id in processed_ids:
-                                        continue
-                                        
-                                    processed_ids.add(event_id)
-                                    
-                                    # Check if this is a new event we haven't processed yet
-                                    if event_id not in self.processed_events:
-                                        self.processed_events.add(event_id)
-                                        
-                                        # Log the new authentication event
-                                        emp_id = event.get('employeeNoString', event.get('employeeNo', 'N/A'))
-                                        name = event.get('name', 'N/A')
-                                        # logging.info(f"New authentication event: Employee ID={emp_id}, Name={name}, Time={event_time}")
-                                        
-                                        # Add source device information to the event
-                                        event['source_device_ip'] = self.device_ip
-                                        event['deviceIP'] = self.ip
-                                        
-                                        # Emit signal with event data
-                                        self.communicator.new_auth_event.emit(event)
-                                
-                                # Update number of processed events
-                                num_matches += page_events
-                                
-                                # Update search position for next page
-                                search_position += page_events
-                                
-                                # Check if we've processed all events or reached a limit
-                                if (total_matches is not None and num_matches >= total_matches) or num_matches >= 300:
-                                    has_more_pages = False
-                                    break
-                            else:
-                                # No events found in response, exit pagination loop
-                                has_more_pages = False
-                        
-                        except json.JSONDecodeError as json_err:
-                            logging.error(f"Response is not valid JSON: {json_err}")
-                            self.consecutive_errors += 1
-                            has_more_pages = False
-                    else:
-                        # Log error and increment counter
-                        logging.error(f"API request failed with status code: {response.status_code}")
-                        self.consecutive_errors += 1
-                        has_more_pages = False
-                        
-                        # If unauthorized, try to refresh credentials
-                        if response.status_code == 401:
-                            logging.warning("Authentication failed. Attempting to refresh credentials.")
-                            self.retry_connection()
-                
-                # Limit the size of processed_events to avoid memory issues
-                if len(self.processed_events) > 1000:
-                    # Keep only the most recent 500 events
-                    self.processed_events = set(list(self.processed_events)[-500:])
-                    logging.info("Pruned processed events cache to 500 entries")
-                
-            except requests.exceptions.Timeout:
-                logging.error(f"Timeout connecting to {self.ip}:{self.port}")
-                self.consecutive_errors += 1
-                time.sleep(2)  # Short sleep after timeout before retrying
-            except requests.exceptions.ConnectionError:
-                logging.error(f"Connection error for {self.ip}:{self.port}. Device may be offline or unreachable.")
-                self.consecutive_errors += 1
-                time.sleep(5)  # Longer sleep after connection error
-            except Exception as e:
-                logging.error(f"Error in monitoring loop: {e}")
-                self.consecutive_errors += 1
-            
-            # Check if we've had too many consecutive errors
-            if self.consecutive_errors >= self.max_consecutive_errors:
-                logging.warning(f"Reached {self.consecutive_errors} consecutive errors. Resetting connection...")
-                self.retry_connection()
-                self.consecutive_errors = 0  # Reset the counter
-                self.start_time = datetime.now()  # Reset start time to avoid fetching old events
-                time.sleep(10)  # Wait a bit before retrying
-            
-            # Sleep for a short period before the next check
-            time.sleep(1)
+            # Search the AcsEvent log and emit anything new
+            delay = self.poller.poll(self.communicator.new_auth_event.emit, lambda: self.running)
+            if delay:
+                time.sleep(delay)
+            
+            # Adaptive wait: short while punches are arriving, longer when the counter is quiet
+            time.sleep(self.poller.interval)
+    
+    def _consume_alert_stream(self):
+        """Receive events from the device's alertStream until it drops"""
+        self.alert_listener = AlertStreamListener(
+            self.ip, self.port, self.username, self.password,
+            read_timeout=self.ingestion['streamReadTimeout'],
+            session=self.poller.client.session
+        )
+        self.poller.last_successful_fetch = datetime.now()
+        
+        def on_event(event):
+            self.poller.consecutive_errors = 0
+            self.poller.last_successful_fetch = datetime.now()
+            if self.poller.mark_processed(event):
+                self.communicator.new_auth_event.emit(self.poller.tag_event(event))
+                self.poller.save_cursor()
+        
+        delivered = self.alert_listener.listen(on_event, lambda: self.running and self.check_time_range())
+        self.alert_listener = None
+        
+        if self.running:
+            logging.warning(f"alertStream for {self.ip}:{self.port} ended after {delivered} events, "
+                            f"polling for {self.ingestion['streamRetrySeconds']} seconds before reconnecting")
     
     def stop(self):
         """Stop the monitoring thread"""
         logging.info("Auth event monitoring stopping...")
         self.running = False
         
+        # Release the thread if it is parked between meals
+        if self.scheduler:
+            self.scheduler.notify()
+        
+        # Unblock a thread waiting on the alertStream
+        listener = self.alert_listener
+        if listener:
+            listener.close()
+        
         # Stop the watchdog timer
         if self.watchdog_timer.isActive():
             self.watchdog_timer.stop()
@@ -945,12 +788,39 @@ class AuthEventMonitor(QThread):
         
         logging.info("Auth event monitoring stopped")
 
+def get_device_credentials(url):
+    """Username and password of the device serving url (e.g. an event pictureURL)"""
+    username = USERNAME
+    password = PASSWORD
+    try:
+        device_ip = urlparse(url).hostname
+    except Exception as e:
+        logging.error(f"Error parsing URL to get device IP: {e}")
+        device_ip = None
+    # If we have device-specific credentials, use them
+    if device_ip and DEVICES and device_ip in DEVICES:
+        device_config = DEVICES[device_ip]['device']
+        username = device_config['user']
+        password = device_config['password']
+    return username, password
+
 class AuthEventItem(QFrame):
-    def __init__(self, event_data):
+    """One event card. Cards are reused by EventCardGrid: the widgets are
+    built once and set_event() re-binds them to another event."""
+
+    # (image key, label size) -> scaled QPixmap, shared by all cards
+    pixmap_cache = LruCache(64)
+
+    # Emitted from an image worker thread; delivered on the GUI thread
+    image_loaded = pyqtSignal(str, object)
+
+    def __init__(self, event_data=None):
         super().__init__()
-        self.event_data = event_data
-        # Store the minor value for authentication type
-        self.minor = event_data.get('minor', 0)
+        self.event_data = None
+        self.recognition = None
+        self.is_deleted = False
+        self.showing_employee_photo = False
+        self.image_loaded.connect(self._on_image_loaded)
         self.setStyleSheet("""
             QFrame {
                 background-color: #2c3e50;
@@ -1009,8 +879,8 @@ class AuthEventItem(QFrame):
         image_outer_layout.setAlignment(Qt.AlignCenter)
         
         # ID (previously name)
-        emp_id = event_data.get('employeeNoString', event_data.get('employeeNo', 'N/A'))
-        id_label = QLabel(f"{emp_id}")
+        id_label = QLabel()
+        self.id_label = id_label
         id_label.setStyleSheet("""
             color: white; 
             font-weight: bold; 
@@ -1024,15 +894,6 @@ class AuthEventItem(QFrame):
         info_layout = QHBoxLayout(info_widget)
         info_layout.setContentsMargins(0, 0, 0, 0)
         
-        # Get event time for date display
-        event_time = event_data.get('time', 'N/A')
-        if 'T' in event_time:
-            date_parts = event_time.split('T')[0] if 'T' in event_time else event_time
-            time_parts = event_time.split('T')[1].split('+')[0] if 'T' in event_time else ""
-        else:
-            date_parts = ""
-            time_parts = event_time
-            
         # Left column - Name
         left_column = QWidget()
         left_layout = QVBoxLayout(left_column)
@@ -1047,8 +908,8 @@ class AuthEventItem(QFrame):
             background: transparent;
         """)
 
-        name = event_data.get('name', 'N/A')
-        name_value = QLabel(name)
+        name_value = QLabel()
+        self.name_value = name_value
         name_value.setStyleSheet("color: #bdc3c7; font-size: 12px; background: transparent;")
         name_value.setWordWrap(True)
         
@@ -1068,7 +929,8 @@ class AuthEventItem(QFrame):
             font-size: 13px;
             background: transparent;
         """)
-        time_value = QLabel(time_parts)
+        time_value = QLabel()
+        self.time_value = time_value
         time_value.setStyleSheet("color: #bdc3c7; font-size: 12px; background: transparent;")
         
         middle_layout.addWidget(time_title)
@@ -1088,22 +950,8 @@ class AuthEventItem(QFrame):
             background: transparent;
         """)
 
-
-        deviceIP = event_data.get('source_device_ip')
-        def get_device_location_by_ip(deviceIP):
-            if os.path.exists('appSettings.json'):
-                with open('appSettings.json', 'r') as f:
-                    data = json.load(f)
-            for device in data.get("devices", []):
-                if device.get("ip") == deviceIP:
-                    return device.get("location", "Location not found")
-            return "N/A"
-
-        location = get_device_location_by_ip(deviceIP)
-
-        # Get location from event data - you may need to adjust the key based on your data structure
-        # location = event_data.get('location', event_data.get('deviceName', event_data.get('door', 'N/A')))
-        location_value = QLabel(location)
+        location_value = QLabel()
+        self.location_value = location_value
         location_value.setStyleSheet("color: #bdc3c7; font-size: 12px; background: transparent;")
         location_value.setWordWrap(True)
         
@@ -1120,26 +968,66 @@ class AuthEventItem(QFrame):
         layout.addWidget(id_label)
         layout.addWidget(info_widget)
         
-        # Load image if available - do this last
-        self.is_deleted = False
-        self.load_image(event_data.get('pictureURL'))    
+        if event_data:
+            self.set_event(event_data)
+
+    @staticmethod
+    def get_device_location_by_ip(deviceIP):
+        data = settings_service.get_or_default()
+        for device in data.get("devices", []):
+            if device.get("ip") == deviceIP:
+                return device.get("location", "Location not found")
+        return "N/A"
+
+    def set_event(self, event_data):
+        """Show a PunchEvent on this card"""
+        self.event_data = event_data
+        # Store the recognition mode for the authentication type image
+        self.recognition = event_data.recognition
+
+        self.id_label.setText(event_data.employee_no or 'N/A')
+        self.name_value.setText(event_data.name or 'N/A')
 
+        # Time of day for display
+        self.time_value.setText(event_data.punch_time[11:])
 
+        self.location_value.setText(self.get_device_location_by_ip(event_data.source_device_ip))
 
+        # Load image if available - do this last
+        self.showing_employee_photo = False
+        self.image_label.clear()
+        self.image_label.setStyleSheet("border: none; background: transparent;")
+        self.load_image(event_data.picture_url)
+
+    def clear_event(self):
+        self.event_data = None
+        self.image_label.clear()
+
+    def _set_scaled_pixmap(self, key, pixmap):
+        """Scale to the label and remember the result, so re-binding a card to
+        an event it has shown before costs no decoding or scaling"""
+        size = (self.image_label.width(), self.image_label.height())
+        scaled_pixmap = pixmap.scaled(size[0], size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if key:
+            AuthEventItem.pixmap_cache.put((key, size), scaled_pixmap)
+        self.image_label.setPixmap(scaled_pixmap)
+
+    def _cached_pixmap(self, key):
+        pixmap = AuthEventItem.pixmap_cache.get((key, (self.image_label.width(), self.image_label.height())))
+        if pixmap is not None:
+            self.image_label.setPixmap(pixmap)
+            return True
+        return False
 
     def load_image(self, url):
-        if self.minor == 1:  # Card authentication
+        if self.recognition is Recognition.CARD:
             try:
                 self.image_label.setText("")
+                if self._cached_pixmap("card.png"):
+                    return
                 card_pixmap = QPixmap("card.png")
                 if not card_pixmap.isNull():
-                    scaled_pixmap = card_pixmap.scaled(
-                        self.image_label.width(),
-                        self.image_label.height(),
-                        Qt.KeepAspectRatio,
-                        Qt.SmoothTransformation
-                    )
-                    self.image_label.setPixmap(scaled_pixmap)
+                    self._set_scaled_pixmap("card.png", card_pixmap)
                 else:
                     self.image_label.setText("Card Image Not Found")
                     self.image_label.setStyleSheet("color: #bdc3c7; background: transparent;")
@@ -1149,18 +1037,14 @@ class AuthEventItem(QFrame):
                 self.image_label.setStyleSheet("color: #e74c3c; background: transparent;")
             return
             
-        elif self.minor == 38:  # Fingerprint authentication
+        elif self.recognition is Recognition.FINGERPRINT:
             try:
                 self.image_label.setText("")
+                if self._cached_pixmap("fp.png"):
+                    return
                 fp_pixmap = QPixmap("fp.png")
                 if not fp_pixmap.isNull():
-                    scaled_pixmap = fp_pixmap.scaled(
-                        self.image_label.width(),
-                        self.image_label.height(),
-                        Qt.KeepAspectRatio,
-                        Qt.SmoothTransformation
-                    )
-                    self.image_label.setPixmap(scaled_pixmap)
+                    self._set_scaled_pixmap("fp.png", fp_pixmap)
                 else:
                     self.image_label.setText("FP Image Not Found")
                     self.image_label.setStyleSheet("color: #bdc3c7; background: transparent;")
@@ -1170,118 +1054,70 @@ class AuthEventItem(QFrame):
                 self.image_label.setStyleSheet("color: #e74c3c; background: transparent;")
             return
             
-        if not url or url == 'N/A':
-            self.image_label.setText("No Image")
+        # Decoded and scaled off the GUI thread when the event was ingested
+        key = self.event_data.image_key
+        thumbnail = thumbnail_cache.get(key) if key else None
+        if thumbnail is not None:
+            if not self._cached_pixmap(key):
+                self._set_scaled_pixmap(key, QPixmap.fromImage(thumbnail))
             return
             
-        # Get cached image path from parent
-        parent_window = self.parent()
-        while parent_window and not hasattr(parent_window, 'get_cached_image_path'):
-            parent_window = parent_window.parent()
-        
-        if parent_window:
-            cached_path = parent_window.get_cached_image_path(url)
-            if cached_path and os.path.exists(cached_path):
-                pixmap = QPixmap(cached_path)
-                scaled_pixmap = pixmap.scaled(
-                    self.image_label.width(),
-                    self.image_label.height(),
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                )
-                self.image_label.setPixmap(scaled_pixmap)
+        # Picture delivered inline by the alertStream
+        if self.event_data.picture_data:
+            if self._cached_pixmap(key):
                 return
-        
-        # Fallback to original download method
-        self._fetch_image(url)
-
-    
-    def _fetch_image(self, url):
-        try:
-            if hasattr(self, 'is_deleted') and self.is_deleted:
+            pixmap = QPixmap()
+            if pixmap.loadFromData(self.event_data.picture_data):
+                self._set_scaled_pixmap(key, pixmap)
                 return
-                
-            # Generate unique filename for this image
-            unique_id = str(uuid.uuid4())
-            filename = os.path.join(TEMP_DIR, f"image_{unique_id}.jpg")
             
-            # Find appropriate credentials for authentication
-            # Extract device IP from URL if possible
-            device_ip = None
-            if url and "://" in url:
-                try:
-                    from urllib.parse import urlparse
-                    parsed_url = urlparse(url)
-                    device_ip = parsed_url.netloc.split(':')[0]
-                except Exception as e:
-                    logging.error(f"Error parsing URL to get device IP: {e}")
-            
-            # Get authentication credentials
-            username = USERNAME
-            password = PASSWORD
-            
-            # If we have device-specific credentials, use them
-            if device_ip and DEVICES and device_ip in DEVICES:
-                device_config = DEVICES[device_ip]['device']
-                username = device_config['user']
-                password = device_config['password']
-                # logging.info(f"Using device-specific credentials for {device_ip} to fetch image")
-            
-            # Use requests with digest authentication
-            response = requests.get(
-                url,
-                auth=HTTPDigestAuth(username, password),
-                timeout=10
-            )
+        if not url:
+            if not self._show_employee_photo():
+                self.image_label.setText("No Image")
+            return
+        
+        if self._cached_pixmap(url):
+            return
             
-            if response.status_code == 200:
-                # Check if widget still exists
-                if hasattr(self, 'is_deleted') and self.is_deleted:
-                    return
-                
-                # Save image to temp directory
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
-                
-                # Load the image from file
-                pixmap = QPixmap(filename)
-                
-                # Check if widget still exists
-                if hasattr(self, 'is_deleted') and self.is_deleted:
-                    return
-                
-                # Scale pixmap to fit the current label size (which is now responsive)
-                scaled_pixmap = pixmap.scaled(
-                    self.image_label.width(),
-                    self.image_label.height(),
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                )
-                
-                # Check if widget still exists
-                if hasattr(self, 'is_deleted') and self.is_deleted:
-                    return
-                    
-                self.image_label.setPixmap(scaled_pixmap)
-            else:
-                # Check if widget still exists
-                if hasattr(self, 'is_deleted') and self.is_deleted:
-                    return
-                    
-                print(f"Error fetching image: HTTP Status {response.status_code}")
-                self.image_label.setText(f"Error {response.status_code}")
-                self.image_label.setStyleSheet("color: white; background-color: #1f2937; border-radius: 4px;")
-                
-        except RuntimeError as e:
-            # QLabel has been deleted, just ignore
-            print(f"Ignoring RuntimeError: {e}")
+        # From the disk cache, or downloaded in the background; meanwhile the
+        # employee's enrolled photo (if synced) is shown
+        if not self._show_employee_photo():
+            self.image_label.setText("Loading...")
+            self.image_label.setStyleSheet("color: #bdc3c7; background: transparent;")
+        username, password = get_device_credentials(url)
+        cached_path = get_image_cache().fetch(url, lambda path: self._emit_image_loaded(url, path), username, password)
+        if cached_path:
+            self.image_label.setStyleSheet("border: none; background: transparent;")
+            self._set_scaled_pixmap(url, QPixmap(cached_path))
+
+    def _show_employee_photo(self):
+        """Show the enrolled photo synced from the readers; False if there is none"""
+        self.showing_employee_photo = False
+        employee_no = self.event_data.employee_no
+        key = ('employee', employee_no)
+        if not self._cached_pixmap(key):
+            path = get_employee_photos().path_for(employee_no)
+            if not path:
+                return False
+            self._set_scaled_pixmap(key, QPixmap(path))
+        self.showing_employee_photo = True
+        return True
+
+    def _emit_image_loaded(self, url, path):
+        try:
+            self.image_loaded.emit(url, path)
+        except RuntimeError:
+            pass  # Card deleted while the image was downloading
+
+    def _on_image_loaded(self, url, path):
+        # The card may have been re-bound to another event meanwhile
+        if self.is_deleted or not self.event_data or self.event_data.picture_url != url:
             return
-        except Exception as e:
-            # Check if widget still exists
-            if hasattr(self, 'is_deleted') and self.is_deleted:
-                return
-                
-            print(f"Error fetching image: {e}")
+        if path:
+            self.image_label.setText("")
+            self.image_label.setStyleSheet("border: none; background: transparent;")
+            self._set_scaled_pixmap(url, QPixmap(path))
+        elif not self.showing_employee_photo:
             self.image_label.setText("Error")
             self.image_label.setStyleSheet("color: white; background-color: #1f2937; border-radius: 4px;")
             
@@ -1294,12 +1130,14 @@ class EzeeCanteen(QMainWindow):
     def __init__(self):
         super().__init__()
         self.initial_settings = {}
-        self.image_cache = {}  # url -> local_file_path mapping
 
         # Try to load existing settings first to preserve any settings we're not modifying
         if os.path.exists('appSettings.json'):
-            with open('appSettings.json', 'r') as f:
-                self.initial_settings = json.load(f)
+            self.initial_settings = settings_service.get()
+        # Pick up edits from the settings screens without re-reading the file per punch
+        settings_service.watch(self)
+        # Load the license once, in the background, instead of per punch
+        license_context.prime()
         
         canteenMenu = self.initial_settings.get('CanteenMenu')
         mode = canteenMenu.get('currentMode')
@@ -1319,8 +1157,9 @@ class EzeeCanteen(QMainWindow):
         self.current_date = datetime.now().date()
 
         self.communicator = Communicator()
-        self.events = []
+        self.communicator.token_count_ready.connect(self.on_token_count_ready)
         self.max_events = 21  # Increased maximum number of events to 18
+        self.event_model = EventListModel(max_events=self.max_events, key=punch_sort_key)
         self.token_counter = 0  # Initialize token counter                   
         self.last_meal_from_time = None  # Track meal time changes
         self.settings_mode = False  # Flag to indicate if we're in settings mode
@@ -1343,44 +1182,29 @@ class EzeeCanteen(QMainWindow):
         QTimer.singleShot(100, self.delayed_initialization)
     
     
-    def get_cached_image_path(self, url):
-        """Get cached image path or download if not cached"""
-        if url in self.image_cache:
-            cached_path = self.image_cache[url]
-            if os.path.exists(cached_path):
-                return cached_path
-        
-        # Download and cache
-        unique_id = str(uuid.uuid4())
-        filename = os.path.join(TEMP_DIR, f"image_{unique_id}.jpg")
-        
-        # Download logic here...
-        # After successful download:
-        self.image_cache[url] = filename
-        return filename
-
-    def initialize_token_counter(self):
-        """Initialize token counter based on existing punches during current meal time"""
+    def initialize_token_counter(self, until=None):
+        """Initialize token counter based on existing punches during current meal time.
+
+        Punches before until (default now) are counted from the database;
+        tokens issued from then on are counted as they print.
+        """
+        self.token_count_meal = None
         try:
-            # Get current time
-            current_time = datetime.now().strftime('%H:%M')
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            
             # Determine current meal time
             current_meal_from_time = None
             current_meal_to_time = None
+            meal_bounds = None
             
             # Check if CurrMealTime exists and is not empty
             if hasattr(self, 'CurrMealTime') and self.CurrMealTime:
-                for meal in self.CurrMealTime:
-                    from_time = meal.get('fromTime', '')
-                    to_time = meal.get('toTime', '')
-                    
-                    if from_time and to_time and from_time <= current_time <= to_time:
-                        current_meal_from_time = from_time
-                        current_meal_to_time = to_time
-                        logging.info(f"Current meal time: {from_time} to {to_time}")
-                        break
+                compiled = get_compiled_schedule(self.initial_settings)
+                meal = compiled.lookup(datetime.now())
+                if meal:
+                    current_meal_from_time = meal.from_time
+                    current_meal_to_time = meal.to_time
+                    # Full datetimes, so a window that runs past midnight spans both dates
+                    meal_bounds = compiled.window_bounds()
+                    logging.info(f"Current meal time: {meal.from_time} to {meal.to_time}")
             else:
                 # If no meal schedule is configured, check if we're in device mode
                 canteenMenu = self.initial_settings.get('CanteenMenu', {})
@@ -1406,91 +1230,13 @@ class EzeeCanteen(QMainWindow):
                 self.update_title_counter()
                 return
             
-            # Get license key for database query
-            license_key = ""
-            try:
-                license_manager = LicenseManager()
-                
-                def get_license_data():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        license_data = loop.run_until_complete(license_manager.get_license_db())
-                        return license_data
-                    finally:
-                        loop.close()
-                
-                license_data = get_license_data()
-                if license_data and 'LicenseKey' in license_data:
-                    license_key = license_data['LicenseKey']
-                    # logging.info(f"Retrieved license key for token counter: {license_key}")
-            except Exception as e:
-                logging.error(f"Error getting license key: {e}")
-            
-            # Query database for punches during current meal time
-            punch_count = 0
-            try:
-                conn = mysql.connector.connect(
-                    host=DB_HOST,
-                    user=DB_USER,
-                    port=DB_PORT,
-                    password=DB_PASS,
-                    database=DB_NAME,
-                    connection_timeout=5
-                )
-                
-                cursor = conn.cursor()
-                
-                # Create datetime strings for the current meal period
-                meal_start_datetime = f"{current_date} {current_meal_from_time}:00"
-                meal_end_datetime = f"{current_date} {current_meal_to_time}:59"
-                
-                # Query to count punches during current meal time
-                if license_key:
-                    # Query with license key filter
-                    sql = f"""
-                        SELECT COUNT(*) as punch_count 
-                        FROM {DB_TABLE} 
-                        WHERE PunchDateTime >= %s 
-                        AND PunchDateTime <= %s 
-                        AND LicenseKey = %s
-                        AND DATE(PunchDateTime) = %s
-                        AND CanteenMode = 'timeBase'
-                    """
-                    cursor.execute(sql, (meal_start_datetime, meal_end_datetime, license_key, current_date))
-                else:
-                    # Fallback query without license key
-                    sql = f"""
-                        SELECT COUNT(*) as punch_count 
-                        FROM {DB_TABLE} 
-                        WHERE PunchDateTime >= %s 
-                        AND PunchDateTime <= %s 
-                        AND DATE(PunchDateTime) = %s
-                        AND CanteenMode = 'timeBase'
-                    """
-                    cursor.execute(sql, (meal_start_datetime, meal_end_datetime, current_date))
-                
-                result = cursor.fetchone()
-                punch_count = result[0] if result else 0
-                
-                cursor.close()
-                conn.close()
-                
-                logging.info(f"Found {punch_count} existing punches for current meal time ({current_meal_from_time} - {current_meal_to_time})")
-                
-            except mysql.connector.Error as err:
-                logging.error(f"Database error while fetching punch count: {err}")
-                punch_count = 0
-            except Exception as e:
-                logging.error(f"Unexpected error fetching punch count: {e}")
-                punch_count = 0
-            
-            # Set token counter to existing punch count
-            self.token_counter = punch_count
-            logging.info(f"Token counter initialized to {self.token_counter}")
-            
-            # Update title with current counter
+            # Count this meal's punches on the persist stage, off the GUI thread;
+            # the result comes back through token_count_ready and is added to
+            # the tokens issued meanwhile
+            self.token_counter = 0
+            self.token_count_meal = meal_bounds[0]
             self.update_title_counter()
+            self.get_punch_pipeline().submit('persist', self.count_meal_punches, meal_bounds, until or datetime.now())
             
         except Exception as e:
             logging.error(f"Error initializing token counter: {e}")
@@ -1498,23 +1244,80 @@ class EzeeCanteen(QMainWindow):
             if hasattr(self, 'update_title_counter'):
                 self.update_title_counter()
                 
+    def count_meal_punches(self, meal_bounds, until):
+        """Count punches from the meal start up to until (runs on the persist stage)"""
+        punch_count = 0
+        try:
+            license_key = get_license_key()
+            conn = mysql.connector.connect(
+                host=DB_HOST,
+                user=DB_USER,
+                port=DB_PORT,
+                password=DB_PASS,
+                database=DB_NAME,
+                connection_timeout=self.get_punch_pipeline().timeout('persist')
+            )
+            cursor = conn.cursor()
+            
+            meal_start_datetime = meal_bounds[0].strftime('%Y-%m-%d %H:%M:%S')
+            meal_end_datetime = min(meal_bounds[1], until).strftime('%Y-%m-%d %H:%M:%S')
+            
+            if license_key:
+                sql = f"""
+                    SELECT COUNT(*) as punch_count 
+                    FROM {DB_TABLE} 
+                    WHERE PunchDateTime >= %s 
+                    AND PunchDateTime < %s 
+                    AND LicenseKey = %s
+                    AND CanteenMode = 'timeBase'
+                """
+                cursor.execute(sql, (meal_start_datetime, meal_end_datetime, license_key))
+            else:
+                # Fallback query without license key
+                sql = f"""
+                    SELECT COUNT(*) as punch_count 
+                    FROM {DB_TABLE} 
+                    WHERE PunchDateTime >= %s 
+                    AND PunchDateTime < %s 
+                    AND CanteenMode = 'timeBase'
+                """
+                cursor.execute(sql, (meal_start_datetime, meal_end_datetime))
+            
+            result = cursor.fetchone()
+            punch_count = result[0] if result else 0
+            
+            cursor.close()
+            conn.close()
+            
+            logging.info(f"Found {punch_count} existing punches for current meal time ({meal_start_datetime} - {meal_end_datetime})")
+            
+        except mysql.connector.Error as err:
+            logging.error(f"Database error while fetching punch count: {err}")
+        except Exception as e:
+            logging.error(f"Unexpected error fetching punch count: {e}")
+        
+        self.communicator.token_count_ready.emit(meal_bounds[0], punch_count)
+
+    def on_token_count_ready(self, meal_start, punch_count):
+        """Add the counted punches to the token counter (GUI thread)"""
+        if meal_start != getattr(self, 'token_count_meal', None):
+            return  # A newer meal started while the count ran
+        self.token_counter += punch_count
+        logging.info(f"Token counter initialized to {self.token_counter}")
+        self.update_title_counter()
+
     def get_current_meal_info(self):
         """Get current meal information including from/to times"""
         try:
-            current_time = datetime.now().strftime('%H:%M')
-            
-            for meal in self.CurrMealTime:
-                from_time = meal.get('fromTime', '')
-                to_time = meal.get('toTime', '')
-                meal_type = meal.get('mealType', 'MEAL')
-                
-                if from_time and to_time and from_time <= current_time <= to_time:
-                    return {
-                        'fromTime': from_time,
-                        'toTime': to_time,
-                        'mealType': meal_type,
-                        'inMealTime': True
-                    }
+            meal = get_compiled_schedule(self.initial_settings).lookup(datetime.now())
+            
+            if meal and self.CurrMealTime:
+                return {
+                    'fromTime': meal.from_time,
+                    'toTime': meal.to_time,
+                    'mealType': meal.meal_type or 'MEAL',
+                    'inMealTime': True
+                }
             
             return {
                 'fromTime': None,
@@ -1531,7 +1334,7 @@ class EzeeCanteen(QMainWindow):
                 'inMealTime': False
             }
 
-    def reset_token_counter_for_new_meal(self):
+    def reset_token_counter_for_new_meal(self, until=None):
         """Reset token counter when entering a new meal time"""
         try:
             current_meal = self.get_current_meal_info()
@@ -1542,7 +1345,7 @@ class EzeeCanteen(QMainWindow):
                 current_meal['inMealTime']):
                 
                 logging.info(f"Entered new meal time: {current_meal['fromTime']} - {current_meal['toTime']}")
-                self.initialize_token_counter()
+                self.initialize_token_counter(until)
             
             # Update last meal time
             self.last_meal_from_time = current_meal['fromTime']
@@ -1560,10 +1363,8 @@ class EzeeCanteen(QMainWindow):
         # Initialize token counter based on current meal time punches
         self.initialize_token_counter()
 
-        # Set up timer to periodically check printer connections
-        self.printer_check_timer = QTimer(self)
-        self.printer_check_timer.timeout.connect(self.test_printer_connections)
-        self.printer_check_timer.start(60000)  # Check every 60 seconds
+        # Print tokens the print journal still owes from the last run
+        get_print_spooler()
     
     def initialize_devices(self):
         """Initialize all configured authentication devices and their printers"""
@@ -1634,16 +1435,19 @@ class EzeeCanteen(QMainWindow):
             # Log the device-to-printer mapping
             # logging.info(f"Device {device_ip} mapped to printer {printer_config['ip']}:{printer_config.get('port', 9100)}")
         
-        # Connect the signal to handle authentication events
-        self.communicator.new_auth_event.connect(self.add_auth_event)
+        # Slip header, footer and logo for every device's printer
+        self.load_slip_settings()
+        
+        # Route authentication events through the bounded UI queue
+        self.start_event_queue()
         
         # Start a worker thread to initialize device details
         self.device_init_worker = DeviceInitWorker(self, DEVICES)
         self.device_init_worker.finished.connect(self.on_device_init_finished)
         self.device_init_worker.start()
         
-        # Test printer connections in the background
-        QTimer.singleShot(500, self.test_printer_connections)
+        # Printer status comes from the spooler's background health checks
+        self.start_printer_monitor()
 
     def on_device_init_finished(self):
         """Called when device initialization completes"""
@@ -1660,6 +1464,16 @@ class EzeeCanteen(QMainWindow):
             # logging.info("Initializing active_devices dictionary")
             self.active_devices = {}
             
+        # One asyncio engine drives every reader unless the thread-per-device
+        # monitors are selected with EventIngestion.engine = "threads"
+        use_engine = get_engine_settings(self.initial_settings)['engine'] == 'asyncio'
+        if use_engine and not getattr(self, 'ingestion_engine', None):
+            self.ingestion_engine = IngestionEngine(
+                self.communicator.new_auth_event.emit,
+                self.initial_settings,
+                self.get_meal_scheduler()
+            )
+            
         # Process each device
         for device_ip, info in worker.device_info.items():
             device_config = info['device_config']
@@ -1671,21 +1485,161 @@ class EzeeCanteen(QMainWindow):
                 self.device_serial = device_serial
                 self.device_mac = device_mac
             
-            # Start authentication event monitor for this device
-            auth_monitor = AuthEventMonitor(self.communicator, device_ip)
-            auth_monitor.start()
+            auth_monitor = None
+            if use_engine:
+                # Adding a reader costs one coroutine on the engine loop
+                channel = self.ingestion_engine.add_device(device_ip, device_config)
+                self.get_backfill_manager().attach(channel.poller)
+            else:
+                # Start authentication event monitor for this device
+                auth_monitor = AuthEventMonitor(self.communicator, device_ip, self.get_meal_scheduler())
+                self.get_backfill_manager().attach(auth_monitor.poller)
+                auth_monitor.start()
+            
+            # Re-open the device session just before each meal
+            client = get_device_client(device_config['ip'], device_config['port'],
+                                       device_config['user'], device_config['password'])
+            self.get_meal_scheduler().add_warmup(device_ip, client.warm_up)
             
             # Store monitor in active devices
             self.active_devices[device_ip] = {
                 'monitor': auth_monitor,
+                'config': device_config,
                 'serial': device_serial,
                 'mac': device_mac
             }
             
             # logging.info(f"Started monitor for device {device_ip}:{device_config['port']} with serial {device_serial}")
         
+        if use_engine:
+            self.ingestion_engine.start()
+        
+        # Copy enrolled faces from the readers for the display's first paint
+        self.start_employee_photo_sync()
+        
         # Clean up
         self.device_init_worker = None
+    
+    def start_employee_photo_sync(self):
+        """Keep the local employee photo store in step with the readers' enrolled faces"""
+        if getattr(self, 'employee_photo_sync', None):
+            return
+        self.employee_photo_sync = EmployeePhotoSync(
+            get_employee_photos(),
+            lambda: {ip: info['config'] for ip, info in list(self.active_devices.items())},
+            self.initial_settings,
+            self.get_meal_scheduler()
+        )
+        self.employee_photo_sync.start()
+    
+    def get_meal_scheduler(self):
+        """Shared scheduler that parks every reader between meal windows"""
+        if not getattr(self, 'meal_scheduler', None):
+            self.meal_scheduler = MealScheduler(self.initial_settings)
+            self.meal_scheduler.start()
+            settings_service.add_listener(self.meal_scheduler.reload)
+        return self.meal_scheduler
+    
+    def start_event_queue(self):
+        """Queue auth events from every ingestion thread; the UI drains them on a timer"""
+        if getattr(self, 'event_queue', None):
+            return
+        self.event_queue = EventQueue(self.initial_settings)
+        
+        # DirectConnection: ingest_event() runs on the emitting thread and
+        # returns at once, so nothing piles up in Qt's own event queue
+        self.get_image_prefetcher()
+        self.communicator.new_auth_event.connect(self.ingest_event, Qt.DirectConnection)
+        
+        self.event_queue_timer = QTimer(self)
+        self.event_queue_timer.timeout.connect(self.drain_event_queue)
+        self.event_queue_timer.start(self.event_queue.settings['drainIntervalMs'])
+    
+    def ingest_event(self, event):
+        """On the ingestion thread: parse the device JSON once, start the photo, queue it for the UI"""
+        try:
+            record = PunchEvent.from_device(event)
+        except Exception as e:
+            logging.error(f"Could not parse auth event {event}: {e}")
+            return
+        if record.recognition is Recognition.UNKNOWN:
+            return  # Not a punch the canteen handles
+        self.image_prefetcher.prefetch(record)
+        self.event_queue.put(record)
+    
+    def drain_event_queue(self):
+        """Handle the next few queued events, taking devices in turn"""
+        cutoff = None
+        for event_data in self.event_queue.get_batch():
+            try:
+                record = PunchEvent.of(event_data)
+                if record is not event_data:
+                    # Read back from the spill file (device JSON again), possibly
+                    # from an earlier meal or day: only recorded, never printed, once stale
+                    cutoff = cutoff or replay_cutoff(settings_service.get_or_default())
+                    if record.time < cutoff and not record.backfilled:
+                        logging.info(f"Recording stale spilled punch for {record.employee_no} at {record.punch_time}")
+                        record = record._replace(backfilled=True)
+                self.add_auth_event(record)
+            except Exception as e:
+                logging.error(f"Error handling queued auth event: {e}")
+    
+    def get_image_prefetcher(self):
+        """Starts each punch's photo download at ingestion, ahead of the UI"""
+        if not getattr(self, 'image_prefetcher', None):
+            settings = get_image_cache_settings(self.initial_settings)
+            self.image_prefetcher = ImagePrefetcher(
+                get_device_credentials,
+                self.communicator.thumbnail_ready.emit,
+                max_wait_ms=int(settings['prefetchWaitMs'])
+            )
+            self.awaiting_photo = {}  # image key -> events held back until it is ready
+            self.communicator.thumbnail_ready.connect(self.release_events)
+        return self.image_prefetcher
+    
+    def show_event(self, event_data):
+        """Put an event on the grid, holding it back briefly while its photo is still loading"""
+        key = event_data.image_key
+        prefetcher = getattr(self, 'image_prefetcher', None)
+        # No need to wait when the enrolled photo can be shown straight away
+        if key and prefetcher and prefetcher.is_pending(key) and \
+                not get_employee_photos().has(event_data.employee_no):
+            self.awaiting_photo.setdefault(key, []).append(event_data)
+            QTimer.singleShot(prefetcher.max_wait_ms, lambda: self.release_events(key))
+            return
+        self.event_model.add_event(event_data)
+        self.schedule_render()
+    
+    def release_events(self, key):
+        """Photo ready (or waited long enough): show the events held back for it"""
+        for event_data in self.awaiting_photo.pop(key, []):
+            self.event_model.add_event(event_data)
+            self.schedule_render()
+    
+    def get_punch_pipeline(self):
+        """Worker stages for DB inserts, token printing and device updates"""
+        if not getattr(self, 'punch_pipeline', None):
+            self.punch_pipeline = PunchPipeline(self.initial_settings)
+        return self.punch_pipeline
+    
+    def get_backfill_manager(self):
+        """Shared outage backfill; recovered events come back through new_auth_event"""
+        if not getattr(self, 'backfill_manager', None):
+            self.backfill_manager = BackfillManager(self.communicator.new_auth_event.emit, self.initial_settings)
+        return self.backfill_manager
+    
+    def stop_ingestion_engine(self):
+        """Stop the shared ingestion engine if it is running"""
+        engine = getattr(self, 'ingestion_engine', None)
+        if engine:
+            engine.stop()
+            self.ingestion_engine = None
+            logging.info("Stopped ingestion engine")
+        
+        backfill_manager = getattr(self, 'backfill_manager', None)
+        if backfill_manager:
+            backfill_manager.stop()
+            self.backfill_manager = None
 
     def setup_single_device_monitor(self):
         """Set up a single device monitor using default configuration"""
@@ -1727,12 +1681,11 @@ class EzeeCanteen(QMainWindow):
                     # logging.info(f"Using printer from database: {self.printer_ip}:{self.printer_port}")
                 else:
                     # If no printer found in DB, fall back to app settings
-                    with open('appSettings.json', 'r') as f:
-                        app_settings = json.load(f)
-                        printer_config = app_settings.get('PrinterConfig', {})
-                        self.printer_ip = printer_config.get('IP', "192.168.0.253")
-                        self.printer_port = printer_config.get('Port', 9100)
-                        logging.info(f"No printer in DB, using from appSettings: {self.printer_ip}:{self.printer_port}")
+                    app_settings = settings_service.get()
+                    printer_config = app_settings.get('PrinterConfig', {})
+                    self.printer_ip = printer_config.get('IP', "192.168.0.253")
+                    self.printer_port = printer_config.get('Port', 9100)
+                    logging.info(f"No printer in DB, using from appSettings: {self.printer_ip}:{self.printer_port}")
                 
                 cursor.close()
                 conn.close()
@@ -1743,12 +1696,11 @@ class EzeeCanteen(QMainWindow):
             # Fall back to appSettings.json if database fetch fails
             logging.error(f"Error fetching printer from database: {e}")
             try:
-                with open('appSettings.json', 'r') as f:
-                    app_settings = json.load(f)
-                    printer_config = app_settings.get('PrinterConfig', {})
-                    self.printer_ip = printer_config.get('IP', "192.168.0.253")
-                    self.printer_port = printer_config.get('Port', 9100)
-                    logging.info(f"Falling back to printer from appSettings: {self.printer_ip}:{self.printer_port}")
+                app_settings = settings_service.get()
+                printer_config = app_settings.get('PrinterConfig', {})
+                self.printer_ip = printer_config.get('IP', "192.168.0.253")
+                self.printer_port = printer_config.get('Port', 9100)
+                logging.info(f"Falling back to printer from appSettings: {self.printer_ip}:{self.printer_port}")
             except Exception as app_err:
                 # Absolute fallback to hardcoded values
                 logging.error(f"Error loading printer settings from appSettings.json: {app_err}")
@@ -1756,171 +1708,100 @@ class EzeeCanteen(QMainWindow):
                 self.printer_port = 9100  # Default port
                 logging.warning(f"Using hardcoded printer settings: {self.printer_ip}:{self.printer_port}")
         
-        # Test printer availability
-        self.test_printer_connection()
+        # Printer status comes from the spooler's background health checks
+        self.start_printer_monitor()
+        self.load_printer_config()
         
         # Start authentication event monitor thread
-        self.auth_monitor = AuthEventMonitor(self.communicator)
-        self.communicator.new_auth_event.connect(self.add_auth_event)
+        self.auth_monitor = AuthEventMonitor(self.communicator, None, self.get_meal_scheduler())
+        self.get_backfill_manager().attach(self.auth_monitor.poller)
+        self.start_event_queue()
         self.auth_monitor.start()
         
-        # Load header/footer settings from appSettings.json if available
+        self.load_slip_settings()
+
+    def load_slip_settings(self):
+        """Load the slip header, footer, logo and special message from appSettings.json"""
         try:
-            with open('appSettings.json', 'r') as f:
-                app_settings = json.load(f)
-                printer_config = app_settings.get('PrinterConfig', {})
-                self.header = printer_config.get('Header', {'enable': True, 'text': "EzeeCanteen"})
-                self.footer = printer_config.get('Footer', {'enable': True, 'text': "Thank you!"})
-                self.special_message = app_settings.get('CanteenMenu', {}).get('SpecialMessage', "")
+            app_settings = settings_service.get()
+            printer_config = app_settings.get('PrinterConfig', {})
+            self.header = printer_config.get('Header', {'enable': True, 'text': "EzeeCanteen"})
+            self.footer = printer_config.get('Footer', {'enable': True, 'text': "Thank you!"})
+            self.logo = printer_config.get('Logo', {'enable': False, 'path': ''})
+            self.special_message = app_settings.get('CanteenMenu', {}).get('SpecialMessage', "")
         except Exception as e:
             logging.error(f"Error loading header/footer settings: {e}")
             self.header = {'enable': True, 'text': "EzeeCanteen"}
             self.footer = {'enable': True, 'text': "Thank you!"}
+            self.logo = None
     
-    def test_printer_connections(self):
-        """Test all configured printer connections"""
-        # Create a worker thread to test printer connections
-        class PrinterTestWorker(QThread):
-            def __init__(self, parent, device_printers=None, legacy_ip=None, legacy_port=None):
-                super().__init__(parent)
-                self.device_printers = device_printers
-                self.legacy_ip = legacy_ip
-                self.legacy_port = legacy_port
-                self.results = {}
-                self.legacy_result = False
-                
-            def run(self):
-                if not self.device_printers:
-                    # Legacy mode - test the single printer
-                    self.legacy_result = self.test_single_printer(self.legacy_ip, self.legacy_port)
-                    return
-                    
-                # Get unique printer IPs to avoid testing the same printer multiple times
-                unique_printers = {}
-                for device_ip, printer in self.device_printers.items():
-                    printer_key = f"{printer['ip']}:{printer['port']}"
-                    if printer_key not in unique_printers:
-                        unique_printers[printer_key] = {
-                            'ip': printer['ip'],
-                            'port': printer['port'],
-                            'devices': []
-                        }
-                    unique_printers[printer_key]['devices'].append(device_ip)
-                
-                # Test each unique printer
-                # logging.info(f"Testing {len(unique_printers)} unique printer connections")
-                for printer_key, printer_info in unique_printers.items():
-                    try:
-                        # Check printer connection with short timeout
-                        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        s.settimeout(0.5)  # 0.5 second timeout for faster checks
-                        result = s.connect_ex((printer_info['ip'], printer_info['port']))
-                        s.close()
-                        
-                        available = (result == 0)
-                        
-                        # Store result for each device using this printer
-                        for device_ip in printer_info['devices']:
-                            self.results[device_ip] = available
-                        
-                        
-                    except Exception as e:
-                        # Handle socket errors gracefully
-                        logging.error(f"Error testing printer {printer_info['ip']}:{printer_info['port']}: {e}")
-                        for device_ip in printer_info['devices']:
-                            self.results[device_ip] = False
-            
-            def test_single_printer(self, ip, port):
-                """Test a single printer connection"""
-                try:
-                    # Check printer connection with timeout
-                    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    s.settimeout(1)  # 1 second timeout
-                    result = s.connect_ex((ip, port))
-                    s.close()
-                    
-                    available = (result == 0)
-                    if available:
-                        logging.info(f"Printer connection successful ({ip}:{port})")
-                    else:
-                        logging.warning(f"Printer connection failed ({ip}:{port})")
-                    return available
-                except Exception as e:
-                    logging.error(f"Error testing printer connection: {e}")
-                    return False
-        
-        # Determine which mode we're in
-        if not self.device_printers:
-            # Legacy mode - get printer info
-            try:
-                if not hasattr(self, 'printer_ip') or not hasattr(self, 'printer_port'):
-                    try:
-                        with open('appSettings.json', 'r') as f:
-                            app_settings = json.load(f)
-                            printer_config = app_settings.get('PrinterConfig', {})
-                            self.printer_ip = printer_config.get('IP', "192.168.0.253")
-                            self.printer_port = printer_config.get('Port', 9100)
-                            self.header = printer_config.get('Header', {'enable': True, 'text': "EzeeCanteen"})
-                            self.footer = printer_config.get('Footer', {'enable': True, 'text': "Thank you!"})
-                            logging.info(f"Loaded printer config: IP={self.printer_ip}, Port={self.printer_port}")
-                    except Exception as e:
-                        self.printer_ip = "192.168.0.253"
-                        self.printer_port = 9100
-                        self.header = {'enable': True, 'text': "EzeeCanteen"}
-                        self.footer = {'enable': True, 'text': "Thank you!"}
-                        logging.error(f"Error loading printer settings: {e}")
-                        
-                    # Create and start worker for legacy mode
-                    self.printer_test_worker = PrinterTestWorker(self, None, self.printer_ip, self.printer_port)
-                    self.printer_test_worker.finished.connect(self.on_legacy_printer_test_finished)
-                    self.printer_test_worker.start()
-            except Exception as e:
-                logging.error(f"Error setting up printer test: {e}")
-                self.printer_available = False
-        else:
-            # Modern mode with multiple devices
-            self.printer_test_worker = PrinterTestWorker(self, self.device_printers)
-            self.printer_test_worker.finished.connect(self.on_printer_test_finished)
-            self.printer_test_worker.start()
-
-    def on_printer_test_finished(self):
-        """Process results from printer test worker"""
-        worker = self.printer_test_worker
-        
-        # Update availability for each device's printer
-        for device_ip, available in worker.results.items():
-            if device_ip in self.device_printers:
-                self.device_printers[device_ip]['available'] = available
-        
-        # Clean up
-        self.printer_test_worker = None
-
-    def on_legacy_printer_test_finished(self):
-        """Process results from legacy printer test worker"""
-        worker = self.printer_test_worker
-        
-        # Update legacy printer availability
-        self.printer_available = worker.legacy_result
-        
-        # Clean up
-        self.printer_test_worker = None
-    
-    def test_printer_connection(self):
-        """Legacy method to test single printer connection"""
+    def start_printer_monitor(self):
+        """Follow every configured printer's status through the print spooler"""
+        spooler = get_print_spooler()
+        if not getattr(self, 'printer_status_listener', None):
+            self.communicator.printer_status.connect(self.on_printer_status)
+            self.printer_status_listener = self.communicator.printer_status.emit
+            spooler.add_status_listener(self.printer_status_listener)
+        for printer in self.device_printers.values():
+            spooler.watch(printer['ip'], printer['port'])
+        if not self.device_printers and getattr(self, 'printer_ip', None):
+            spooler.watch(self.printer_ip, self.printer_port)
+        self.update_printer_status_label()
+
+    def stop_printer_monitor(self):
+        listener = getattr(self, 'printer_status_listener', None)
+        if listener:
+            get_print_spooler().remove_status_listener(listener)
+            self.communicator.printer_status.disconnect(self.on_printer_status)
+            self.printer_status_listener = None
+
+    def on_printer_status(self, ip, port, status):
+        """A printer's status changed (GUI thread, via Communicator.printer_status).
+        A device's printer counts as available while it or another printer of its group can print"""
+        spooler = get_print_spooler()
+        for printer in self.device_printers.values():
+            printer['available'] = spooler.available(printer['ip'], printer['port'])
+        if not self.device_printers and getattr(self, 'printer_ip', None):
+            self.printer_available = spooler.available(self.printer_ip, self.printer_port)
+        self.update_printer_status_label()
+
+    def update_printer_status_label(self):
+        """Show the worst printer status in the header"""
+        label = getattr(self, 'printer_status_label', None)
+        if label is None or sip.isdeleted(label):
+            return
+        spooler = get_print_spooler()
+        printers = {(printer['ip'], int(printer['port'])): printer.get('name') or printer['ip']
+                    for printer in self.device_printers.values()}
+        if not printers and getattr(self, 'printer_ip', None):
+            printers[(self.printer_ip, int(self.printer_port))] = self.printer_ip
+        if not printers:
+            label.hide()
+            return
+        statuses = [(STATUS_SEVERITY[status], status, name) for status, name in
+                    ((spooler.status(ip, port), name) for (ip, port), name in printers.items())]
+        severity, status, name = max(statuses)
+        text, color = PRINTER_STATUS_DISPLAY[status]
+        label.setText(f"🖨 {text}" if severity == 0 or len(printers) == 1 else f"🖨 {name}: {text}")
+        label.setStyleSheet(f"color: {color}; font-weight: bold; background-color: #1e2b38; "
+                            f"padding: 8px 12px; border-radius: 4px;")
+        label.show()
+
+    def load_printer_config(self):
+        """Load the legacy single printer's settings and seed its status from the spooler (no network I/O)"""
         self.printer_available = False
         
         try:
             # Load printer settings if not already loaded
             if not hasattr(self, 'printer_ip') or not hasattr(self, 'printer_port'):
                 try:
-                    with open('appSettings.json', 'r') as f:
-                        app_settings = json.load(f)
-                        printer_config = app_settings.get('PrinterConfig', {})
-                        self.printer_ip = printer_config.get('IP', "192.168.0.253")
-                        self.printer_port = printer_config.get('Port', 9100)
-                        self.header = printer_config.get('Header', {'enable': True, 'text': "EzeeCanteen"})
-                        self.footer = printer_config.get('Footer', {'enable': True, 'text': "Thank you!"})
-                        logging.info(f"Loaded printer config: IP={self.printer_ip}, Port={self.printer_port}")
+                    app_settings = settings_service.get()
+                    printer_config = app_settings.get('PrinterConfig', {})
+                    self.printer_ip = printer_config.get('IP', "192.168.0.253")
+                    self.printer_port = printer_config.get('Port', 9100)
+                    self.header = printer_config.get('Header', {'enable': True, 'text': "EzeeCanteen"})
+                    self.footer = printer_config.get('Footer', {'enable': True, 'text': "Thank you!"})
+                    logging.info(f"Loaded printer config: IP={self.printer_ip}, Port={self.printer_port}")
                 except Exception as e:
                     self.printer_ip = "192.168.0.253"
                     self.printer_port = 9100
@@ -1928,19 +1809,11 @@ class EzeeCanteen(QMainWindow):
                     self.footer = {'enable': True, 'text': "Thank you!"}
                     logging.error(f"Error loading printer settings: {e}")
             
-            # Check printer connection with timeout
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(1)  # 1 second timeout
-            result = s.connect_ex((self.printer_ip, self.printer_port))
-            s.close()
-            
-            if result == 0:
-                self.printer_available = True
-                logging.info(f"Printer connection successful ({self.printer_ip}:{self.printer_port})")
-            else:
-                logging.warning(f"Printer connection failed ({self.printer_ip}:{self.printer_port})")
+            # Cached status only; the spooler's health checks run off the GUI
+            # thread and on_printer_status keeps this current
+            self.printer_available = get_print_spooler().available(self.printer_ip, self.printer_port)
         except Exception as e:
-            logging.error(f"Error testing printer connection: {e}")
+            logging.error(f"Error reading printer status: {e}")
         
     def test_db_connection(self):
         """Test the database connection and set a flag if it's not available"""
@@ -1984,9 +1857,18 @@ class EzeeCanteen(QMainWindow):
         # Clean up
         self.db_test_worker = None
    
-    def insert_to_database(self, event_data):
+    def device_snapshot(self):
+        """Config IP and serial of each active device, copied for worker threads"""
+        return {ip: {'ip': info['config']['ip'], 'serial': info['serial']}
+                for ip, info in getattr(self, 'active_devices', {}).items()}
+
+    def insert_to_database(self, event_data, devices):
         # print("event_data",event_data)
-        """Insert authentication data into the database"""
+        """Insert authentication data into the database.
+
+        Runs on the persist stage: devices is device_snapshot() taken on the
+        GUI thread, so nothing here touches the window's state.
+        """
         # if not hasattr(self, 'db_available') or not self.db_available:
         #     print("Skipping database insertion - database not available")
         #     return
@@ -1998,139 +1880,51 @@ class EzeeCanteen(QMainWindow):
                 user=DB_USER,
                 port=DB_PORT,
                 password=DB_PASS,
-                database=DB_NAME
+                database=DB_NAME,
+                connection_timeout=self.get_punch_pipeline().timeout('persist')
             )
             
             # Create a cursor
             cursor = conn.cursor()
             
-            # Extract data from the event
-            emp_id = event_data.get('employeeNoString', event_data.get('employeeNo', ''))
-            
-            # Process datetime
-            event_time = event_data.get('time', datetime.now().strftime('%Y-%m-%dT%H:%M:%S+05:30'))
-            if 'T' in event_time:
-                # Format: 2023-05-15T14:30:45+05:30 -> 2023-05-15 14:30:45
-                punch_datetime = event_time.replace('T', ' ').split('+')[0]
-            else:
-                punch_datetime = event_time
-            
-            # Get picture URL
-            punch_pic_url = event_data.get('pictureURL', '')
-            
-            # Get recognition mode (1=Card, 38=Fingerprint, others as face)
-            minor = event_data.get('minor', 0)
-            if minor == 1:
-                recognition_mode = "Card"
-            elif minor == 38:
-                recognition_mode = "Fingerprint"
-            elif minor == 75:
-                recognition_mode = "Face"
-            else:
-                recognition_mode = "Unknown"  # This should never happen due to earlier check in add_auth_event
-            
-            # Determine meal type based on current time
-            current_time = datetime.now().strftime('%H:%M')
-            meal_type = "MEAL"  # Default value
+            # Fields parsed once when the punch was ingested (see eventRecord.PunchEvent)
+            emp_id = event_data.employee_no
+            punch_datetime = event_data.punch_time
+            punch_pic_url = event_data.picture_url or ''
+            recognition_mode = event_data.recognition.label
             
-            # Read meal schedule from appSettings.json
-            try:
-                with open('appSettings.json', 'r') as f:
-                    app_settings = json.load(f)
-                    meal_schedule = app_settings.get('CanteenMenu', {}).get('MealSchedule', [])
-                    
-                    # Check which meal time range the current time falls into
-                    for meal in meal_schedule:
-                        from_time = meal.get('fromTime', '')
-                        to_time = meal.get('toTime', '')
-                        meal_type_value = meal.get('mealType', '')
-                        price = meal.get('price', '0')
-                        
-                        if from_time and to_time and meal_type_value and from_time <= current_time <= to_time:
-                            meal_type = meal_type_value.upper()
-                            total_price = price
-                            break
-                    else:
-                        # If no meal matches, default price is 0
-                        total_price = '0'
-            except Exception as e:
-                logging.error(f"Error determining meal type for database: {e}")
-                # Use fallback logic for meal type determination
-                current_hour = datetime.now().hour
-                if 6 <= current_hour < 11:
-                    meal_type = "BREAKFAST"
-                elif 11 <= current_hour < 15:
-                    meal_type = "LUNCH"
-                elif 15 <= current_hour < 18:
-                    meal_type = "SNACKS"
-                elif 18 <= current_hour < 22:
-                    meal_type = "DINNER"
-                total_price = '0'  # Default price if we can't determine from settings
+            # Meal classified at ingestion (at the punch time for backfilled events)
+            meal_type = event_data.meal_type
+            total_price = event_data.meal_price
+            app_settings = settings_service.get_or_default()
             
             # Get attendance status
-            if "AttendanceInfo" in event_data:
-                att = event_data["AttendanceInfo"]
-                attendance_status = att.get('attendanceStatus', None)
-                att_in_out = att.get('labelName', None)
-                
-                # Update special message from app settings
-                try:
-                    with open('appSettings.json', 'r') as f:
-                        app_settings = json.load(f)
-                        self.special_message = app_settings.get('CanteenMenu', {}).get('SpecialMessage', "")
-                except Exception as e:
-                    print(f"Error loading special message: {e}")
-                    if attendance_status:
-                        self.special_message = f"Status: {attendance_status}"
-            else:
-                attendance_status = None
-                att_in_out = None
+            attendance_status = event_data.attendance_status
+            att_in_out = event_data.att_in_out
             
             # Determine which device IP to use
             device_ip = None
             
             # Try to match based on auth_monitor IP in each monitor
-            if hasattr(self, 'active_devices') and self.active_devices:
+            if devices:
                 # Try to identify which device generated this event
-                for ip, device_info in self.active_devices.items():
-                    monitor = device_info['monitor']
-                    if monitor.ip == getattr(event_data, 'deviceIP', None):
+                for ip, device_info in devices.items():
+                    if device_info['ip'] == event_data.device_ip:
                         device_ip = ip
                         break
                 
                 if not device_ip:
                     # If we couldn't determine the source, use the first active device
 
-                    device_ip = next(iter(self.active_devices))
+                    device_ip = next(iter(devices))
             else:
                 # Legacy mode - use the global IP
                 device_ip = IP
             
-            # Get license key from LicenseManager
-            license_key = ""
-            try:
-                # Create a license manager instance
-                license_manager = LicenseManager()
-                
-                # We need to run the async method in a synchronous context
-                def get_license_data():
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        license_data = loop.run_until_complete(license_manager.get_license_db())
-                        return license_data
-                    finally:
-                        loop.close()
-                
-                # Get license data and extract the key
-                license_data = get_license_data()
-                if license_data and 'LicenseKey' in license_data:
-                    license_key = license_data['LicenseKey']
-                    # logging.info(f"Retrieved license key for database insertion: {license_key}")
-                else:
-                    logging.warning("Could not retrieve license key for database insertion")
-            except Exception as e:
-                logging.error(f"Error getting license key: {e}")
+            # Get license key from the shared license cache
+            license_key = get_license_key()
+            if not license_key:
+                logging.warning("Could not retrieve license key for database insertion")
             
 
             canteenMenu = app_settings.get('CanteenMenu')
@@ -2150,17 +1944,17 @@ class EzeeCanteen(QMainWindow):
             # Get device serial based on which device generated the event
             serial_no = ""
             
-            ip = event_data["deviceIP"]
+            ip = event_data.device_ip
 
 
-            if hasattr(self, 'active_devices') and ip in self.active_devices:
-                serial_no = self.active_devices[ip]['serial']
+            if ip in devices:
+                serial_no = devices[ip]['serial']
             else:
                 # Legacy mode - use the global device_serial
                 serial_no = getattr(self, 'device_serial', '')
             
             if not serial_no:
-                serial_no = event_data.get('serialNo', '')
+                serial_no = event_data.serial_no or ''
 
             if mode == "timeBased":
                 # Prepare values
@@ -2192,7 +1986,7 @@ class EzeeCanteen(QMainWindow):
            
             elif mode  == "device":
                 # Prepare values
-                meal_type = event_data.get('label','N/A')
+                meal_type = event_data.label or 'N/A'
 
                 values = (
                     int(emp_id) if emp_id.isdigit() else 0,  # PunchCardNo
@@ -2276,6 +2070,11 @@ class EzeeCanteen(QMainWindow):
         self.time_display = TimeDisplay()
         self.time_display.setMinimumWidth(150)
         
+        # Printer status, kept current by the print spooler's health checks
+        self.printer_status_label = QLabel()
+        self.printer_status_label.setFont(QFont("Arial", 14))
+        self.printer_status_label.hide()
+        
         # Title display with lock icon
         title_container = QWidget()
         title_layout = QHBoxLayout(title_container)
@@ -2331,9 +2130,19 @@ class EzeeCanteen(QMainWindow):
         settings_button.setFixedSize(36, 36)
         settings_button.clicked.connect(self.open_settings)
         
+        # Reprint button for the counter operator
+        reprint_button = QPushButton("🖨")
+        reprint_button.setFont(QFont("Arial", 16))
+        reprint_button.setToolTip("Reprint a token")
+        reprint_button.setStyleSheet(settings_button.styleSheet())
+        reprint_button.setFixedSize(36, 36)
+        reprint_button.clicked.connect(self.reprint_token)
+        
         # Add widgets to header layout
         header_layout.addWidget(self.time_display)
+        header_layout.addWidget(self.printer_status_label)
         header_layout.addWidget(title_container, 1)
+        header_layout.addWidget(reprint_button)
         header_layout.addWidget(settings_button)
         
         # Create a scroll area for the grid
@@ -2398,6 +2207,9 @@ class EzeeCanteen(QMainWindow):
         self.grid_layout.setSpacing(4)  # Reduced spacing between items
         self.grid_layout.setAlignment(Qt.AlignTop | Qt.AlignLeft)  # Align grid items to top-left
         
+        # Cards are created once and re-bound as events arrive
+        self.event_grid = EventCardGrid(self.event_model, self.grid_layout, AuthEventItem)
+        
         grid_layout.addWidget(self.grid_widget)
         
         # Add grid container to scroll area
@@ -2444,57 +2256,64 @@ class EzeeCanteen(QMainWindow):
     def add_auth_event(self, event_data):
         """Add a new authentication event to the grid and print a token"""
 
-        # Check if we've entered a new meal time and reset counter if needed
-        self.reset_token_counter_for_new_meal()
+        # Check if we've entered a new meal time and reset counter if needed;
+        # this punch's token is counted below, not by the database count
+        self.reset_token_counter_for_new_meal(None if event_data.backfilled else event_data.time)
 
-        # Check if the minor value is one of the supported authentication types
-        minor = event_data.get('minor', 0)
-        if minor not in [1, 38, 75]:
-            # print(f"Skipping event with unsupported minor value: {minor}")
+        # Check that it is one of the supported authentication types
+        if event_data.recognition is Recognition.UNKNOWN:
+            return
+        
+        # Punches recovered after a device outage are recorded but never printed as tokens
+        if event_data.backfilled:
+            if event_data.employee_no:
+                logging.info(f"Recording backfilled punch for {event_data.employee_no} at {event_data.punch_time}")
+                self.get_punch_pipeline().submit('persist', self.insert_to_database, event_data, self.device_snapshot())
             return
         
         # Add event to the list
-        if(event_data.get('employeeNoString')):
+        if event_data.employee_no:
             # print(f"event_data{event_data}\n\n")
-            # Add event to the end of list, then sort by time
-            self.events.append(event_data)
-            # Sort events by time in descending order (most recent first)
-            self.events.sort(key=lambda event: event.get('time', ''), reverse=True)
+            # Insert at its place by time (most recent first); the model drops
+            # the oldest event beyond max_events and the grid re-binds its cards.
+            # Persisting and printing below do not wait for the photo.
+            self.show_event(event_data)
             
             # Process disable punch logic - check if DisablePunch is enabled
             try:
-                with open('appSettings.json', 'r') as f:
-                    app_settings = json.load(f)
-                    disable_punch = app_settings.get('CanteenMenu', {}).get('DisablePunch', False)
+                app_settings = settings_service.get()
+                disable_punch = app_settings.get('CanteenMenu', {}).get('DisablePunch', False)
                     
-                    if disable_punch:
-                        # Get employee ID
-                        emp_id = event_data.get('employeeNoString', event_data.get('employeeNo', None))
-                        emp_name = event_data.get('name', None)
-                        # Get the source device IP from the event data
-                        source_device_ip = event_data.get('source_device_ip')
+                if disable_punch:
+                    emp_id = event_data.employee_no
+                    emp_name = event_data.name
+                    source_device_ip = event_data.source_device_ip
                         
-                        # print("THOS IOS TJHE OMNAME OF TJHE EM<PT: ", emp_name)
-                        # print(f"\n----------------------------------------\nemp_name: {emp_name}\nemp_id: {emp_id}\n----------------------------------------\n")
-                        if emp_id and emp_name:
-                            # print("BOTHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHH")
-                            self.update_user_begin_time(emp_id, emp_name, app_settings, source_device_ip)
-                        elif emp_id:
-                            # print("SINGLEEEEEEEEEEEEEEEEEEEEEEEEEEEEE")
-                            self.update_user_begin_time(emp_id, None, app_settings, source_device_ip)
-                        else:
-                            print(f"No employee ID or name found for event data: {event_data}")
+                    # print("THOS IOS TJHE OMNAME OF TJHE EM<PT: ", emp_name)
+                    # print(f"\n----------------------------------------\nemp_name: {emp_name}\nemp_id: {emp_id}\n----------------------------------------\n")
+                    # The HTTP PUT runs on the device stage, off the GUI thread
+                    if emp_id and emp_name:
+                        # print("BOTHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHHH")
+                        self.get_punch_pipeline().submit('device', self.update_user_begin_time, emp_id, emp_name, app_settings, source_device_ip)
+                    elif emp_id:
+                        # print("SINGLEEEEEEEEEEEEEEEEEEEEEEEEEEEEE")
+                        self.get_punch_pipeline().submit('device', self.update_user_begin_time, emp_id, None, app_settings, source_device_ip)
+                    else:
+                        print(f"No employee ID or name found for event data: {event_data}")
 
             except Exception as e:
                 logging.error(f"Error processing DisablePunch feature: {e}")
             
-            # Insert data into database
-            self.insert_to_database(event_data)
+            # Insert data into database (persist stage)
+            self.get_punch_pipeline().submit('persist', self.insert_to_database, event_data, self.device_snapshot())
             
-            # Check if day has changed to reset token counter
+            # Check if day has changed to reset token counter (not in the middle
+            # of a meal window that runs past midnight)
             today = datetime.now().date()
             if today != self.current_date:
-                self.token_counter = 0
+                window_start = get_compiled_schedule(settings_service.get_or_default()).window_start()
+                if not window_start or window_start.date() == today:
+                    self.token_counter = 0
                 self.current_date = today
             
             # Generate and print token
@@ -2502,68 +2321,33 @@ class EzeeCanteen(QMainWindow):
             self.update_title_counter()
 
             # Extract data for token
-            emp_id = event_data.get('employeeNoString', event_data.get('employeeNo', 'N/A'))
-            name = event_data.get('name', 'N/A')
-            punch_time = event_data.get('time', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-            user_order = event_data.get('label','N/A')
-
-
-
-            # Format punch time if needed
-            if 'T' in punch_time:
-                punch_time = punch_time.replace('T', ' ').split('+')[0]
+            emp_id = event_data.employee_no
+            name = event_data.name or 'N/A'
+            punch_time = event_data.punch_time
+            user_order = event_data.label or 'N/A'
             
-            # Determine coupon type based on current time from appSettings.json
+            # Coupon type: the meal classified when the punch was ingested
+            coupon_type = event_data.meal_type
             try:
-                current_time = datetime.now().strftime('%H:%M')
-                coupon_type = "MEAL"
-                
-                # Read meal schedule from appSettings.json
-                with open('appSettings.json', 'r') as f:
-                    app_settings = json.load(f)
-                    meal_schedule = app_settings.get('CanteenMenu', {}).get('MealSchedule', [])
-                    self.special_message = app_settings.get('CanteenMenu', {}).get('SpecialMessage', "")
+                app_settings = settings_service.get()
+                self.special_message = app_settings.get('CanteenMenu', {}).get('SpecialMessage', "")
                 
                 # Get header and footer if not already loaded
                 if not hasattr(self, 'header') or not hasattr(self, 'footer'):
                     printer_config = app_settings.get('PrinterConfig', {})
                     self.header = printer_config.get('Header', {'enable': True, 'text': "EzeeCanteen"})
                     self.footer = printer_config.get('Footer', {'enable': True, 'text': "Thank you!"})
-            
-                # Check which meal time range the current time falls into
-                for meal in meal_schedule:
-                    from_time = meal.get('fromTime', '')
-                    to_time = meal.get('toTime', '')
-                    meal_type = meal.get('mealType', '')
-                    
-                    if from_time and to_time and meal_type and from_time <= current_time <= to_time:
-                        coupon_type = meal_type.upper()
-                        break
             except Exception as e:
-                # Fallback to hardcoded values if there's an error
-                current_hour = datetime.now().hour
-                if 6 <= current_hour < 11:
-                    coupon_type = "BREAKFAST"
-                elif 11 <= current_hour < 15:
-                    coupon_type = "LUNCH"
-                elif 15 <= current_hour < 18:
-                    coupon_type = "SNACKS"
-                elif 18 <= current_hour < 22:
-                    coupon_type = "DINNER"
-                else:
-                    coupon_type = "MEAL"
-                print(f"Error determining meal type from settings: {e}")
+                print(f"Error loading printer settings: {e}")
             
             # Get attendance status if available
-            if "AttendanceInfo" in event_data:
-                att = event_data["AttendanceInfo"]
-                status = att.get('attendanceStatus', '')
+            if event_data.attendance_status:
+                status = event_data.attendance_status
                 if status:
                     # Update special message from app settings
                     try:
-                        with open('appSettings.json', 'r') as f:
-                            app_settings = json.load(f)
-                            self.special_message = app_settings.get('CanteenMenu', {}).get('SpecialMessage', "")
+                        app_settings = settings_service.get()
+                        self.special_message = app_settings.get('CanteenMenu', {}).get('SpecialMessage', "")
                     except Exception as e:
                         print(f"Error loading special message: {e}")
                         self.special_message = f"Status: {status}"
@@ -2574,17 +2358,16 @@ class EzeeCanteen(QMainWindow):
             printer_port = None
             
             # First check if source_device_ip is directly available in the event data
-            if 'source_device_ip' in event_data:
-                source_ip = event_data['source_device_ip']
+            if event_data.source_device_ip:
+                source_ip = event_data.source_device_ip
                 # logging.info(f"Using source device IP from event data: {source_ip}")
             # If source_device_ip is not in event data, try to determine it from deviceIP
-            elif 'deviceIP' in event_data:
-                device_ip = event_data['deviceIP']
+            elif event_data.device_ip:
+                device_ip = event_data.device_ip
                 # Try to find a matching device in active_devices
                 if hasattr(self, 'active_devices') and self.active_devices:
                     for active_ip, device_info in self.active_devices.items():
-                        monitor = device_info['monitor']
-                        if monitor.ip == device_ip:
+                        if device_info['config']['ip'] == device_ip:
                             source_ip = active_ip
                             logging.info(f"Matched device IP {device_ip} to active device {source_ip}")
                             break
@@ -2596,6 +2379,7 @@ class EzeeCanteen(QMainWindow):
             
             # Check if printer is available and print token
             printer_available = False
+            printer_ip = printer_port = None
             
             # If we have a source IP and it's in our device_printers map, use that printer
             if source_ip and source_ip in self.device_printers:
@@ -2605,10 +2389,11 @@ class EzeeCanteen(QMainWindow):
                 printer_ip = printer['ip']
                 printer_port = printer['port']
                 # logging.info(f"Using printer {printer_ip}:{printer_port} for device {source_ip}")
-            # Legacy fallback - if no device-specific printer found but we have a default printer
-            elif hasattr(self, 'printer_available') and self.printer_available:
+            # Legacy fallback - if no device-specific printer found but we have a default printer.
+            # Used even while it is down: the spooler and journal hold the job until it is back
+            elif getattr(self, 'printer_ip', None):
                 # Legacy mode - use the single printer
-                printer_available = self.printer_available
+                printer_available = getattr(self, 'printer_available', False)
                 printer_ip = self.printer_ip
                 printer_port = self.printer_port
                 logging.info(f"Using legacy printer {printer_ip}:{printer_port}")
@@ -2618,75 +2403,50 @@ class EzeeCanteen(QMainWindow):
             # print(f"Selected printer: {printer_ip}:{printer_port}")
             # print(f"Printer available: {printer_available}")
             
-            # Attempt to print token if printer is available
-            if printer_available and printer_ip and printer_port:
-                try:
-                    # Double-check printer is still available with short timeout
-                    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    s.settimeout(0.5)  # 0.5 second timeout
-                    result = s.connect_ex((printer_ip, printer_port))
-                    s.close()
-                    canteenMenu = app_settings.get('CanteenMenu')
-                    mode = canteenMenu.get('currentMode')
-                    print("MODE : ", mode)
-
-                    if mode == "device": 
-                        order = user_order
-                    elif mode == "timeBased":
-                        order = coupon_type
-                    else:
-                        order = "Meal"
-                    if result == 0:
-                        # Printer is available, print the token
-                        print_slip(  
-                            printer_ip, 
-                            printer_port, 
-                            0, 
-                            self.header if hasattr(self, 'header') else {'enable': True, 'text': "EzeeCanteen"}, 
-                            order, 
-                            emp_id, 
-                            name, 
-                            punch_time, 
-                            self.special_message if hasattr(self, 'special_message') else "", 
-                            self.footer if hasattr(self, 'footer') else {'enable': True, 'text': "Thank you!"}
-                        )
-                        print(f"Token {self.token_counter} printed for {name} on printer {printer_ip}:{printer_port}")
-                    else:
-                        print(f"Skipping print - printer not available at {printer_ip}:{printer_port}")
-                        # Update printer availability status
-                        if source_ip and source_ip in self.device_printers:
-                            self.device_printers[source_ip]['available'] = False
-                        else:
-                            self.printer_available = False
-                except Exception as e:
-                    print(f"Error printing token: {e}")
-                    # Update printer availability status
-                    if source_ip and source_ip in self.device_printers:
-                        self.device_printers[source_ip]['available'] = False
-                    else:
-                        self.printer_available = False
+            # Print the token (print stage, in token order). With the printer
+            # down it is still journaled and comes out once the printer is back
+            if printer_ip and printer_port:
+                if not printer_available:
+                    logging.warning(f"Printer {printer_ip}:{printer_port} unavailable; token {self.token_counter} "
+                                    f"will print when it is back")
+                canteenMenu = app_settings.get('CanteenMenu')
+                mode = canteenMenu.get('currentMode')
+                print("MODE : ", mode)
+
+                if mode == "device": 
+                    order = user_order
+                elif mode == "timeBased":
+                    order = coupon_type
+                else:
+                    order = "Meal"
+                self.get_punch_pipeline().submit(
+                    'print',
+                    self.print_token,
+                    self.token_counter,
+                    printer_ip,
+                    printer_port,
+                    source_ip,
+                    self.header if hasattr(self, 'header') else {'enable': True, 'text': "EzeeCanteen"},
+                    order,
+                    emp_id,
+                    name,
+                    punch_time,
+                    self.special_message if hasattr(self, 'special_message') else "",
+                    self.footer if hasattr(self, 'footer') else {'enable': True, 'text': "Thank you!"},
+                    getattr(self, 'logo', None)
+                )
             else:
                 print(f"Skipping print - no printer available for this device")
         
-            # Only modify the grid to add the new event instead of rebuilding the entire grid
             # Check if grid_layout still exists and is valid
             if not hasattr(self, 'grid_layout') or sip.isdeleted(self.grid_layout):
                 return
-            
-            # Limit the number of events
-            if len(self.events) > self.max_events:
-                self.events = self.events[:self.max_events]
-                
-            # Instead of shifting items in the grid one by one,
-            # simply clear and repopulate the entire grid to maintain sorted order
-            self.clear_grid()
-            self.populate_grid()
         
             # Print to console for debugging
             print("\n========== NEW AUTHENTICATION ==========")
             # print(f"Time: {event_data.get('time')}")
-            print(f"Employee No: {event_data.get('employeeNoString', event_data.get('employeeNo', 'N/A'))}")
-            print(f"Name: {event_data.get('name', 'N/A')}")
+            print(f"Employee No: {event_data.employee_no}")
+            print(f"Name: {event_data.name or 'N/A'}")
             # print(f"FaceURL: {event_data.get('pictureURL', 'N/A')}")
             
             # Check for attendance info
@@ -2696,47 +2456,94 @@ class EzeeCanteen(QMainWindow):
                 # print(f"Label: {att.get('labelName', 'N/A')}")
             
             print("======================================")
-        else:
-            # If the event doesn't have an employee number, we might still need to update the grid
-            # Limit the number of events
-            if len(self.events) > self.max_events:
-                self.events = self.events[:self.max_events]
     
+    @property
+    def events(self):
+        """Events on the display, newest first (held by the event model)"""
+        return self.event_model.events
+
+    @events.setter
+    def events(self, events):
+        self.event_model.set_events(events)
+
+    def schedule_render(self):
+        """Lay out the grid once the current batch of events has been handled"""
+        if getattr(self, 'render_pending', None) is None:
+            self.render_pending = time.monotonic()
+            QTimer.singleShot(0, self.render_grid)
+
+    def render_grid(self):
+        requested_at, self.render_pending = self.render_pending, None
+        if not hasattr(self, 'grid_layout') or sip.isdeleted(self.grid_layout):
+            return
+        self.populate_grid()
+        if requested_at is not None:
+            metrics.observe('pipeline_latency_seconds', time.monotonic() - requested_at, 'render')
+
+    def print_token(self, token, printer_ip, printer_port, source_ip, header, order, emp_id, name, punch_time, special_message, footer, logo=None):
+        """Render one token slip and queue it on the printer's spooler (print stage, off the GUI thread)"""
+        def on_result(printed):
+            if printed:
+                print(f"Token {token} printed for {name} on printer {printer_ip}:{printer_port}")
+                return
+            print(f"Token {token} not printed yet - printer not available at {printer_ip}:{printer_port}; "
+                  f"it stays in the print journal until the printer is back")
+            self.mark_printer_unavailable(source_ip)
+
+        # The spooler keeps the printer connection open, so there is no
+        # separate availability probe before each token
+        if not print_slip(
+            printer_ip,
+            printer_port,
+            0,
+            header,
+            order,
+            emp_id,
+            name,
+            punch_time,
+            special_message,
+            footer,
+            on_result=on_result,
+            token=token,
+            logo=logo
+        ):
+            self.mark_printer_unavailable(source_ip)
+
+    def reprint_token(self):
+        """Ask the operator for a token number and print that slip again"""
+        from PyQt5.QtWidgets import QInputDialog, QMessageBox
+        token, ok = QInputDialog.getInt(self, "Reprint Token", "Token number:",
+                                        max(self.token_counter, 1), 1, 1000000)
+        if not ok:
+            return
+        # Token numbers restart every meal: look in the open meal, or the one
+        # that just closed, so a lunch token is not found during dinner
+        bounds = get_compiled_schedule(settings_service.get_or_default()).last_bounds()
+        since = bounds[0].timestamp() if bounds else None
+        if get_print_spooler().reprint(token, since=since):
+            logging.info(f"Token {token} sent for reprint")
+        else:
+            QMessageBox.warning(self, "Reprint Token",
+                                f"No token {token} has been printed {'this meal' if bounds else 'today'}.")
+
+    def mark_printer_unavailable(self, source_ip):
+        """Show a printer as down until its next status check finds it again"""
+        if source_ip and source_ip in self.device_printers:
+            self.device_printers[source_ip]['available'] = False
+        else:
+            self.printer_available = False
+
     def update_user_begin_time(self, employee_no, employee_name, app_settings, source_device_ip=None):
         """Update the user's begin time to the next meal time"""
         try:
-            # Get current time
-            current_time = datetime.now()
-            current_time_str = current_time.strftime('%H:%M')
-            current_date = current_time.strftime('%Y-%m-%dT')
-            
             # Get meal schedule
-            meal_schedule = app_settings.get('CanteenMenu', {}).get('MealSchedule', [])
-            if not meal_schedule:
+            next_start = get_compiled_schedule(app_settings).next_start(datetime.now())
+            if not next_start:
                 logging.warning("No meal schedule found - cannot update begin time")
                 return
             
-            # Sort meal schedule by time
-            meal_schedule.sort(key=lambda x: x.get('fromTime', '00:00'))
-            
-            # Find the next meal time
-            next_meal = None
-            for meal in meal_schedule:
-                from_time = meal.get('fromTime', '')
-                if from_time and from_time > current_time_str:
-                    next_meal = meal
-                    break
-            
-            if next_meal:
-                # Use today's date with the next meal time - format: YYYY-MM-DDThh:mm:ss
-                next_begin_time = f"{current_date}{next_meal.get('fromTime', '00:00')}:00"
-            else:
-                # Use tomorrow's date with the first meal time of the day
-                tomorrow = current_time + timedelta(days=1)
-                tomorrow_date = tomorrow.strftime('%Y-%m-%dT')
-                # Use the first meal from the schedule for tomorrow
-                first_meal = meal_schedule[0]
-                next_begin_time = f"{tomorrow_date}{first_meal.get('fromTime', '00:00')}:00"
+            # The next meal start, today or tomorrow - format: YYYY-MM-DDThh:mm:ss
+            next_begin_time = next_start.strftime('%Y-%m-%dT%H:%M:%S')
             
             logging.info(f"Setting begin time for employee {employee_no} to {next_begin_time}")
             
@@ -2751,10 +2558,10 @@ class EzeeCanteen(QMainWindow):
                     device_ip = source_device_ip
                     device_info = self.active_devices[device_ip]
                     device_auth = {
-                        'ip': device_info['monitor'].ip,
-                        'port': device_info['monitor'].port,
-                        'user': device_info['monitor'].username,
-                        'password': device_info['monitor'].password
+                        'ip': device_info['config']['ip'],
+                        'port': device_info['config']['port'],
+                        'user': device_info['config']['user'],
+                        'password': device_info['config']['password']
                     }
                     # logging.info(f"Using source device {device_ip} for updating begin time")
                 else:
@@ -2762,10 +2569,10 @@ class EzeeCanteen(QMainWindow):
                     device_ip = next(iter(self.active_devices))
                     device_info = self.active_devices[device_ip]
                     device_auth = {
-                        'ip': device_info['monitor'].ip,
-                        'port': device_info['monitor'].port,
-                        'user': device_info['monitor'].username,
-                        'password': device_info['monitor'].password
+                        'ip': device_info['config']['ip'],
+                        'port': device_info['config']['port'],
+                        'user': device_info['config']['user'],
+                        'password': device_info['config']['password']
                     }
                     logging.warning(f"Source device {source_device_ip} not found, using {device_ip} instead")
             else:
@@ -2792,7 +2599,8 @@ class EzeeCanteen(QMainWindow):
                 device_auth['password'], 
                 employee_no, 
                 next_begin_time,
-                employee_name
+                employee_name,
+                timeout=self.get_punch_pipeline().timeout('device')
             )
             print(f"result of update_user_begin_time: {result}")
             print(f"\n----------------------------------------\nTime updated result: {result}\n----------------------------------------\n")
@@ -2847,36 +2655,10 @@ class EzeeCanteen(QMainWindow):
         QApplication.processEvents()
         
         try:
-            # Stop all active device monitors
-            if hasattr(self, 'active_devices'):
-                for device_ip, device_info in self.active_devices.items():
-                    monitor = device_info['monitor']
-                    if monitor and monitor.isRunning():
-                        try:
-                            monitor.stop()
-                            if not monitor.wait(1000):  # 1 second timeout
-                                monitor.terminate()
-                                monitor.wait()
-                            logging.info(f"Stopped monitor for device {device_ip}")
-                        except Exception as e:
-                            logging.error(f"Error stopping monitor for device {device_ip}: {e}")
-                self.active_devices.clear()
-
-            # Stop legacy auth monitor if it exists
-            if hasattr(self, 'auth_monitor'):
-                self.communicator.stop_server.emit()
-                if self.auth_monitor.isRunning():
-                    if not self.auth_monitor.wait(1000):  # 1 second timeout
-                        self.auth_monitor.terminate()
-                        self.auth_monitor.wait()
-                delattr(self, 'auth_monitor')
-
-            # Stop printer check timer
-            if hasattr(self, 'printer_check_timer') and self.printer_check_timer.isActive():
-                self.printer_check_timer.stop()
+            # Stop every reader, worker and timer; the settings screen builds a new window
+            self.stop_background_work()
 
             # Clear all events and grid
-            self.events.clear()
             self.clear_grid()
 
             # Give a moment for cleanup before continuing to settings
@@ -2890,31 +2672,9 @@ class EzeeCanteen(QMainWindow):
         try:
             # Import the settings module and get settings window with license key
             from settings import main as settings_main
-            from licenseManager import LicenseManager
-            import asyncio
             
             # Get license key
-            license_manager = LicenseManager()
-            
-            async def get_license_data_async():
-                try:
-                    return await license_manager.get_license_db()
-                except Exception as e:
-                    logging.error(f"Error getting license data: {e}")
-                    return None
-                    
-            def get_license_data():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    license_data = loop.run_until_complete(get_license_data_async())
-                    return license_data
-                finally:
-                    loop.close()
-            
-            # Get license data
-            license_data = get_license_data()
-            license_key = license_data.get('LicenseKey') if license_data else None
+            license_key = get_license_key() or None
             
             # Save current window geometry
             geometry = self.geometry()
@@ -2933,7 +2693,10 @@ class EzeeCanteen(QMainWindow):
             
             # Remove references to background processes
             if hasattr(self, 'communicator'):
-                self.communicator.new_auth_event.disconnect()
+                try:
+                    self.communicator.new_auth_event.disconnect()
+                except TypeError:
+                    pass  # Already disconnected by stop_background_work()
             
             # Clean up any remaining references
             self.events = []
@@ -2943,8 +2706,6 @@ class EzeeCanteen(QMainWindow):
                 logging.info("Cleared active_devices dictionary instead of deleting it")
             if hasattr(self, 'auth_monitor'):
                 delattr(self, 'auth_monitor')
-            if hasattr(self, 'printer_check_timer'):
-                delattr(self, 'printer_check_timer')
             
         except Exception as e:
             logging.error(f"Error opening settings view: {e}")
@@ -2957,48 +2718,76 @@ class EzeeCanteen(QMainWindow):
             error_dialog.setWindowTitle("Error")
             error_dialog.exec_()
     
+    def stop_background_work(self):
+        """Stop ingestion, the device monitors and every worker this window
+        started (closing, or handing over to the settings screen)"""
+        # Stop monitoring authentication events
+        self.communicator.stop_server.emit()
+        self.stop_ingestion_engine()
+        
+        # Stop all active device monitors
+        if hasattr(self, 'active_devices'):
+            for device_ip, device_info in self.active_devices.items():
+                monitor = device_info['monitor']
+                if monitor and monitor.isRunning():
+                    try:
+                        monitor.stop()
+                        if not monitor.wait(1000):  # 1 second timeout
+                            monitor.terminate()
+                            monitor.wait()
+                        logging.info(f"Stopped monitor for device {device_ip}")
+                    except Exception as e:
+                        logging.error(f"Error stopping monitor for device {device_ip}: {e}")
+            self.active_devices.clear()
+        
+        # Stop legacy auth monitor if it exists
+        if hasattr(self, 'auth_monitor'):
+            if self.auth_monitor.isRunning():
+                if not self.auth_monitor.wait(1000):  # 1 second timeout
+                    self.auth_monitor.terminate()
+                    self.auth_monitor.wait()
+            delattr(self, 'auth_monitor')
+        
+        # Stop following printer status
+        self.stop_printer_monitor()
+        
+        if getattr(self, 'meal_scheduler', None):
+            settings_service.remove_listener(self.meal_scheduler.reload)
+            self.meal_scheduler.stop()
+            self.meal_scheduler = None
+        
+        # Keep events the UI has not handled yet for the next window or start
+        if getattr(self, 'event_queue', None):
+            self.event_queue_timer.stop()
+            self.communicator.new_auth_event.disconnect(self.ingest_event)
+            self.event_queue.spill_all()
+            self.event_queue = None
+        
+        # Let queued inserts and prints finish
+        if getattr(self, 'punch_pipeline', None):
+            self.punch_pipeline.shutdown(timeout=5)
+            self.punch_pipeline.log_latency()
+            self.punch_pipeline = None
+        if getattr(self, 'image_prefetcher', None):
+            self.image_prefetcher.shutdown()
+            self.image_prefetcher = None
+        if getattr(self, 'employee_photo_sync', None):
+            self.employee_photo_sync.stop()
+            self.employee_photo_sync = None
+    
     def clear_grid(self):
-        """Clear all items from the grid layout"""
-        # Check if grid_layout still exists and is valid
-        if not hasattr(self, 'grid_layout') or sip.isdeleted(self.grid_layout):
-            return
-            
-        # Mark all widgets as deleted before removing them
-        for i in range(self.grid_layout.count()):
-            item = self.grid_layout.itemAt(i)
-            if item and item.widget():
-                if hasattr(item.widget(), 'is_deleted'):
-                    item.widget().is_deleted = True
-        
-        # Then remove them
-        while self.grid_layout.count():
-            item = self.grid_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
+        """Remove all events from the grid; the cards are hidden and kept for reuse"""
+        if getattr(self, 'awaiting_photo', None):
+            self.awaiting_photo.clear()
+        self.event_model.clear()
     
     def populate_grid(self):
-        """Populate grid with authentication events"""
+        """Lay out the event cards for the current window width"""
         if not hasattr(self, 'grid_layout') or sip.isdeleted(self.grid_layout):
             return
             
-        # Sort events by time in descending order (most recent first)
-        sorted_events = sorted(self.events, key=lambda event: event.get('time', ''), reverse=True)
-            
         # Determine number of columns based on window width
-        window_width = self.width()
-        
-        # Your new column configuration
-        if window_width >= 1600:
-            cols = 7  # More columns for very wide windows
-        elif window_width >= 1280:
-            cols = 5  # 5 columns in wide window
-        elif window_width >= 900:
-            cols = 4  # 4 columns in medium window
-        elif window_width >= 768:
-            cols = 3  # 3 columns in smaller medium window
-        else:
-            cols = 2  # 2 columns in small window
+        cols = grid_columns(self.width())
         
         # Calculate available width for cards
         scroll_area_width = self.centralWidget().findChild(QScrollArea).width()
@@ -3009,45 +2798,19 @@ class EzeeCanteen(QMainWindow):
         available_width = scroll_area_width - scrollbar_width - margin_spacing - grid_spacing
         card_width = available_width // cols
         
-        # Set spacing and alignment
-        self.grid_layout.setSpacing(4)
-        self.grid_layout.setAlignment(Qt.AlignTop | Qt.AlignLeft)
-        
-        # Populate grid with sorted events
-        for i, event in enumerate(sorted_events):
-            row = i // cols
-            col = i % cols
-            
-            event_item = AuthEventItem(event)
-            
-            # Set the calculated width for each card
-            event_item.setFixedWidth(card_width)
-            
-            self.grid_layout.addWidget(event_item, row, col)
-            self.grid_layout.setAlignment(event_item, Qt.AlignTop | Qt.AlignLeft)
+        # Move and resize the existing cards, then bind any still unbound
+        self.event_grid.relayout(cols, card_width)
+        self.event_grid.refresh()
     
     def closeEvent(self, event):
         """Handle window close event"""
-        # Stop monitoring authentication events
-        self.communicator.stop_server.emit()
-        
-        # Stop all active device monitors
-        if hasattr(self, 'active_devices'):
-            for device_ip, device_info in self.active_devices.items():
-                monitor = device_info['monitor']
-                if monitor and monitor.isRunning():
-                    try:
-                        monitor.stop()
-                        if not monitor.wait(1000):  # 1 second timeout
-                            monitor.terminate()
-                            monitor.wait()
-                        logging.info(f"Stopped monitor for device {device_ip}")
-                    except Exception as e:
-                        logging.error(f"Error stopping monitor for device {device_ip}: {e}")
+        self.stop_background_work()
+        close_all_clients()
         
-        # Stop printer check timer
-        if hasattr(self, 'printer_check_timer') and self.printer_check_timer.isActive():
-            self.printer_check_timer.stop()
+        # Queued tokens get the rest of the shutdown budget to reach the printer
+        shutdown_print_spooler(timeout=5)
+        if getattr(self, 'event_grid', None):
+            self.event_grid.log_frame_times()
         
         # If we're in settings mode, we should let the parent handle cleanup
         if not self.settings_mode:
@@ -3078,9 +2841,8 @@ class EzeeCanteen(QMainWindow):
         if not hasattr(self, 'grid_layout') or sip.isdeleted(self.grid_layout):
             return
             
-        if self.events:
-            self.clear_grid()
-            self.populate_grid()
+        # Only the layout changes; the cards and their images are kept
+        self.populate_grid()
 
 def main():
     # Only create app if this is run as a standalone program